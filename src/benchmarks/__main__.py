@@ -0,0 +1,86 @@
+"""
+The command line interface of the pipeline benchmarks:
+
+    python -m src.benchmarks run --output reports/baseline.json
+    python -m src.benchmarks compare reports/baseline.json reports/new.json
+
+The FAISS benchmark runs at 10k and 1M vectors by default, 10M (about 5GB of raw vectors, plus the index) is
+opt-in with --faiss-sizes 10000 1000000 10000000.
+
+Imports:
+    - argparse: Provides the command line interface.
+    - sys: Provides the exit code.
+    - time: Provides time-related functions.
+    - BenchmarkDataset: The deterministic benchmark dataset.
+    - stages: The stage benchmarks.
+    - report: Writes and compares the reports.
+"""
+
+import argparse
+import sys
+import time
+
+from .dataset import BenchmarkDataset
+from . import stages
+from . import report
+
+STAGES = ['decode', 'detection', 'embedding', 'insert', 'faiss', 'end_to_end']
+
+def run(args):
+    dataset = BenchmarkDataset(seed=args.seed, images=args.images, image_folder=args.image_folder)
+    benchmarks = {
+        'decode': lambda: stages.bench_decode(dataset),
+        'detection': lambda: stages.bench_detection(dataset),
+        'embedding': lambda: stages.bench_embedding(dataset),
+        'insert': lambda: stages.bench_insert(dataset, args.inserts),
+        'faiss': lambda: stages.bench_faiss(dataset, args.faiss_sizes, args.faiss_storages, queries=args.queries, k=args.k),
+        'end_to_end': lambda: stages.bench_end_to_end(dataset),
+    }
+
+    results = {}
+    for stage in args.stages:
+        print(f'Running {stage}...', flush=True)
+        started_at = time.perf_counter()
+        try:
+            results[stage] = benchmarks[stage]()
+        except Exception as e:
+            results[stage] = stages.skipped(e)
+        print(f'{stage} done in {time.perf_counter() - started_at:.1f}s', flush=True)
+
+    report.write_report(args.output, report.get_metadata(dataset), results)
+    print(f'Report written to {args.output}')
+    return 0
+
+def compare(args):
+    rows, warnings = report.compare_reports(report.read_report(args.old), report.read_report(args.new), args.threshold)
+    report.print_comparison(rows, warnings)
+    return 1 if any(status == 'REGRESSED' for *_, status in rows) else 0
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m src.benchmarks', description='Benchmarks the face pipeline.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='run the benchmarks and write a report')
+    run_parser.add_argument('--output', default='benchmark.json', help='report file')
+    run_parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='stages to benchmark')
+    run_parser.add_argument('--seed', type=int, default=0, help='dataset seed')
+    run_parser.add_argument('--images', type=int, default=64, help='number of dataset images')
+    run_parser.add_argument('--image-folder', help='folder of face images to sample instead of rendered faces')
+    run_parser.add_argument('--inserts', type=int, default=2000, help='number of embeddings inserted')
+    run_parser.add_argument('--faiss-sizes', type=int, nargs='+', default=[10_000, 1_000_000], help='FAISS index sizes')
+    run_parser.add_argument('--faiss-storages', nargs='+', default=['flat', 'fp16', 'sq8'], help='FAISS storage modes')
+    run_parser.add_argument('--queries', type=int, default=100, help='number of FAISS queries')
+    run_parser.add_argument('-k', type=int, default=10, help='number of neighbours searched')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser('compare', help='compare two reports, exits with 1 on a regression')
+    compare_parser.add_argument('old', help='baseline report')
+    compare_parser.add_argument('new', help='new report')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative change flagged')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+This module defines a BenchmarkDataset class, a deterministic dataset for the pipeline benchmarks: face images
+(rendered, or sampled from a folder) encoded like camera frames, and clustered FaceNet-like embeddings. The same
+seed always produces the same dataset, its fingerprint is recorded in the reports.
+
+Imports:
+    - cv2: OpenCV library for computer vision tasks.
+    - base64: Provides methods for encoding and decoding Base64 data.
+    - hashlib: Provides the hash used for the dataset fingerprint.
+    - os: Provides a way of using operating system-dependent functionality.
+    - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
+"""
+
+import cv2
+import base64
+import hashlib
+import os
+import numpy as np
+
+class BenchmarkDataset:
+    """
+    A deterministic benchmark dataset.
+
+    Embeddings are generated in aligned chunks of CHUNK_SIZE vectors, each chunk from its own seed, so any range
+    of a dataset of any size can be regenerated. Every SIGHTINGS_PER_PERSON consecutive embeddings belong to the
+    same person: a random center plus a small noise, well within FeatureExtractor.FACENET_THRESHOLD_EUCLIDEAN.
+    """
+    DIM = 128
+    CHUNK_SIZE = 100_000
+    SIGHTINGS_PER_PERSON = 8
+    EMBEDDING_NOISE = 0.15
+    JPEG_QUALITY = 95
+
+    def __init__(self, seed=0, images=64, width=640, height=480, image_folder=None) -> None:
+        """
+        Initializes the BenchmarkDataset, rendering (or sampling) its images.
+
+        Args:
+            seed (int): The seed of the dataset. Defaults to 0.
+            images (int): The number of images. Defaults to 64.
+            width (int): The width of the rendered images. Defaults to 640.
+            height (int): The height of the rendered images. Defaults to 480.
+            image_folder (str): A folder of face images to sample instead of rendering faces. Defaults to None.
+        """
+        self.seed = seed
+        rng = np.random.default_rng([seed, 0])
+
+        if image_folder:
+            self.images = BenchmarkDataset.sample_images(rng, image_folder, images)
+        else:
+            self.images = [BenchmarkDataset.render_face(rng, width, height) for _ in range(images)]
+
+        # the frames as cameras send them
+        self.frames = [
+            base64.b64encode(cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, BenchmarkDataset.JPEG_QUALITY])[1]).decode('utf-8')
+            for image, _ in self.images
+        ]
+        self.faces = [image[y1:y2, x1:x2] for image, (x1, y1, x2, y2) in self.images]
+
+    @property
+    def fingerprint(self):
+        """
+        The SHA-256 of the encoded frames, identical for identical datasets.
+        """
+        digest = hashlib.sha256()
+        for frame in self.frames:
+            digest.update(frame.encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def render_face(rng, width, height):
+        """
+        Renders a cartoon face on a noisy gradient background.
+
+        Args:
+            rng (np.random.Generator): The random generator.
+            width (int): The image width.
+            height (int): The image height.
+
+        Returns:
+            tuple: The image and the face box (x1, y1, x2, y2).
+        """
+        gradient = np.linspace(40, 160, width, dtype=np.float32)[None, :, None]
+        image = (gradient + rng.normal(0, 12, size=(height, width, 3))).clip(0, 255).astype(np.uint8)
+
+        axes = (int(rng.integers(width // 12, width // 6)), 0)
+        axes = (axes[0], int(axes[0] * rng.uniform(1.2, 1.4)))
+        center = (int(rng.integers(axes[0], width - axes[0])), int(rng.integers(axes[1], height - axes[1])))
+        skin = tuple(int(c) for c in rng.integers([90, 120, 160], [150, 180, 230]))
+        cx, cy = center
+        ax, ay = axes
+
+        cv2.ellipse(image, (cx, cy - ay // 2), (ax, ay // 2), 0, 180, 360, tuple(int(c) for c in rng.integers(0, 80, 3)), -1)
+        cv2.ellipse(image, center, axes, 0, 0, 360, skin, -1)
+        for side in (-1, 1):
+            eye = (cx + side * ax // 2, cy - ay // 5)
+            cv2.ellipse(image, eye, (ax // 5, ay // 10), 0, 0, 360, (240, 240, 240), -1)
+            cv2.circle(image, eye, max(1, ax // 12), (40, 30, 20), -1)
+            cv2.line(image, (eye[0] - ax // 5, eye[1] - ay // 6), (eye[0] + ax // 5, eye[1] - ay // 6), (30, 30, 30), max(1, ax // 20))
+        cv2.line(image, (cx, cy - ay // 10), (cx - ax // 10, cy + ay // 5), (60, 80, 110), max(1, ax // 25))
+        cv2.ellipse(image, (cx, cy + ay // 2), (ax // 3, ay // 8), 0, 0, 180, (50, 50, 150), max(1, ax // 15))
+
+        box = (max(0, cx - ax), max(0, cy - ay), min(width, cx + ax), min(height, cy + ay))
+        return image, box
+
+    @staticmethod
+    def sample_images(rng, folder, count):
+        """
+        Samples images from a folder, the whole image being the face box.
+
+        Args:
+            rng (np.random.Generator): The random generator.
+            folder (str): The image folder.
+            count (int): The number of images to sample (all of them if the folder has fewer).
+
+        Returns:
+            list: The (image, box) tuples.
+        """
+        names = sorted(os.listdir(folder))
+        names = [names[i] for i in sorted(rng.choice(len(names), size=min(count, len(names)), replace=False))]
+
+        images = []
+        for name in names:
+            image = cv2.imread(os.path.join(folder, name))
+            if image is not None:
+                images.append((image, (0, 0, image.shape[1], image.shape[0])))
+        return images
+
+    def embedding_chunk(self, chunk):
+        """
+        Generates a chunk of embeddings.
+
+        Args:
+            chunk (int): The chunk number.
+
+        Returns:
+            np.array: The CHUNK_SIZE embeddings of the chunk, shaped (CHUNK_SIZE, DIM).
+        """
+        rng = np.random.default_rng([self.seed, 1, chunk])
+        persons = BenchmarkDataset.CHUNK_SIZE // BenchmarkDataset.SIGHTINGS_PER_PERSON
+
+        centers = rng.standard_normal((persons, BenchmarkDataset.DIM), dtype=np.float32)
+        noise = rng.standard_normal((BenchmarkDataset.CHUNK_SIZE, BenchmarkDataset.DIM), dtype=np.float32)
+        return np.repeat(centers, BenchmarkDataset.SIGHTINGS_PER_PERSON, axis=0) + noise * BenchmarkDataset.EMBEDDING_NOISE
+
+    def embeddings(self, start, count):
+        """
+        Generates a range of embeddings.
+
+        Args:
+            start (int): The index of the first embedding.
+            count (int): The number of embeddings.
+
+        Yields:
+            np.array: The embeddings, one chunk (or part of one) at a time.
+        """
+        end = start + count
+        while start < end:
+            chunk, offset = divmod(start, BenchmarkDataset.CHUNK_SIZE)
+            n = min(end - start, BenchmarkDataset.CHUNK_SIZE - offset)
+            yield self.embedding_chunk(chunk)[offset:offset + n]
+            start += n
+
+    def queries(self, count):
+        """
+        Generates query embeddings: new sightings of the first persons of the dataset.
+
+        Args:
+            count (int): The number of queries.
+
+        Returns:
+            np.array: The queries, shaped (count, DIM).
+        """
+        rng = np.random.default_rng([self.seed, 2])
+        rows = np.arange(count) * BenchmarkDataset.SIGHTINGS_PER_PERSON % BenchmarkDataset.CHUNK_SIZE
+        noise = rng.standard_normal((count, BenchmarkDataset.DIM), dtype=np.float32) * BenchmarkDataset.EMBEDDING_NOISE
+        return self.embedding_chunk(0)[rows] + noise
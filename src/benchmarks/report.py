@@ -0,0 +1,171 @@
+"""
+This module writes the benchmark reports and compares two of them. A report is a JSON file holding the results
+and the metadata needed to tell whether two runs are comparable (commit, machine, library versions, dataset).
+
+Imports:
+    - json: Provides methods to work with JSON data.
+    - os: Provides a way of using operating system-dependent functionality.
+    - platform: Provides information about the machine and the Python interpreter.
+    - subprocess: Used to get the current git commit.
+    - datetime: Supplies classes for manipulating dates and times.
+    - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
+"""
+
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+import numpy as np
+
+def git_commit():
+    """
+    Gets the current git commit of the repository.
+
+    Returns:
+        str: The commit hash, or None outside a git checkout.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def get_metadata(dataset):
+    """
+    Collects the metadata of a benchmark run.
+
+    Args:
+        dataset (BenchmarkDataset): The dataset of the run.
+
+    Returns:
+        dict: The metadata.
+    """
+    try:
+        import faiss
+        faiss_version = faiss.__version__
+    except ImportError:
+        faiss_version = None
+
+    return {
+        'commit': git_commit(),
+        'time': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'faiss': faiss_version,
+        'dataset': {
+            'seed': dataset.seed,
+            'images': len(dataset.images),
+            'fingerprint': dataset.fingerprint
+        }
+    }
+
+def write_report(path, metadata, results):
+    """
+    Writes a benchmark report.
+
+    Args:
+        path (str): The report file path.
+        metadata (dict): The metadata of the run.
+        results (dict): The results of the run.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'metadata': metadata, 'results': results}, f, indent=2)
+
+def read_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+def flatten(results, prefix=''):
+    """
+    Flattens nested results into dotted metric names, keeping the numeric values.
+
+    Args:
+        results (dict): The results.
+        prefix (str): The prefix of the names. Defaults to ''.
+
+    Returns:
+        dict: The metric name -> value.
+    """
+    metrics = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f'{name}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+def direction(metric):
+    """
+    Tells which way a metric is better.
+
+    Args:
+        metric (str): The dotted metric name.
+
+    Returns:
+        int: -1 if lower is better (latencies, durations), 1 if higher is better (throughput, recall), 0 if
+            the metric is informational.
+    """
+    name = metric.rsplit('.', 1)[-1]
+    if name.endswith('_ms') or name.endswith('_s'):
+        return -1
+    if 'per_second' in name or name.startswith('recall'):
+        return 1
+    return 0
+
+def compare_reports(old, new, threshold=0.1):
+    """
+    Compares two benchmark reports, metric by metric.
+
+    Args:
+        old (dict): The baseline report.
+        new (dict): The new report.
+        threshold (float): The relative change considered a regression or an improvement. Defaults to 0.1.
+
+    Returns:
+        tuple: The comparison rows (metric, old value, new value, relative change, status) and the warnings
+            about what makes the reports not comparable.
+    """
+    warnings = []
+    old_metadata, new_metadata = old.get('metadata', {}), new.get('metadata', {})
+    for key in ('platform', 'processor', 'cpus', 'numpy', 'faiss'):
+        if old_metadata.get(key) != new_metadata.get(key):
+            warnings.append(f"{key} differs: {old_metadata.get(key)} -> {new_metadata.get(key)}")
+    if old_metadata.get('dataset', {}).get('fingerprint') != new_metadata.get('dataset', {}).get('fingerprint'):
+        warnings.append('The datasets differ, the results are not comparable')
+
+    old_metrics, new_metrics = flatten(old.get('results', {})), flatten(new.get('results', {}))
+    rows = []
+    for metric in sorted(old_metrics.keys() & new_metrics.keys()):
+        old_value, new_value = old_metrics[metric], new_metrics[metric]
+        change = (new_value - old_value) / abs(old_value) if old_value else None
+
+        status = ''
+        if change is not None and direction(metric) and abs(change) >= threshold:
+            status = 'improved' if change * direction(metric) > 0 else 'REGRESSED'
+        rows.append((metric, old_value, new_value, change, status))
+
+    return rows, warnings
+
+def print_comparison(rows, warnings):
+    """
+    Prints a comparison table.
+
+    Args:
+        rows (list): The comparison rows, see compare_reports.
+        warnings (list): The comparability warnings.
+    """
+    for warning in warnings:
+        print(f'WARNING: {warning}')
+
+    width = max((len(row[0]) for row in rows), default=10)
+    print(f"{'metric':<{width}}  {'old':>14}  {'new':>14}  {'change':>9}  status")
+    for metric, old_value, new_value, change, status in rows:
+        change = f'{change:+.1%}' if change is not None else '-'
+        print(f'{metric:<{width}}  {old_value:>14.4g}  {new_value:>14.4g}  {change:>9}  {status}')
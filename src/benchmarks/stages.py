@@ -0,0 +1,287 @@
+"""
+This module defines the benchmarks of the pipeline stages, each measured on its own, and of the whole pipeline
+end to end. A stage whose dependencies (models, weights) are not available is reported as skipped.
+
+Imports:
+    - os: Provides a way of using operating system-dependent functionality.
+    - tempfile: Provides temporary directories for the benchmark indexes.
+    - time: Provides time-related functions.
+    - traceback: Provides methods for extracting, formatting, and printing stack traces.
+    - datetime: Supplies classes for manipulating dates and times.
+    - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
+"""
+
+import os
+import tempfile
+import time
+import traceback
+from datetime import datetime, timedelta
+import numpy as np
+
+# detections below this confidence are ignored, like ImageProcessor.conf_threshold
+CONF_THRESHOLD = 0.25
+BENCHMARK_LOCATION = {'lat': 32.0853, 'lng': 34.7818}
+
+def summarize(durations):
+    """
+    Summarizes call durations.
+
+    Args:
+        durations (list): The durations in seconds.
+
+    Returns:
+        dict: The count, mean and percentiles in milliseconds and the throughput per second.
+    """
+    durations = np.array(durations, dtype=np.float64)
+    if not len(durations):
+        return {'count': 0}
+
+    ms = durations * 1000
+    return {
+        'count': int(len(durations)),
+        'mean_ms': round(float(ms.mean()), 4),
+        'p50_ms': round(float(np.percentile(ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(ms, 95)), 4),
+        'p99_ms': round(float(np.percentile(ms, 99)), 4),
+        'per_second': round(float(len(durations) / durations.sum()), 2) if durations.sum() else None
+    }
+
+def time_calls(func, items, warmup=2):
+    """
+    Times a function over items, after a few untimed warmup calls.
+
+    Args:
+        func (callable): The function, called with every item.
+        items (list): The items.
+        warmup (int): The number of untimed calls on the first items. Defaults to 2.
+
+    Returns:
+        tuple: The summary of the durations and the results.
+    """
+    for item in items[:warmup]:
+        func(item)
+
+    durations, results = [], []
+    for item in items:
+        started_at = time.perf_counter()
+        results.append(func(item))
+        durations.append(time.perf_counter() - started_at)
+    return summarize(durations), results
+
+def skipped(e):
+    """
+    Builds the result of a stage that could not run.
+
+    Args:
+        e (Exception): The reason.
+
+    Returns:
+        dict: The skipped result.
+    """
+    traceback.print_exc()
+    return {'skipped': f'{type(e).__name__}: {e}'}
+
+def local_mongo_client():
+    """
+    Creates an in-memory MongoDB stand-in (mongomock). mongomock doesn't support time-series collections, so
+    the 'sightings' collection is created as a regular one before DataManager would create it.
+
+    Returns:
+        mongomock.MongoClient: The client.
+    """
+    try:
+        import mongomock
+    except ImportError as e:
+        raise ImportError('The local MongoDB stand-in requires mongomock (pip install mongomock)') from e
+
+    client = mongomock.MongoClient()
+    client['gods_eye'].create_collection('sightings')
+    return client
+
+def crop_faces(image, results):
+    """
+    Crops the detected faces out of an image, like the image processor's crop stage.
+
+    Args:
+        image (numpy.ndarray): The image.
+        results: The YOLO results of the image.
+
+    Returns:
+        list: The cropped faces.
+    """
+    faces = []
+    for xyxy, conf in zip(results.boxes.xyxy.tolist(), results.boxes.conf.tolist()):
+        if conf >= CONF_THRESHOLD:
+            x1, y1, x2, y2 = map(int, xyxy)
+            faces.append(image[y1:y2, x1:x2])
+    return faces
+
+def bench_decode(dataset):
+    """
+    Benchmarks CameraConnection.decode_frame on the dataset's frames.
+    """
+    from src.server.camera_connections.camera_connections import CameraConnection
+
+    summary, _ = time_calls(CameraConnection.decode_frame, dataset.frames)
+    return summary
+
+def bench_detection(dataset):
+    """
+    Benchmarks FaceRecognition.predict on the dataset's images.
+    """
+    from src.server.image_process.face_process.face_recognition import FaceRecognition
+
+    model = FaceRecognition()
+    summary, results = time_calls(model.predict, [image for image, _ in dataset.images])
+    summary['faces_detected'] = sum(len(result[0].boxes) for result in results)
+    return summary
+
+def bench_embedding(dataset):
+    """
+    Benchmarks FeatureExtractor.get_embedding on the dataset's faces.
+    """
+    from src.server.image_process.face_process.deepface_encapsulator import FeatureExtractor
+
+    feature_extractor = FeatureExtractor('Facenet')
+    summary, _ = time_calls(feature_extractor.get_embedding, dataset.faces)
+    return summary
+
+def bench_insert(dataset, count):
+    """
+    Benchmarks DataManager.insert of the dataset's first embeddings (persons seen SIGHTINGS_PER_PERSON times),
+    on the local MongoDB stand-in and a temporary FAISS index.
+
+    Args:
+        dataset (BenchmarkDataset): The dataset.
+        count (int): The number of embeddings to insert.
+    """
+    from src.server.image_process.face_process.data_manager import DataManager
+
+    embeddings = np.concatenate(list(dataset.embeddings(0, count)))
+    start_time = datetime(2024, 1, 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_manager = DataManager(mongodb_url=None, index_path=os.path.join(directory, 'benchmark.index'),
+                                   client=local_mongo_client())
+        try:
+            items = [(i, embedding) for i, embedding in enumerate(embeddings)]
+            summary, _ = time_calls(lambda item: data_manager.insert(embedding=item[1], location=BENCHMARK_LOCATION,
+                                                                     time=start_time + timedelta(seconds=item[0])),
+                                    items, warmup=0)
+        finally:
+            data_manager.sightings_writer.stop()
+
+        summary['persons'] = len(data_manager.person_ids)
+        summary['stored_embeddings'] = len(data_manager.embedding_owners)
+    return summary
+
+def bench_faiss(dataset, sizes, storages, queries=100, k=10):
+    """
+    Benchmarks ThreadSafeFaissIndex build and search at several sizes and storage modes. When 'flat' is
+    benchmarked too, the recall@k of the other storage modes is measured against it.
+
+    Args:
+        dataset (BenchmarkDataset): The dataset.
+        sizes (list): The index sizes.
+        storages (list): The storage modes, see ThreadSafeFaissIndex.STORAGE_TYPES.
+        queries (int): The number of queries. Defaults to 100.
+        k (int): The number of neighbours searched. Defaults to 10.
+
+    Returns:
+        dict: Per storage mode and size, the build time, single query latency, batch throughput and recall.
+    """
+    from src.server.image_process.face_process.data_manager import ThreadSafeFaissIndex
+
+    query_vectors = dataset.queries(queries)
+    storages = sorted(storages, key=lambda storage: storage != 'flat')
+    results = {storage: {} for storage in storages}
+
+    for size in sizes:
+        exact_ids = None
+
+        for storage in storages:
+            with tempfile.TemporaryDirectory() as directory:
+                index = ThreadSafeFaissIndex(os.path.join(directory, 'benchmark.index'), storage=storage)
+
+                started_at = time.perf_counter()
+                added = 0
+                for vectors in dataset.embeddings(0, size):
+                    index.add_embedding_to_faiss(vectors, np.arange(added, added + len(vectors), dtype=np.int64))
+                    added += len(vectors)
+                build_s = time.perf_counter() - started_at
+
+                summary, _ = time_calls(lambda query: index.search(query[None, :], k), list(query_vectors))
+
+                started_at = time.perf_counter()
+                _, ids = index.search(query_vectors, k)
+                batch_s = time.perf_counter() - started_at
+
+                summary.update({
+                    'build_s': round(build_s, 3),
+                    'batch_queries_per_second': round(queries / batch_s, 2) if batch_s else None
+                })
+
+                if storage == 'flat':
+                    exact_ids = ids
+                elif exact_ids is not None:
+                    summary[f'recall_at_{k}'] = round(float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ids, exact_ids)])), 4)
+
+                results[storage][str(size)] = summary
+                del index
+
+    return results
+
+def bench_end_to_end(dataset, repeat=1):
+    """
+    Benchmarks the whole pipeline on every frame: decode, detect, crop, embed and insert, sequentially in one
+    thread, on the local MongoDB stand-in and a temporary FAISS index.
+
+    Args:
+        dataset (BenchmarkDataset): The dataset.
+        repeat (int): The number of passes over the frames. Defaults to 1.
+
+    Returns:
+        dict: The per frame summary and the per stage share of the time.
+    """
+    from src.server.camera_connections.camera_connections import CameraConnection
+    from src.server.image_process.face_process.face_recognition import FaceRecognition
+    from src.server.image_process.face_process.deepface_encapsulator import FeatureExtractor
+    from src.server.image_process.face_process.data_manager import DataManager
+
+    model = FaceRecognition()
+    feature_extractor = FeatureExtractor('Facenet')
+    start_time = datetime(2024, 1, 1)
+    stage_totals = {'decode': 0.0, 'detect': 0.0, 'embed': 0.0, 'insert': 0.0}
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_manager = DataManager(mongodb_url=None, index_path=os.path.join(directory, 'benchmark.index'),
+                                   client=local_mongo_client())
+
+        def process(item):
+            i, frame_data = item
+
+            started_at = time.perf_counter()
+            frame = CameraConnection.decode_frame(frame_data)
+            decoded_at = time.perf_counter()
+            faces = crop_faces(frame, model.predict(frame)[0])
+            detected_at = time.perf_counter()
+            embeddings = [feature_extractor.get_embedding(face) for face in faces]
+            embedded_at = time.perf_counter()
+            for embedding in embeddings:
+                data_manager.insert(embedding=embedding, location=BENCHMARK_LOCATION, time=start_time + timedelta(seconds=i))
+            inserted_at = time.perf_counter()
+
+            for stage, duration in zip(stage_totals, (decoded_at - started_at, detected_at - decoded_at,
+                                                      embedded_at - detected_at, inserted_at - embedded_at)):
+                stage_totals[stage] += duration
+            return len(faces)
+
+        try:
+            summary, faces = time_calls(process, list(enumerate(dataset.frames * repeat)), warmup=0)
+        finally:
+            data_manager.sightings_writer.stop()
+
+    total = sum(stage_totals.values())
+    summary['faces'] = int(sum(faces))
+    summary['stage_share'] = {stage: round(duration / total, 4) if total else None for stage, duration in stage_totals.items()}
+    return summary
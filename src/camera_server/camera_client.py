@@ -6,36 +6,59 @@ Imports:
     - cv2: OpenCV library for computer vision tasks.
     - socket: Provides low-level networking interface.
     - time: Provides time-related functions.
-    - base64: Provides methods for encoding and decoding Base64 data.
     - datetime: Supplies classes for manipulating dates and times.
-    - Queue, Full, Empty: Queue module provides a FIFO implementation.
     - os: Provides a way of using operating system-dependent functionality.
-    - collections.deque: Provides a double-ended queue implementation.
     - traceback: Provides methods for extracting, formatting, and printing stack traces.
     - threading: Allows for the creation and management of threads.
+    - uuid4: Provides methods for generating universally unique identifiers.
     - src.core.protocol.send_data, src.core.protocol.receive_data: Custom modules to handle sending and receiving data.
     - .config.settings: Custom module to access configuration settings.
+    - .frame_ring.FrameRing, .frame_ring.CapturedFrame: Custom module to share the captured frames between the senders.
+    - .frame_spool.FrameSpool: Custom module to spool the frames while disconnected.
 """
 
 import cv2
 import socket
 import time
-import base64
 from datetime import datetime
-from queue import Queue, Full, Empty
 import os
-from collections import deque
 import traceback
 import threading
+from uuid import uuid4
 
 from src.core.protocol import send_data, receive_data
 from .config import settings
+from .frame_ring import FrameRing, CapturedFrame
+from .frame_spool import FrameSpool
 
 class CameraClient:
     """
     A class to represent a camera client that captures frames, sends them to a server, and handles server communication.
+
+    The server periodically grants credits, the number of frames the client may send for analysis in the next
+    interval, and the pressure of its queue. The client spreads its frames over the interval and lowers its JPEG
+    quality as the pressure rises, both smoothed so the camera backs off gradually. Until the first credits
+    arrive (or with a server that doesn't grant any) a frame is sent every DEFAULT_SEND_DELAY seconds.
+
+    The server may also push a capture configuration (target fps, resolution, maximum JPEG quality and a region of
+    interest crop) with the 'configure' command, applied to the frames as they are captured.
+
+    When the connection to the server is lost, the frames for analysis are written to an on-disk spool and the
+    client reconnects with an exponential backoff. Once reconnected the spooled frames are uploaded in batches,
+    with their original timestamps, at settings.SPOOL_REPLAY_RATE frames per second.
     """
-    def __init__(self, location, server_host=settings.HTTP_SERVER_PUBLIC_IP, server_port=settings.HTTP_SERVER_CAMERA_LISTEN_PORT):
+    DEFAULT_SEND_DELAY = 0.2
+    MAX_JPEG_QUALITY = 95
+    MIN_JPEG_QUALITY = 50
+    # weight of a new grant in the smoothed send rate and JPEG quality
+    SMOOTHING = 0.3
+    # the JPEG quality is rounded to this step, so the analysis and live senders share the frames' encodings
+    QUALITY_STEP = 5
+    RECONNECT_DELAY = 1
+    MAX_RECONNECT_DELAY = 30
+
+    def __init__(self, location, server_host=settings.HTTP_SERVER_PUBLIC_IP, server_port=settings.HTTP_SERVER_CAMERA_LISTEN_PORT,
+                 spool_path=settings.SPOOL_PATH):
         """
         Initializes the CameraClient with the specified location, server host, and server port.
 
@@ -43,48 +66,131 @@ class CameraClient:
             location (dict): A dictionary containing the latitude and longitude of the camera.
             server_host (str): The IP address of the server. Defaults to settings.HTTP_SERVER_PUBLIC_IP.
             server_port (int): The port number of the server. Defaults to settings.HTTP_SERVER_CAMERA_LISTEN_PORT.
+            spool_path (str): The directory of the offline spool. Defaults to settings.SPOOL_PATH.
         """
         self.server_host = server_host
         self.server_port = server_port
 
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock = None
+        self.connected = False
+        # the analysis sender and the spool replay share the socket
+        self.send_lock = threading.Lock()
 
         self.live = False
         self.running = True
 
         self.location = location
 
-        self.frame_queue = Queue(maxsize=5)
-        self.frame_buffer = deque()
+        # captured frames, read by both the analysis and the live senders through their own cursors
+        self.frame_ring = FrameRing()
+        self.spool = FrameSpool(spool_path, segment_frames=settings.SPOOL_SEGMENT_FRAMES,
+                                max_segments=settings.SPOOL_MAX_SEGMENTS)
+
+        self.credits = None
+        self.send_rate = None
+        self.credit_interval = 1
+        self.jpeg_quality = CameraClient.MAX_JPEG_QUALITY
+        self.credits_condition = threading.Condition()
+        # age in seconds of the oldest frame of this camera waiting to be processed on the server
+        self.server_lag = None
+
+        self.config = {'fps': None, 'width': None, 'height': None, 'quality': None, 'roi': None}
+        self.config_changed = False
 
         self.id = None
 
+    def open_capture(self):
+        """
+        Opens the frame source.
+
+        Returns:
+            cv2.VideoCapture: The camera capture.
+        """
+        return cv2.VideoCapture(0)
+
     def capture_frames(self):
         """
-        Captures frames from the camera and puts them into the frame queue.
+        Captures frames from the camera and puts them into the frame ring.
         """
         try:
-            cap = cv2.VideoCapture(0)
+            cap = self.open_capture()
 
             if not cap.isOpened():
                 print("Error: Camera could not be opened.")
                 return
             
+            last_capture = 0
             while self.running:
+                if self.config_changed:
+                    self.config_changed = False
+                    self.apply_capture_config(cap)
+
                 ret, frame = cap.read()
 
                 if not ret:
                     print("Error: Could not read frame from camera.")
                     break
-            
-                try:
-                    self.frame_queue.put({'frame': frame, 'time': datetime.now().strftime(r'%Y%m%d_%H%M%S')}, timeout=0.1)
-                except Full:
-                    time.sleep(0.01)
+
+                # frames above the target fps are read (so the camera's buffer doesn't go stale) and dropped
+                if self.config['fps'] and time.time() - last_capture < 1 / self.config['fps']:
+                    continue
+                last_capture = time.time()
+
+                # the trace id and capture time follow the frame to its sightings, to measure its latency
+                captured_at = time.time()
+                self.frame_ring.put(CapturedFrame(self.prepare_frame(frame), datetime.fromtimestamp(captured_at).strftime(r'%Y%m%d_%H%M%S'),
+                                                  trace_id=uuid4().hex, captured_at=captured_at))
         except Exception as e:
             print(e)
             traceback.print_exc()
 
+    def configure(self, config):
+        """
+        Handles a configuration pushed by the server, the capture thread applies it to the next frames.
+
+        Args:
+            config (dict): The 'fps', 'width', 'height', 'quality' and 'roi' settings, None for the default.
+        """
+        self.config = {key: config.get(key) for key in self.config}
+        self.config_changed = True
+
+        with self.credits_condition:
+            if self.config['quality']:
+                self.jpeg_quality = min(self.jpeg_quality, self.config['quality'])
+
+    def apply_capture_config(self, cap):
+        """
+        Requests the configured resolution and frame rate from the camera, which may not support them.
+
+        Args:
+            cap (cv2.VideoCapture): The camera capture.
+        """
+        if self.config['width'] and self.config['height']:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.config['width'])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.config['height'])
+        if self.config['fps']:
+            cap.set(cv2.CAP_PROP_FPS, self.config['fps'])
+
+    def prepare_frame(self, frame):
+        """
+        Crops a captured frame to the configured region of interest and resizes it to the configured resolution.
+
+        Args:
+            frame (numpy.ndarray): The captured frame.
+
+        Returns:
+            numpy.ndarray: The prepared frame.
+        """
+        if roi := self.config['roi']:
+            height, width = frame.shape[:2]
+            x, y, w, h = roi
+            frame = frame[int(y * height):int((y + h) * height), int(x * width):int((x + w) * width)]
+
+        if self.config['width'] and self.config['height'] and frame.shape[:2] != (self.config['height'], self.config['width']):
+            frame = cv2.resize(frame, (self.config['width'], self.config['height']), interpolation=cv2.INTER_AREA)
+
+        return frame
+
     def connect_to_server(self):
         """
         Connects to the server and sends the initial connection message.
@@ -92,6 +198,7 @@ class CameraClient:
         Returns:
             tuple: A tuple containing a boolean indicating success and a message.
         """
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.connect((self.server_host, self.server_port))
         print("Attempting to connect to Server.")
 
@@ -105,56 +212,258 @@ class CameraClient:
         
         response = receive_data(self.sock)
 
-        if response['success']:
+        if response and response['success']:
             self.id = response['id']
+            self.connected = True
             return True, "Connected to Server."
         
         return False, 'Connection Failed'
         
-    def send_frame(self, sock, frame, time=datetime.now().strftime('%Y%m%d_%H%M%S')):
+    def get_jpeg_quality(self):
+        """
+        Gets the current JPEG quality, rounded to QUALITY_STEP.
+
+        Returns:
+            int: The JPEG quality.
+        """
+        return int(round(self.jpeg_quality / CameraClient.QUALITY_STEP) * CameraClient.QUALITY_STEP)
+
+    def disconnect(self, sock):
+        """
+        Marks the client as disconnected after a failure on its socket, the frames are spooled until the client
+        reconnects. Failures on a socket that was already replaced are ignored.
+
+        Args:
+            sock (socket.socket): The socket the failure happened on.
+        """
+        with self.send_lock:
+            if sock is not self.sock or not self.connected:
+                return
+            print("Lost connection to server: spooling frames.")
+            self.connected = False
+            self.live = False
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+        # the server grants new credits after reconnecting
+        with self.credits_condition:
+            self.credits = None
+            self.send_rate = None
+            self.credits_condition.notify_all()
+
+    def maintain_connection(self):
+        """
+        Continuously reconnects to the server when disconnected, with an exponential backoff.
+        """
+        delay = CameraClient.RECONNECT_DELAY
+
+        while self.running:
+            if self.connected:
+                delay = CameraClient.RECONNECT_DELAY
+                time.sleep(1)
+                continue
+
+            try:
+                result, msg = self.connect_to_server()
+                print(msg)
+                if result:
+                    continue
+            except Exception as e:
+                print(e)
+
+            time.sleep(delay)
+            delay = min(delay * 2, CameraClient.MAX_RECONNECT_DELAY)
+
+    def send_to_server(self, message):
+        """
+        Sends a message on the server connection, marking the client as disconnected if it fails.
+
+        Args:
+            message (dict): The message to send.
+
+        Returns:
+            bool: True if the message was sent successfully, False otherwise.
+        """
+        with self.send_lock:
+            sock = self.sock
+            if self.connected and send_data(sock, message):
+                return True
+
+        print("Couldn't send message to server.")
+        self.disconnect(sock)
+        return False
+
+    def send_frame(self, sock, frame, quality=None):
         """
-        Sends a frame to the server after encoding it.
+        Sends a frame to the server, encoding it unless it was already encoded with the same quality.
 
         Args:
             sock (socket.socket): The socket through which the frame is to be sent.
-            frame (numpy.ndarray): The frame to be sent.
-            time (str): The timestamp of the frame. Defaults to the current time.
+            frame (CapturedFrame): The frame to be sent.
+            quality (int): The JPEG quality, OpenCV's default if None. Defaults to None.
 
         Returns:
             bool: True if the frame was sent successfully, False otherwise.
         """
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame_data = base64.b64encode(buffer).decode('utf-8')
-    
-        if not send_data(sock, {'frame': frame_data, 'time': time}):
-            print("Couldn't send message: disconnecting client.")
-            self.running = False
-            return False
-        
-        return True
+        return send_data(sock, CameraClient.frame_message(frame, quality))
+
+    @staticmethod
+    def frame_message(frame, quality=None):
+        """
+        Builds the message of a frame.
+
+        Args:
+            frame (CapturedFrame): The frame.
+            quality (int): The JPEG quality, OpenCV's default if None. Defaults to None.
+
+        Returns:
+            dict: The frame message.
+        """
+        return {'frame': frame.encode(quality), 'time': frame.time, 'trace_id': frame.trace_id, 'captured_at': frame.captured_at}
                         
+    def grant_credits(self, credits, interval, pressure, lag=None):
+        """
+        Handles the credits granted by the server, replacing the remaining ones, and updates the smoothed
+        send rate and JPEG quality.
+
+        Args:
+            credits (int): The number of frames the client may send in the next interval.
+            interval (float): The credit interval in seconds.
+            pressure (float): The pressure of the camera's queue on the server, from 0 to 1.
+            lag (float): The processing lag of the camera's frames on the server in seconds. Defaults to None.
+        """
+        self.server_lag = lag
+        rate = credits / interval
+        max_quality = self.config['quality'] or CameraClient.MAX_JPEG_QUALITY
+        min_quality = min(CameraClient.MIN_JPEG_QUALITY, max_quality)
+        quality = max_quality - pressure * (max_quality - min_quality)
+
+        with self.credits_condition:
+            self.credits = credits
+            self.credit_interval = interval
+            self.send_rate = rate if self.send_rate is None else self.send_rate + (rate - self.send_rate) * CameraClient.SMOOTHING
+            self.jpeg_quality += (quality - self.jpeg_quality) * CameraClient.SMOOTHING
+            self.credits_condition.notify_all()
+
+    def take_credit(self):
+        """
+        Takes a credit to send a frame, waiting a short while for one if there are none left.
+
+        Returns:
+            bool: True if a frame may be sent.
+        """
+        with self.credits_condition:
+            if self.credits is None:
+                return True
+
+            if not self.credits:
+                self.credits_condition.wait(timeout=0.5)
+                if not self.credits:
+                    return False
+
+            self.credits -= 1
+            return True
+
+    def get_send_delay(self):
+        """
+        Gets the delay between two frames sent for analysis.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        if self.send_rate is None:
+            return CameraClient.DEFAULT_SEND_DELAY
+        # never wait longer than an interval, new credits may allow a higher rate
+        return 1 / max(self.send_rate, 1 / self.credit_interval)
+
     def send_frames_for_analysis(self):
         """
-        Continuously sends frames from the frame queue to the server for analysis.
+        Continuously sends the latest captured frames to the server for analysis, as long as there are credits,
+        or spools them while disconnected.
         """
+        cursor = self.frame_ring.cursor()
+
         while self.running:
-            try:
-                frame_data = self.frame_queue.get(timeout=0.1) 
-            except Empty:
-                time.sleep(0.1)
+            if not self.connected:
+                if frame := cursor.get(timeout=0.1):
+                    self.spool.append(CameraClient.frame_message(frame, self.get_jpeg_quality()))
+                    time.sleep(CameraClient.DEFAULT_SEND_DELAY)
+                continue
+
+            if not self.take_credit():
+                continue
+
+            frame = cursor.get(timeout=0.1)
+            if frame is None:
+                # the credit was not used
+                with self.credits_condition:
+                    if self.credits is not None:
+                        self.credits += 1
                 continue
                 
-            if self.send_frame(sock=self.sock, frame=frame_data['frame'], time=frame_data['time']):
-                time.sleep(0.2)
+            message = CameraClient.frame_message(frame, self.get_jpeg_quality())
+            if self.send_to_server(message):
+                time.sleep(self.get_send_delay())
+            else:
+                self.spool.append(message)
+
+    def replay_spool(self):
+        """
+        Continuously uploads the spooled frames while connected, oldest segment first. A segment is removed
+        once all its frames were sent, so frames may be sent twice if the connection is lost again.
+        """
+        while self.running:
+            if not self.connected or not len(self.spool):
+                time.sleep(1)
+                continue
+
+            if oldest := self.spool.oldest():
+                segment, messages = oldest
+                if self.upload(messages):
+                    self.spool.remove(segment)
+
+    def upload(self, messages):
+        """
+        Uploads spooled frame messages in batches at settings.SPOOL_REPLAY_RATE frames per second, taking a
+        credit for every frame.
+
+        Args:
+            messages (list): The frame messages.
+
+        Returns:
+            bool: True if all the messages were sent, False otherwise.
+        """
+        for start in range(0, len(messages), settings.SPOOL_BATCH_SIZE):
+            batch = messages[start:start + settings.SPOOL_BATCH_SIZE]
+
+            for _ in batch:
+                while not self.take_credit():
+                    if not (self.running and self.connected):
+                        return False
+
+            if not self.send_to_server({'frames': batch}):
+                return False
+            time.sleep(len(batch) / settings.SPOOL_REPLAY_RATE)
+
+        return True
 
     def server_communication(self):
         """
         Continuously listens for messages from the server and handles them accordingly.
         """
         while self.running:
-            server_msg = receive_data(self.sock)
+            if not self.connected:
+                time.sleep(0.5)
+                continue
+
+            sock = self.sock
+            server_msg = receive_data(sock)
 
-            if server_msg:
+            if server_msg is None:
+                self.disconnect(sock)
+            else:
                 try:
                     command = server_msg['command']
 
@@ -166,6 +475,11 @@ class CameraClient:
                         self.live = False
                     elif command == 'closeConn':
                         self.running = False
+                    elif command == 'configure':
+                        self.configure(server_msg['config'])
+                    elif command == 'credits':
+                        self.grant_credits(server_msg['credits'], server_msg['interval'], server_msg['pressure'],
+                                           server_msg.get('lag'))
 
                 except Exception as e:
                     print(e)
@@ -176,51 +490,57 @@ class CameraClient:
         Continuously streams live video to the server when the live flag is set.
         """
         while self.running:
-            if self.live:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as live_socket:
-                    live_socket.connect((settings.HTTP_SERVER_PUBLIC_IP, settings.HTTP_SERVER_CAMERA_LIVE_PORT))
+            if self.live and self.connected:
+                try:
+                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as live_socket:
+                        live_socket.connect((settings.HTTP_SERVER_PUBLIC_IP, settings.HTTP_SERVER_CAMERA_LIVE_PORT))
 
-                    if not send_data(live_socket, {'id': self.id}):
-                        print("Couldn't send ID.")
+                        if not send_data(live_socket, {'id': self.id}):
+                            print("Couldn't send ID.")
                         
-                    while self.running and self.live:
-                        try:
-                            frame_data = self.frame_queue.get(timeout=1)
-                            if not self.send_frame(live_socket, frame=frame_data['frame'], time=frame_data['time']):
-                                print("couldn't send live stream")
-                                break
-                            else:
-                                time.sleep(0.01)
-                        except Empty:
-                            pass
-                        except Exception as e:
-                            print(e)
-                            traceback.print_exc()
-
-                    print("finished live")
+                        cursor = self.frame_ring.cursor()
+
+                        while self.running and self.live:
+                            try:
+                                frame = cursor.get(timeout=1)
+                                if frame is None:
+                                    continue
+
+                                if not self.send_frame(live_socket, frame=frame, quality=self.get_jpeg_quality()):
+                                    print("couldn't send live stream")
+                                    break
+                            except Exception as e:
+                                print(e)
+                                traceback.print_exc()
+
+                        print("finished live")
+                except Exception as e:
+                    # the live stream is retried while live is on
+                    print(e)
+                    time.sleep(1)
             else:
                 time.sleep(5)
 
     def start(self):
         """
-        Starts the camera client, connecting to the server and starting necessary threads.
+        Starts the camera client, connecting to the server and starting necessary threads. If the server can't
+        be reached the frames are spooled until it can.
         """
         try:
             result, msg = self.connect_to_server()
-
-            if result:
-                self.running = True
-
-                threading.Thread(target=self.capture_frames).start()
-                threading.Thread(target=self.send_frames_for_analysis).start()
-                threading.Thread(target=self.server_communication).start()
-                threading.Thread(target=self.live_video).start()
-            else:
-                print(msg)
+            print(msg)
         except Exception as e:
             print(e)
             traceback.print_exc()
-            self.running = False
+
+        self.running = True
+
+        threading.Thread(target=self.capture_frames).start()
+        threading.Thread(target=self.send_frames_for_analysis).start()
+        threading.Thread(target=self.server_communication).start()
+        threading.Thread(target=self.live_video).start()
+        threading.Thread(target=self.maintain_connection).start()
+        threading.Thread(target=self.replay_spool).start()
 
 if __name__ == '__main__':
     client = CameraClient(location={'lat': 32.1241975, 'lng' : 34.825830})
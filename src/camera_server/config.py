@@ -11,4 +11,10 @@ class Settings(BaseSettings):
     HTTP_SERVER_CAMERA_LISTEN_PORT: int
     HTTP_SERVER_CAMERA_LIVE_PORT: int
 
+    SPOOL_PATH: str = 'data/spool'
+    SPOOL_SEGMENT_FRAMES: int = 100
+    SPOOL_MAX_SEGMENTS: int = 50
+    SPOOL_REPLAY_RATE: float = 10
+    SPOOL_BATCH_SIZE: int = 10
+
 settings = Settings()
\ No newline at end of file
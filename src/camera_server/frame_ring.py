@@ -0,0 +1,137 @@
+"""
+This module defines a FrameRing class, a single producer, multiple consumers ring buffer of captured frames.
+Every consumer reads through its own FrameCursor, so the analysis and live senders both see every frame they
+are fast enough to take, and a captured frame is JPEG encoded at most once per quality whoever sends it.
+
+Imports:
+    - cv2: OpenCV library for computer vision tasks.
+    - base64: Provides methods for encoding and decoding Base64 data.
+    - threading: Allows for the creation and management of threads.
+"""
+
+import cv2
+import base64
+import threading
+
+class CapturedFrame:
+    """
+    A captured frame, its capture time, trace id and its cached encodings.
+    """
+
+    def __init__(self, frame, time, trace_id=None, captured_at=None) -> None:
+        """
+        Initializes the CapturedFrame.
+
+        Args:
+            frame (numpy.ndarray): The frame.
+            time (str): The capture timestamp of the frame.
+            trace_id (str): The id tracing the frame through the server's pipeline. Defaults to None.
+            captured_at (float): The capture time in seconds since the epoch. Defaults to None.
+        """
+        self.frame = frame
+        self.time = time
+        self.trace_id = trace_id
+        self.captured_at = captured_at
+        self.encodings = {}
+        self.lock = threading.Lock()
+
+    def encode(self, quality=None):
+        """
+        Encodes the frame to base64 JPEG, once per quality.
+
+        Args:
+            quality (int): The JPEG quality, OpenCV's default if None. Defaults to None.
+
+        Returns:
+            str: The base64 encoded JPEG.
+        """
+        quality = int(quality) if quality else None
+
+        with self.lock:
+            if quality not in self.encodings:
+                params = [cv2.IMWRITE_JPEG_QUALITY, quality] if quality else []
+                _, buffer = cv2.imencode('.jpg', self.frame, params)
+                self.encodings[quality] = base64.b64encode(buffer).decode('utf-8')
+            return self.encodings[quality]
+
+class FrameCursor:
+    """
+    The read position of one consumer in a FrameRing. With drop_to_latest the consumer always gets the newest
+    frame, skipping the ones it was too slow for, otherwise it gets the oldest frame still in the ring.
+    """
+
+    def __init__(self, ring, drop_to_latest=True) -> None:
+        """
+        Initializes the FrameCursor at the ring's current end, so only the frames captured from now on are read.
+
+        Args:
+            ring (FrameRing): The ring to read.
+            drop_to_latest (bool): Whether to skip to the newest frame. Defaults to True.
+        """
+        self.ring = ring
+        self.drop_to_latest = drop_to_latest
+        self.position = ring.sequence
+        self.dropped = 0
+
+    def get(self, timeout=None):
+        """
+        Gets the next frame, waiting for one to be captured.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait. Defaults to None (no limit).
+
+        Returns:
+            CapturedFrame: The next frame, or None if none was captured in time.
+        """
+        with self.ring.condition:
+            if not self.ring.condition.wait_for(lambda: self.ring.sequence > self.position, timeout=timeout):
+                return None
+
+            oldest = max(self.position, self.ring.sequence - self.ring.capacity)
+            position = self.ring.sequence - 1 if self.drop_to_latest else oldest
+
+            self.dropped += position - self.position
+            self.position = position + 1
+            return self.ring.slots[position % self.ring.capacity]
+
+class FrameRing:
+    """
+    A fixed size ring buffer of captured frames, the producer never blocks and overwrites the oldest frame.
+    """
+
+    def __init__(self, capacity=8) -> None:
+        """
+        Initializes the FrameRing.
+
+        Args:
+            capacity (int): The number of frames kept. Defaults to 8.
+        """
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.sequence = 0   # sequence number of the next frame
+        self.condition = threading.Condition()
+
+    def put(self, frame):
+        """
+        Adds a frame, overwriting the oldest one if the ring is full, and wakes up the consumers.
+
+        Args:
+            frame (CapturedFrame): The frame to add.
+        """
+        with self.condition:
+            self.slots[self.sequence % self.capacity] = frame
+            self.sequence += 1
+            self.condition.notify_all()
+
+    def cursor(self, drop_to_latest=True):
+        """
+        Creates a new consumer cursor.
+
+        Args:
+            drop_to_latest (bool): Whether the consumer skips to the newest frame. Defaults to True.
+
+        Returns:
+            FrameCursor: The cursor, positioned at the ring's current end.
+        """
+        with self.condition:
+            return FrameCursor(self, drop_to_latest)
@@ -0,0 +1,136 @@
+"""
+This module defines a FrameSpool class, a bounded on-disk spool of the frames a camera captures while it is
+disconnected from the server, so they can be uploaded once it reconnects.
+
+Imports:
+    - os: Provides a way of using operating system-dependent functionality.
+    - json: Provides methods to work with JSON data.
+    - struct: Provides methods to pack and unpack the records length headers.
+    - threading: Allows for the creation and management of threads.
+"""
+
+import os
+import json
+import struct
+import threading
+
+class FrameSpool:
+    """
+    A spool of frame messages stored in segment files, every record a JSON message with a length header (like
+    src.core.protocol). Frames are appended to the newest segment and read back a whole segment at a time,
+    oldest first. When the spool holds more than `max_segments` segments the oldest one is dropped.
+    """
+    SEGMENT_PREFIX = 'segment-'
+    SEGMENT_SUFFIX = '.spool'
+
+    def __init__(self, directory, segment_frames=100, max_segments=50) -> None:
+        """
+        Initializes the FrameSpool, picking up the segments left by a previous run.
+
+        Args:
+            directory (str): The directory of the segment files.
+            segment_frames (int): The number of frames per segment. Defaults to 100.
+            max_segments (int): The maximum number of segments kept. Defaults to 50.
+        """
+        self.directory = directory
+        self.segment_frames = segment_frames
+        self.max_segments = max_segments
+        self.lock = threading.Lock()
+        self.dropped_frames = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.segments = sorted(int(name[len(FrameSpool.SEGMENT_PREFIX):-len(FrameSpool.SEGMENT_SUFFIX)])
+                               for name in os.listdir(directory)
+                               if name.startswith(FrameSpool.SEGMENT_PREFIX) and name.endswith(FrameSpool.SEGMENT_SUFFIX))
+        # frames in the newest segment, segments left by a previous run are not appended to
+        self.current_frames = segment_frames
+
+    def __len__(self):
+        return len(self.segments)
+
+    def segment_path(self, segment):
+        """
+        Gets the path of a segment file.
+
+        Args:
+            segment (int): The segment number.
+
+        Returns:
+            str: The path of the segment file.
+        """
+        return os.path.join(self.directory, f'{FrameSpool.SEGMENT_PREFIX}{segment:08d}{FrameSpool.SEGMENT_SUFFIX}')
+
+    def append(self, message):
+        """
+        Appends a frame message to the newest segment, starting a new segment when it is full and dropping the
+        oldest one when there are too many.
+
+        Args:
+            message (dict): The frame message, as sent to the server.
+        """
+        data = json.dumps(message).encode('utf-8')
+
+        with self.lock:
+            if self.current_frames >= self.segment_frames:
+                self.segments.append(self.segments[-1] + 1 if self.segments else 0)
+                self.current_frames = 0
+
+                if len(self.segments) > self.max_segments:
+                    oldest = self.segments.pop(0)
+                    self.dropped_frames += len(self.read(oldest))
+                    os.remove(self.segment_path(oldest))
+
+            with open(self.segment_path(self.segments[-1]), 'ab') as f:
+                f.write(struct.pack('!I', len(data)) + data)
+            self.current_frames += 1
+
+    def read(self, segment):
+        """
+        Reads the frame messages of a segment, ignoring a truncated last record.
+
+        Args:
+            segment (int): The segment number.
+
+        Returns:
+            list: The frame messages.
+        """
+        messages = []
+        with open(self.segment_path(segment), 'rb') as f:
+            data = f.read()
+
+        offset = 0
+        while offset + 4 <= len(data):
+            length = struct.unpack('!I', data[offset:offset + 4])[0]
+            if offset + 4 + length > len(data):
+                break
+            messages.append(json.loads(data[offset + 4:offset + 4 + length].decode('utf-8')))
+            offset += 4 + length
+        return messages
+
+    def oldest(self):
+        """
+        Gets the oldest segment, closing it if it is the one being written.
+
+        Returns:
+            tuple: The segment number and its frame messages, or None if the spool is empty.
+        """
+        with self.lock:
+            if not self.segments:
+                return None
+
+            segment = self.segments[0]
+            if len(self.segments) == 1:
+                self.current_frames = self.segment_frames
+            return segment, self.read(segment)
+
+    def remove(self, segment):
+        """
+        Removes an uploaded segment.
+
+        Args:
+            segment (int): The segment number.
+        """
+        with self.lock:
+            if segment in self.segments:
+                self.segments.remove(segment)
+                os.remove(self.segment_path(segment))
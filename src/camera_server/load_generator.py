@@ -0,0 +1,388 @@
+"""
+This module defines a load generator that runs many virtual cameras from one process against a server. Every
+virtual camera is a CameraClient, speaking the same protocol as a real camera, whose frames come from a video
+file, an image folder or synthetic frames instead of `cv2.VideoCapture(0)`. It reports the achieved frame rate,
+the send latency and the server-side processing lag, to size hardware and catch regressions in the ingest
+and processing servers.
+
+Usage:
+    python -m src.camera_server.load_generator --cameras 100 --fps 5 --duration 60
+    python -m src.camera_server.load_generator --cameras 20 --video data/sample.mp4 --report report.json
+
+Imports:
+    - argparse: Provides the command line interface.
+    - cv2: OpenCV library for computer vision tasks.
+    - json: Provides methods to work with JSON data.
+    - os: Provides a way of using operating system-dependent functionality.
+    - socket: Provides low-level networking interface.
+    - threading: Allows for the creation and management of threads.
+    - time: Provides time-related functions.
+    - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
+    - collections.deque: Provides a double-ended queue implementation.
+    - .camera_client.CameraClient: Custom module of the camera client the virtual cameras are built on.
+    - .config.settings: Custom module to access configuration settings.
+"""
+
+import argparse
+import cv2
+import json
+import os
+import socket
+import threading
+import time
+import numpy as np
+from collections import deque
+
+from .camera_client import CameraClient
+from .config import settings
+
+class FrameSource:
+    """
+    The base of the virtual frame sources, a cv2.VideoCapture look-alike that paces its frames at `fps`.
+    """
+
+    def __init__(self, fps) -> None:
+        """
+        Initializes the FrameSource.
+
+        Args:
+            fps (float): The frame rate of the source.
+        """
+        self.fps = fps
+        self.next_frame_time = time.monotonic()
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    def set(self, prop, value):
+        """
+        Handles the capture properties the client sets, only the frame rate is supported (frames are resized by
+        the client).
+
+        Returns:
+            bool: True if the property was set.
+        """
+        if prop == cv2.CAP_PROP_FPS and value > 0:
+            self.fps = value
+            return True
+        return False
+
+    def release(self):
+        self.opened = False
+
+    def read(self):
+        """
+        Waits for the next frame time and returns the next frame.
+
+        Returns:
+            tuple: True and the frame, or False and None when the source is exhausted.
+        """
+        delay = self.next_frame_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        # don't burst to catch up after a stall
+        self.next_frame_time = max(self.next_frame_time, time.monotonic() - 1 / self.fps) + 1 / self.fps
+
+        frame = self.next_frame() if self.opened else None
+        return frame is not None, frame
+
+    def next_frame(self):
+        """
+        Produces the next frame, implemented by the sources.
+
+        Returns:
+            numpy.ndarray: The frame, or None when the source is exhausted.
+        """
+        raise NotImplementedError
+
+class SyntheticSource(FrameSource):
+    """
+    A source of synthetic frames: a noisy background with a moving bright ellipse. The frames of a given size are
+    generated once and shared by all the sources, every source starting at its own offset.
+    """
+    FRAMES = 32
+    cache = {}
+    cache_lock = threading.Lock()
+
+    def __init__(self, fps, width=640, height=480, offset=0) -> None:
+        super().__init__(fps)
+        self.frames = SyntheticSource.get_frames(width, height)
+        self.index = offset % len(self.frames)
+
+    @staticmethod
+    def get_frames(width, height):
+        """
+        Gets the shared synthetic frames of a given size, generating them on first use.
+
+        Args:
+            width (int): The frame width.
+            height (int): The frame height.
+
+        Returns:
+            list: The frames.
+        """
+        with SyntheticSource.cache_lock:
+            if (width, height) not in SyntheticSource.cache:
+                rng = np.random.default_rng(0)
+                frames = []
+                for i in range(SyntheticSource.FRAMES):
+                    frame = rng.integers(0, 64, size=(height, width, 3), dtype=np.uint8)
+                    center = (int(width * (0.2 + 0.6 * i / SyntheticSource.FRAMES)), height // 2)
+                    cv2.ellipse(frame, center, (width // 12, height // 8), 0, 0, 360, (200, 180, 160), -1)
+                    frames.append(frame)
+                SyntheticSource.cache[(width, height)] = frames
+            return SyntheticSource.cache[(width, height)]
+
+    def next_frame(self):
+        frame = self.frames[self.index]
+        self.index = (self.index + 1) % len(self.frames)
+        return frame
+
+class ImageFolderSource(FrameSource):
+    """
+    A source cycling over the images of a folder, loaded once and shared by all the sources.
+    """
+    cache = {}
+    cache_lock = threading.Lock()
+
+    def __init__(self, fps, folder, offset=0) -> None:
+        super().__init__(fps)
+        with ImageFolderSource.cache_lock:
+            if folder not in ImageFolderSource.cache:
+                images = (cv2.imread(os.path.join(folder, name)) for name in sorted(os.listdir(folder)))
+                ImageFolderSource.cache[folder] = [image for image in images if image is not None]
+        self.images = ImageFolderSource.cache[folder]
+        if not self.images:
+            raise ValueError(f'No images in {folder}')
+        self.index = offset % len(self.images)
+
+    def next_frame(self):
+        image = self.images[self.index]
+        self.index = (self.index + 1) % len(self.images)
+        return image
+
+class VideoFileSource(FrameSource):
+    """
+    A source playing a video file in a loop, at the given frame rate or the file's own.
+    """
+
+    def __init__(self, fps, path, offset=0) -> None:
+        self.video = cv2.VideoCapture(path)
+        if not self.video.isOpened():
+            raise ValueError(f'Could not open {path}')
+        super().__init__(fps or self.video.get(cv2.CAP_PROP_FPS) or 25)
+
+        frame_count = int(self.video.get(cv2.CAP_PROP_FRAME_COUNT))
+        if frame_count:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, offset % frame_count)
+
+    def next_frame(self):
+        ret, frame = self.video.read()
+        if not ret:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.video.read()
+        return frame if ret else None
+
+    def release(self):
+        super().release()
+        self.video.release()
+
+class VirtualCamera(CameraClient):
+    """
+    A CameraClient reading its frames from a FrameSource, and recording the latency of its frame sends.
+    """
+    LATENCY_WINDOW = 1000
+
+    def __init__(self, location, make_source, server_host, server_port, spool_path) -> None:
+        """
+        Initializes the VirtualCamera.
+
+        Args:
+            location (dict): The latitude and longitude of the camera.
+            make_source (callable): Creates the camera's FrameSource.
+            server_host (str): The IP address of the server.
+            server_port (int): The port number of the server.
+            spool_path (str): The directory of the camera's offline spool.
+        """
+        super().__init__(location, server_host=server_host, server_port=server_port, spool_path=spool_path)
+        self.make_source = make_source
+        self.sent_frames = 0
+        self.latencies = deque(maxlen=VirtualCamera.LATENCY_WINDOW)
+        self.stats_lock = threading.Lock()
+
+    def open_capture(self):
+        return self.make_source()
+
+    def send_to_server(self, message):
+        started_at = time.perf_counter()
+        result = super().send_to_server(message)
+
+        if result:
+            with self.stats_lock:
+                self.sent_frames += len(message.get('frames', [message]))
+                self.latencies.append(time.perf_counter() - started_at)
+        return result
+
+    def stop(self):
+        """
+        Stops the camera's threads and closes its connection.
+        """
+        self.running = False
+        self.live = False
+        if self.sock:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+                self.sock.close()
+            except OSError:
+                pass
+
+class LoadGenerator:
+    """
+    Runs virtual cameras against a server and reports their throughput and latency.
+    """
+    # distance in degrees between two virtual cameras, every camera gets its own location (and server queue)
+    LOCATION_STEP = 0.0001
+
+    def __init__(self, cameras, make_source, server_host, server_port, base_location, spool_root='data/load_generator_spool',
+                 ramp_up=0.01) -> None:
+        """
+        Initializes the LoadGenerator.
+
+        Args:
+            cameras (int): The number of virtual cameras.
+            make_source (callable): Called with the camera index, creates the camera's FrameSource.
+            server_host (str): The IP address of the server.
+            server_port (int): The port number of the server.
+            base_location (dict): The location of the first camera, the others are placed on a grid around it.
+            spool_root (str): The parent directory of the cameras' spools. Defaults to 'data/load_generator_spool'.
+            ramp_up (float): The delay in seconds between starting two cameras. Defaults to 0.01.
+        """
+        side = int(np.ceil(np.sqrt(cameras)))
+        self.cameras = [
+            VirtualCamera(
+                location={'lat': round(base_location['lat'] + (i // side) * LoadGenerator.LOCATION_STEP, 7),
+                          'lng': round(base_location['lng'] + (i % side) * LoadGenerator.LOCATION_STEP, 7)},
+                make_source=lambda i=i: make_source(i),
+                server_host=server_host,
+                server_port=server_port,
+                spool_path=os.path.join(spool_root, str(i))
+            )
+            for i in range(cameras)
+        ]
+        self.ramp_up = ramp_up
+        self.started_at = None
+        self.last_report = None
+
+    def start(self):
+        """
+        Starts the virtual cameras, one every `ramp_up` seconds.
+        """
+        self.started_at = time.monotonic()
+        self.last_report = (self.started_at, 0)
+
+        for camera in self.cameras:
+            camera.start()
+            time.sleep(self.ramp_up)
+
+    def stop(self):
+        """
+        Stops the virtual cameras.
+        """
+        for camera in self.cameras:
+            camera.stop()
+
+    def report(self):
+        """
+        Aggregates the statistics of the cameras since the last report.
+
+        Returns:
+            dict: The elapsed time, connected cameras, achieved frame rate (total and per camera), send latency
+                percentiles in milliseconds, server processing lag in seconds and spooled segments.
+        """
+        now = time.monotonic()
+        sent, latencies = 0, []
+        for camera in self.cameras:
+            with camera.stats_lock:
+                sent += camera.sent_frames
+                latencies.extend(camera.latencies)
+        latencies = np.array(latencies, dtype=np.float64) * 1000
+        lags = np.array([camera.server_lag for camera in self.cameras if camera.server_lag is not None], dtype=np.float64)
+
+        last_time, last_sent = self.last_report
+        self.last_report = (now, sent)
+        fps = (sent - last_sent) / max(now - last_time, 1e-9)
+
+        return {
+            'elapsed_s': round(now - self.started_at, 1),
+            'cameras': len(self.cameras),
+            'connected': sum(camera.connected for camera in self.cameras),
+            'frames_sent': sent,
+            'fps': round(fps, 2),
+            'fps_per_camera': round(fps / len(self.cameras), 2),
+            'send_latency_ms': {
+                f'p{p}': round(float(np.percentile(latencies, p)), 2) for p in (50, 95, 99)
+            } if len(latencies) else None,
+            'server_lag_s': {
+                'mean': round(float(lags.mean()), 2),
+                'max': round(float(lags.max()), 2)
+            } if len(lags) else None,
+            'spooled_segments': sum(len(camera.spool) for camera in self.cameras)
+        }
+
+    def run(self, duration, report_interval=5):
+        """
+        Runs the load for a duration, printing a report every `report_interval` seconds.
+
+        Args:
+            duration (float): The duration of the run in seconds.
+            report_interval (float): The delay between two reports in seconds. Defaults to 5.
+
+        Returns:
+            dict: The final report, its rates are averaged over the whole run.
+        """
+        self.start()
+        try:
+            while time.monotonic() - self.started_at < duration:
+                time.sleep(min(report_interval, max(0, duration - (time.monotonic() - self.started_at))))
+                print(json.dumps(self.report()))
+        finally:
+            self.last_report = (self.started_at, 0)
+            summary = self.report()
+            self.stop()
+        return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs virtual cameras against the camera server.')
+    parser.add_argument('--cameras', type=int, default=10, help='number of virtual cameras')
+    parser.add_argument('--fps', type=float, default=5, help='capture frame rate of every camera')
+    parser.add_argument('--video', help='video file to play (in a loop) instead of synthetic frames')
+    parser.add_argument('--images', help='image folder to cycle over instead of synthetic frames')
+    parser.add_argument('--width', type=int, default=640, help='synthetic frame width')
+    parser.add_argument('--height', type=int, default=480, help='synthetic frame height')
+    parser.add_argument('--host', default=settings.HTTP_SERVER_IP, help='camera server address')
+    parser.add_argument('--port', type=int, default=settings.HTTP_SERVER_CAMERA_LISTEN_PORT, help='camera server port')
+    parser.add_argument('--lat', type=float, default=32.0853, help='latitude of the first camera')
+    parser.add_argument('--lng', type=float, default=34.7818, help='longitude of the first camera')
+    parser.add_argument('--duration', type=float, default=60, help='duration of the run in seconds')
+    parser.add_argument('--interval', type=float, default=5, help='delay between two reports in seconds')
+    parser.add_argument('--report', help='file to write the final report to, as JSON')
+    args = parser.parse_args()
+
+    if args.video:
+        make_source = lambda i: VideoFileSource(args.fps, args.video, offset=i * 7)
+    elif args.images:
+        make_source = lambda i: ImageFolderSource(args.fps, args.images, offset=i)
+    else:
+        make_source = lambda i: SyntheticSource(args.fps, width=args.width, height=args.height, offset=i)
+
+    generator = LoadGenerator(args.cameras, make_source, args.host, args.port, {'lat': args.lat, 'lng': args.lng})
+    summary = generator.run(args.duration, args.interval)
+
+    print(json.dumps(summary, indent=4))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(summary, f, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+This module defines a FrameTrace class, the trace of a frame from its capture by the camera to its sighting
+being indexed, and a TraceRecorder class that keeps the latency percentiles of the recent traces and flags the
+slow frames.
+
+A trace is made of timestamped marks (time.time(), seconds since the epoch):
+    - captured: the camera captured the frame (the camera's clock).
+    - received: the camera server received the frame.
+    - queued: the image processor found the frame's file and queued it.
+    - dequeued: the frame was taken from its camera's queue into the pipeline.
+    - detected: the faces were detected in the frame.
+    - embedded: the face's embedding was extracted (per face from here on).
+    - indexed: the face's sighting was matched and indexed.
+The capture mark comes from the camera's clock, so the capture to receive segment includes the clock skew
+between the camera and the server. Frames spooled by a disconnected camera and replayed later are flagged as
+replayed, their capture to receive segment includes the disconnection.
+
+Imports:
+    - time: Provides time-related functions.
+    - threading: Allows for the creation and management of threads.
+    - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
+    - collections.deque: Provides a double-ended queue implementation.
+    - datetime: Supplies classes for manipulating dates and times.
+    - os: Provides a way of using operating system-dependent functionality.
+    - uuid4: Provides methods for generating universally unique identifiers.
+    - src.core.metrics: Custom module for the in-process metrics.
+"""
+
+import time
+import threading
+import numpy as np
+from collections import deque
+from datetime import datetime
+import os
+from uuid import uuid4
+
+from src.core import metrics
+
+FRAME_LATENCY_SECONDS = metrics.histogram('frame_latency_seconds', 'Frame latency by trace segment, total is capture to indexed',
+                                          ['segment'], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300))
+SLOW_FRAMES = metrics.counter('slow_frames_total', 'Faces indexed later than the slow frame threshold after capture', ['camera'])
+# counted both by the camera server (on arrival) and the image processor (shed from a full queue)
+FRAMES_DROPPED = metrics.counter('camera_frames_dropped_total', 'Frames dropped on arrival or shed from a full camera queue, '
+                                 'by source (live or replayed from the camera spool)', ['camera', 'source'])
+
+class FrameTrace:
+    """
+    The trace of a frame, or of one face of a frame once it is cropped.
+    """
+    MARKS = ('captured', 'received', 'queued', 'dequeued', 'detected', 'embedded', 'indexed')
+
+    def __init__(self, trace_id=None, captured_at=None, received_at=None, replayed=False) -> None:
+        """
+        Initializes the FrameTrace.
+
+        Args:
+            trace_id (str): The trace id, a new one if None. Defaults to None.
+            captured_at (float): The capture time of the frame. Defaults to None.
+            received_at (float): The time the server received the frame. Defaults to None.
+            replayed (bool): Whether the frame was replayed from the camera's spool. Defaults to False.
+        """
+        self.trace_id = trace_id or FrameTrace.new_trace_id()
+        self.replayed = replayed
+        self.marks = {}
+        if captured_at is not None:
+            self.marks['captured'] = float(captured_at)
+        if received_at is not None:
+            self.marks['received'] = float(received_at)
+
+    @staticmethod
+    def new_trace_id():
+        return uuid4().hex
+
+    @property
+    def source(self):
+        return 'replay' if self.replayed else 'live'
+
+    def mark(self, event, at=None):
+        """
+        Marks an event of the trace.
+
+        Args:
+            event (str): The event, one of MARKS.
+            at (float): The time of the event. Defaults to now.
+        """
+        self.marks[event] = time.time() if at is None else at
+
+    def fork(self):
+        """
+        Copies the trace, for every face of a frame to carry its own marks.
+
+        Returns:
+            FrameTrace: The copy.
+        """
+        trace = FrameTrace(self.trace_id, replayed=self.replayed)
+        trace.marks = dict(self.marks)
+        return trace
+
+    def captured_datetime(self):
+        """
+        Gets the capture time of the frame.
+
+        Returns:
+            datetime: The capture time, or None if the camera didn't send it.
+        """
+        if 'captured' in self.marks:
+            return datetime.fromtimestamp(self.marks['captured'])
+        return None
+
+    def latency(self, end='indexed'):
+        """
+        Gets the latency of the frame up to an event, from its capture (or from its reception if the camera
+        didn't send its capture time).
+
+        Args:
+            end (str): The event. Defaults to 'indexed'.
+
+        Returns:
+            float: The latency in seconds, or None if the event is not marked.
+        """
+        start = self.marks.get('captured', self.marks.get('received'))
+        if start is None or end not in self.marks:
+            return None
+        return self.marks[end] - start
+
+    def segments(self):
+        """
+        Gets the time between every two consecutive marks.
+
+        Returns:
+            dict: The '<start>_to_<end>' segment -> seconds.
+        """
+        marked = [event for event in FrameTrace.MARKS if event in self.marks]
+        return {f'{start}_to_{end}': self.marks[end] - self.marks[start] for start, end in zip(marked, marked[1:])}
+
+    def to_dict(self):
+        latency = self.latency()
+        return {
+            'id': self.trace_id,
+            'replayed': self.replayed,
+            'latency': latency,
+            'segments': self.segments()
+        }
+
+    def filename_prefix(self):
+        """
+        Encodes the trace id, capture and reception times (in milliseconds) for the frame's file name, and
+        whether the frame was replayed.
+
+        Returns:
+            str: '<trace id>_<captured ms>_<received ms>', the times empty if unknown, followed by '_r' if the
+                frame was replayed.
+        """
+        times = (self.marks.get(event) for event in ('captured', 'received'))
+        parts = [self.trace_id] + ['' if at is None else str(int(at * 1000)) for at in times]
+        return '_'.join(parts + ['r'] if self.replayed else parts)
+
+    @staticmethod
+    def from_filename(file_path):
+        """
+        Decodes the trace of a frame from its file name, '<trace prefix>-<time>.jpg'.
+
+        Args:
+            file_path (str): The frame's file path.
+
+        Returns:
+            FrameTrace: The trace, or None if the file name holds no trace.
+        """
+        prefix = os.path.basename(file_path).rsplit('-', 1)[0]
+        parts = prefix.split('_')
+        if len(parts) not in (3, 4) or parts[3:] not in ([], ['r']):
+            return None
+
+        try:
+            captured_at, received_at = (int(part) / 1000 if part else None for part in parts[1:3])
+        except ValueError:
+            return None
+        return FrameTrace(parts[0], captured_at, received_at, replayed=len(parts) == 4)
+
+class TraceRecorder:
+    """
+    Keeps the latency of the recently indexed faces and the traces of the slow ones.
+    """
+
+    def __init__(self, slow_threshold, window=1000, slow_kept=50) -> None:
+        """
+        Initializes the TraceRecorder.
+
+        Args:
+            slow_threshold (float): The capture to indexed latency in seconds above which a frame is slow.
+            window (int): The number of recent traces kept for the percentiles. Defaults to 1000.
+            slow_kept (int): The number of recent slow traces kept. Defaults to 50.
+        """
+        self.slow_threshold = slow_threshold
+        self.latencies = deque(maxlen=window)
+        self.segments = deque(maxlen=window)
+        self.slow = deque(maxlen=slow_kept)
+        self.recorded = 0
+        self.slow_count = 0
+        self.lock = threading.Lock()
+
+    def record(self, trace, camera):
+        """
+        Records a completed trace.
+
+        Args:
+            trace (FrameTrace): The trace, marked up to 'indexed'.
+            camera (str): The camera of the frame.
+
+        Returns:
+            bool: True if the frame was slow.
+        """
+        latency = trace.latency()
+        segments = trace.segments()
+
+        for segment, seconds in segments.items():
+            FRAME_LATENCY_SECONDS.observe(seconds, segment=segment)
+        if latency is None:
+            return False
+        FRAME_LATENCY_SECONDS.observe(latency, segment='total')
+
+        is_slow = latency > self.slow_threshold
+        with self.lock:
+            self.recorded += 1
+            self.latencies.append(latency)
+            self.segments.append(segments)
+            if is_slow:
+                self.slow_count += 1
+                self.slow.append({'id': trace.trace_id, 'camera': camera, 'latency': latency, 'segments': segments,
+                                  'captured': trace.captured_datetime().isoformat() if 'captured' in trace.marks else None})
+
+        if is_slow:
+            SLOW_FRAMES.inc(camera=camera)
+        return is_slow
+
+    def get_stats(self):
+        """
+        Reports the latency percentiles of the recent traces, overall and by segment, and the recent slow frames.
+
+        Returns:
+            dict: The counts, the capture to indexed and per segment p50, p95 and p99 in milliseconds, the slow
+                threshold and the slow frames.
+        """
+        with self.lock:
+            latencies = np.array(self.latencies, dtype=np.float64) * 1000
+            segments = list(self.segments)
+            stats = {'recorded': self.recorded, 'slow': self.slow_count, 'slow_threshold_ms': self.slow_threshold * 1000,
+                     'slow_frames': list(self.slow)}
+
+        def percentiles(values):
+            return {f'p{q}': float(np.percentile(values, q)) for q in (50, 95, 99)} if len(values) else None
+
+        stats['latency_ms'] = percentiles(latencies)
+        names = dict.fromkeys(name for trace_segments in segments for name in trace_segments)
+        stats['segments_ms'] = {
+            name: percentiles(np.array([s[name] for s in segments if name in s], dtype=np.float64) * 1000) for name in names
+        }
+        return stats
@@ -0,0 +1,45 @@
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """
+    A thread safe least-recently-used cache holding at most `capacity` items.
+    """
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.capacity:
+                self.items.popitem(last=False)
+
+    def update(self, key, update):
+        # applies update to the cached value in place, without changing its recency
+        with self.lock:
+            if key in self.items:
+                update(self.items[key])
+
+    def invalidate(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
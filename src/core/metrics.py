@@ -0,0 +1,265 @@
+"""
+This module defines lightweight in-process metrics (counters, gauges and histograms) and renders them in the
+Prometheus text exposition format. Metrics are registered once, at import time, through the module level
+counter(), gauge() and histogram() functions, which return the already registered metric of the same name.
+
+Imports:
+    - math: Provides the infinity of the last histogram bucket.
+    - threading: Allows for the creation and management of threads.
+    - time: Provides time-related functions.
+    - bisect: Provides the search of a histogram bucket.
+    - contextlib.contextmanager: Used for the histogram timer.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# bucket upper bounds in seconds, from 1ms to 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def format_labels(labels):
+    """
+    Formats label pairs, escaping the values.
+
+    Args:
+        labels (list): The (name, value) pairs.
+
+    Returns:
+        str: The labels in braces, or an empty string if there are none.
+    """
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+class Metric:
+    """
+    The base class of the metrics, holding one value per combination of label values.
+    """
+    type = None
+
+    def __init__(self, name, help, labels=()) -> None:
+        """
+        Initializes the Metric.
+
+        Args:
+            name (str): The metric name.
+            help (str): The metric description.
+            labels (tuple): The label names. Defaults to ().
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        """
+        Gets the key of the label values, every label must be given.
+
+        Args:
+            labels (dict): The label values.
+
+        Returns:
+            tuple: The label values, in the order of the label names.
+        """
+        if labels.keys() != set(self.labels):
+            raise ValueError(f'{self.name} expects the labels {self.labels}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        """
+        Gets the samples of the metric.
+
+        Returns:
+            list: The (suffix, label pairs, value) of every sample.
+        """
+        with self.lock:
+            return [('', list(zip(self.labels, key)), value) for key, value in self.values.items()]
+
+    def render(self):
+        """
+        Renders the metric in the Prometheus text format.
+
+        Returns:
+            list: The lines of the metric.
+        """
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        for suffix, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{format_labels(labels)} {format_value(value)}')
+        return lines
+
+class Counter(Metric):
+    """
+    A monotonically increasing count, such as the frames received. Rates (frames/s) are computed by the
+    scraper, e.g. with Prometheus' rate().
+    """
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """
+    A value that goes up and down, such as a queue depth. A gauge is either set, or collected from a callback
+    every time the metrics are rendered.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, help, labels=(), collect=None) -> None:
+        """
+        Initializes the Gauge.
+
+        Args:
+            name (str): The metric name.
+            help (str): The metric description.
+            labels (tuple): The label names. Defaults to ().
+            collect (callable): Returns the current values, as a dict of label values tuple -> value. Defaults
+                to None.
+        """
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self):
+        if self.collect is None:
+            return super().samples()
+        return [('', list(zip(self.labels, map(str, key))), value) for key, value in self.collect().items()]
+
+class Histogram(Metric):
+    """
+    A distribution of observed values, such as durations, counted in cumulative buckets.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS) -> None:
+        """
+        Initializes the Histogram.
+
+        Args:
+            name (str): The metric name.
+            help (str): The metric description.
+            labels (tuple): The label names. Defaults to ().
+            buckets (tuple): The sorted bucket upper bounds. Defaults to DEFAULT_BUCKETS.
+        """
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        bucket = bisect_left(self.buckets, value)
+
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = self.values[key]
+            counts[0][bucket] += 1
+            counts[1] += value
+            counts[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the duration in seconds of the enclosed block, even if it raises.
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def samples(self):
+        with self.lock:
+            values = [(key, list(counts), total, count) for key, (counts, total, count) in self.values.items()]
+
+        samples = []
+        for key, counts, total, count in values:
+            labels = list(zip(self.labels, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', labels + [('le', format_value(bound))], cumulative))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, count))
+        return samples
+
+class MetricsRegistry:
+    """
+    A registry of metrics, rendered together.
+    """
+
+    def __init__(self) -> None:
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        Registers a metric, unless a metric of the same name is already registered.
+
+        Args:
+            metric (Metric): The metric.
+
+        Returns:
+            Metric: The registered metric of that name.
+        """
+        with self.lock:
+            registered = self.metrics.setdefault(metric.name, metric)
+
+        if type(registered) is not type(metric) or registered.labels != metric.labels:
+            raise ValueError(f'{metric.name} is already registered as a different metric')
+        return registered
+
+    def render(self):
+        """
+        Renders all the metrics in the Prometheus text format. A gauge whose callback fails is left out.
+
+        Returns:
+            str: The metrics.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f'Failed rendering {metric.name}: {e}')
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+def counter(name, help, labels=()):
+    return registry.register(Counter(name, help, labels))
+
+def gauge(name, help, labels=(), collect=None):
+    """
+    Registers a gauge. A gauge collected from a callback is re-registered with the new callback, the last
+    created owner of the values reports them.
+    """
+    metric = registry.register(Gauge(name, help, labels))
+    if collect is not None:
+        metric.collect = collect
+    return metric
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return registry.register(Histogram(name, help, labels, buckets))
+
+def render():
+    return registry.render()
@@ -0,0 +1,205 @@
+"""
+This module defines a SamplingProfiler class, a built-in statistical profiler of the running process. It samples
+the Python stack of every thread at a fixed interval and aggregates the samples into collapsed stacks, the input
+format of flamegraph.pl and speedscope, and measures the CPU time of every thread over the same window.
+
+Imports:
+    - os: Provides a way of using operating system-dependent functionality.
+    - sys: Provides the current frames of all the threads.
+    - threading: Allows for the creation and management of threads.
+    - time: Provides time-related functions.
+    - collections.Counter: Counts the sampled stacks.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+class SamplingProfiler:
+    """
+    A sampling profiler. Sampling happens in the calling thread, which is left out of the samples, and only
+    one profile runs at a time.
+
+    The CPU time of a thread comes from /proc/self/task/<native id>/stat, so it is only measured on Linux. A
+    thread with many samples but little CPU time is mostly waiting (on a lock, a socket or a sleep).
+    """
+    MAX_DURATION = 60
+    MIN_INTERVAL = 0.001
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.clock_ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+    @staticmethod
+    def thread_group(name):
+        """
+        Gets the service a thread belongs to from its name, '<service>-<instance>'.
+
+        Args:
+            name (str): The thread name.
+
+        Returns:
+            str: The service ('Thread' for unnamed threads), pipeline stages are kept apart ('stage-detect').
+        """
+        parts = name.split('-')
+        return '-'.join(parts[:2]) if parts[0] == 'stage' else parts[0]
+
+    @staticmethod
+    def frame_name(frame):
+        code = frame.f_code
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})'
+
+    @staticmethod
+    def collapse(frame, thread_name, max_depth=128):
+        """
+        Collapses a stack into a single line, outermost frame first.
+
+        Args:
+            frame (frame): The innermost frame of the stack.
+            thread_name (str): The thread name, the root of the stack.
+            max_depth (int): The number of innermost frames kept. Defaults to 128.
+
+        Returns:
+            str: The frames separated by semicolons.
+        """
+        names = []
+        while frame is not None and len(names) < max_depth:
+            names.append(SamplingProfiler.frame_name(frame).replace(';', ','))
+            frame = frame.f_back
+        return ';'.join([thread_name.replace(';', ',')] + names[::-1])
+
+    def thread_cpu_times(self):
+        """
+        Gets the CPU time of every thread of the process.
+
+        Returns:
+            dict: The native thread id -> user plus system CPU seconds, empty if /proc is not available.
+        """
+        times = {}
+        try:
+            for task in os.listdir('/proc/self/task'):
+                try:
+                    with open(f'/proc/self/task/{task}/stat') as f:
+                        # the thread name (2nd field) may hold spaces, the fields after it are fixed
+                        fields = f.read().rsplit(')', 1)[1].split()
+                    times[int(task)] = (int(fields[11]) + int(fields[12])) / self.clock_ticks
+                except (OSError, IndexError, ValueError):
+                    continue
+        except OSError:
+            pass
+        return times
+
+    def sample(self, own_ident, stacks, thread_samples, threads):
+        """
+        Samples the stacks of all the threads but the sampling one once. The sampled frames are not kept alive
+        beyond the call.
+
+        Args:
+            own_ident (int): The ident of the sampling thread.
+            stacks (Counter): The collapsed stack counts, updated.
+            thread_samples (Counter): The samples per thread ident, updated.
+            threads (dict): The thread ident -> (name, native id) of the sampled threads, updated.
+        """
+        names = {thread.ident: thread for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            thread = names.get(ident)
+            name = thread.name if thread else f'unknown-{ident}'
+            threads.setdefault(ident, (name, getattr(thread, 'native_id', None)))
+
+            stacks[SamplingProfiler.collapse(frame, name)] += 1
+            thread_samples[ident] += 1
+
+    def profile(self, duration, interval=0.01):
+        """
+        Samples the stacks of all the threads.
+
+        Args:
+            duration (float): The number of seconds to sample, at most MAX_DURATION.
+            interval (float): The number of seconds between two samples, at least MIN_INTERVAL. Defaults to 0.01.
+
+        Returns:
+            dict: The sampling 'duration', 'interval' and number of 'samples', the 'stacks' (collapsed stack ->
+                samples), and the 'threads' and service 'groups' with their samples, CPU seconds and CPU percent.
+
+        Raises:
+            RuntimeError: If a profile is already running.
+        """
+        duration = min(max(float(duration), 0), SamplingProfiler.MAX_DURATION)
+        interval = max(float(interval), SamplingProfiler.MIN_INTERVAL)
+
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError('A profile is already running')
+
+        try:
+            own_ident = threading.get_ident()
+            stacks = Counter()
+            thread_samples = Counter()
+            threads = {}
+            samples = 0
+
+            cpu_before = self.thread_cpu_times()
+            started_at = time.perf_counter()
+            next_sample = started_at
+
+            while time.perf_counter() - started_at < duration:
+                self.sample(own_ident, stacks, thread_samples, threads)
+                samples += 1
+
+                next_sample += interval
+                time.sleep(max(0, next_sample - time.perf_counter()))
+
+            elapsed = time.perf_counter() - started_at
+            cpu_after = self.thread_cpu_times()
+        finally:
+            self.lock.release()
+
+        thread_stats = []
+        for ident, (name, native_id) in threads.items():
+            cpu = None
+            if native_id in cpu_before and native_id in cpu_after:
+                cpu = cpu_after[native_id] - cpu_before[native_id]
+            thread_stats.append({
+                'name': name,
+                'ident': ident,
+                'native_id': native_id,
+                'samples': thread_samples[ident],
+                'cpu_seconds': cpu,
+                'cpu_percent': round(100 * cpu / elapsed, 2) if cpu is not None and elapsed else None
+            })
+        thread_stats.sort(key=lambda stats: -(stats['cpu_seconds'] or 0))
+
+        groups = {}
+        for stats in thread_stats:
+            group = groups.setdefault(SamplingProfiler.thread_group(stats['name']), {'threads': 0, 'samples': 0, 'cpu_seconds': 0.0})
+            group['threads'] += 1
+            group['samples'] += stats['samples']
+            group['cpu_seconds'] += stats['cpu_seconds'] or 0
+        for group in groups.values():
+            group['cpu_percent'] = round(100 * group['cpu_seconds'] / elapsed, 2) if elapsed else None
+
+        return {
+            'duration': elapsed,
+            'interval': interval,
+            'samples': samples,
+            'cpu_measured': bool(cpu_after),
+            'stacks': dict(stacks.most_common()),
+            'threads': thread_stats,
+            'groups': groups
+        }
+
+    @staticmethod
+    def to_collapsed(profile):
+        """
+        Formats the stacks of a profile as collapsed stack lines, 'frame;frame;frame count'.
+
+        Args:
+            profile (dict): The profile.
+
+        Returns:
+            str: The collapsed stacks.
+        """
+        return ''.join(f'{stack} {count}\n' for stack, count in profile['stacks'].items())
@@ -12,7 +12,10 @@ Imports:
     - os: Provides a way of using operating system-dependent functionality.
     - threading: Allows for the creation and management of threads.
     - traceback: Provides methods for extracting, formatting, and printing stack traces.
+    - time: Provides time-related functions.
     - src.core.protocol.receive_data, src.core.protocol.send_data: Custom modules to handle sending and receiving data.
+    - src.core.metrics: Custom module for the in-process metrics.
+    - src.core.frame_trace.FrameTrace, FRAMES_DROPPED: Custom module to trace the frames through the pipeline.
     - .config.settings: Custom module to access configuration settings.
 """
 
@@ -25,16 +28,28 @@ from datetime import datetime
 import os
 import threading
 import traceback
+import time
 
 from src.core.protocol import receive_data, send_data
+from src.core import metrics
+from src.core.frame_trace import FrameTrace, FRAMES_DROPPED
 from .config import settings
 
+FRAMES_RECEIVED = metrics.counter('camera_frames_received_total', 'Frames received from the cameras, by source (live or replayed '
+                                  'from the camera spool)', ['camera', 'source'])
+INGEST_SECONDS = metrics.histogram('ingest_seconds', 'Time spent ingesting a received frame, by step (decode, write)', ['step'])
+
 class CameraConnection:
     """
     A class to represent a connection with a single camera, handling data reception and frame processing.
+
+    Every CREDIT_INTERVAL seconds the camera is granted credits, the number of frames it may send in the next
+    interval, along with the pressure of its queue (0 to 1) so it can lower its JPEG quality and the processing
+    lag of its frames.
     """
+    CREDIT_INTERVAL = 1
 
-    def __init__(self, client_socket, ip, port, location, camera_id):
+    def __init__(self, client_socket, ip, port, location, camera_id, pressure=None, credits=None, on_close=None):
         """
         Initializes the CameraConnection with the given socket, IP address, port, location, and camera ID.
 
@@ -44,13 +59,26 @@ class CameraConnection:
             port (int): The port number of the camera.
             location (dict): The location of the camera (latitude and longitude).
             camera_id (str): The unique identifier for the camera.
+            pressure (callable): Called with the camera's location folder name, returns True while the image
+                processing can't keep up with the camera's frames. Defaults to None.
+            credits (callable): Called with the camera's location folder name and the credit interval, returns
+                the credits, pressure and processing lag to send the camera. No credits are granted if None.
+                Defaults to None.
+            on_close (callable): Called with the camera ID once the connection is closed. Defaults to None.
         """
         self.sock = client_socket
         self.camera_ip = ip
         self.camera_port = port
         self.camera_id = camera_id
         self.camera_location = location
+        self.pressure = pressure
+        self.credits = credits
+        self.on_close = on_close
+        self.dropped_frames = 0
+        self.config = {}
         self.running = False
+        # commands and credits are sent from different threads
+        self.send_lock = threading.Lock()
 
     @staticmethod
     def decode_frame(base64_string):
@@ -68,13 +96,12 @@ class CameraConnection:
         frame = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
         return frame
     
-    def write_file(self, frame, time=datetime.now().strftime('%Y%m%d_%H%M%S')):
+    def get_location_folder(self):
         """
-        Writes images to files.
+        Gets the name of the folder the camera's frames are written to.
 
-        Args:
-            frame (numpy.ndarray): The video frame to write.
-            time (str): The timestamp of the frame.
+        Returns:
+            str: The folder name, '<lat>_<lng>'.
         """
         try:
             lat = self.camera_location['lat']
@@ -84,40 +111,131 @@ class CameraConnection:
             traceback.print_exc()
             lat = 0
             lng = 0
-        
-        imgs_path = f'./data/cameras/{lat}_{lng}/'
+
+        return f'{lat}_{lng}'
+
+    def write_file(self, frame, time=datetime.now().strftime('%Y%m%d_%H%M%S'), trace=None):
+        """
+        Writes images to files.
+
+        Args:
+            frame (numpy.ndarray): The video frame to write.
+            time (str): The timestamp of the frame.
+            trace (FrameTrace): The trace of the frame, encoded in the file name. Defaults to None.
+        """
+        imgs_path = f'./data/cameras/{self.get_location_folder()}/'
         os.makedirs(imgs_path, exist_ok=True)
-        file_path = f"{imgs_path}/{uuid4()}-{time}.jpg"
+        file_path = f"{imgs_path}/{trace.filename_prefix() if trace else uuid4()}-{time}.jpg"
         
         with open(file_path, 'wb') as f:
             f.write(cv2.imencode('.jpg', frame)[1].tobytes())
 
     def handle_connection(self):
         """
-        Handles the initial connection with the camera and starts receiving frames.
+        Handles the initial connection with the camera and starts receiving frames, until the camera disconnects.
         """
-        if send_data(self.sock, {'success': True, 'id': self.camera_id}):
-            print(f'{self.camera_ip}:{self.camera_port} connected.')
-            self.running = True
-            self.receive_frames()
-        
+        try:
+            if send_data(self.sock, {'success': True, 'id': self.camera_id}):
+                print(f'{self.camera_ip}:{self.camera_port} connected.')
+                self.running = True
+                if self.credits:
+                    threading.Thread(target=self.grant_credits, name=f'camera_credits-{self.camera_id}', daemon=True).start()
+                self.receive_frames()
+
+        finally:
+            # stops the credits thread, a reconnecting camera gets a new connection and camera ID
+            self.running = False
+            self.sock.close()
+            if self.on_close:
+                self.on_close(self.camera_id)
+
+    def send_command(self, message):
+        """
+        Sends a command message to the camera.
+
+        Args:
+            message (dict): The command message.
+
+        Returns:
+            bool: True if the message was sent successfully, False otherwise.
+        """
+        with self.send_lock:
+            return send_data(self.sock, message)
+
+    def grant_credits(self):
+        """
+        Periodically grants the camera the number of frames it may send in the next interval.
+        """
+        while self.running:
+            try:
+                credits, pressure, lag = self.credits(self.get_location_folder(), CameraConnection.CREDIT_INTERVAL)
+                self.send_command({'command': 'credits', 'credits': credits, 'interval': CameraConnection.CREDIT_INTERVAL,
+                                   'pressure': pressure, 'lag': lag})
+            except Exception as e:
+                print(e)
+                traceback.print_exc()
+            time.sleep(CameraConnection.CREDIT_INTERVAL)
+
     def start_live(self):
         """
         Sends a command to the camera to start live streaming.
+
+        Returns:
+            bool: True if the command was sent successfully, False otherwise.
         """
-        send_data(self.sock, {'command': 'startLive'})
+        return self.send_command({'command': 'startLive'})
 
     def stop_live(self):
         """
         Sends a command to the camera to stop live streaming.
+
+        Returns:
+            bool: True if the command was sent successfully, False otherwise.
+        """
+        return self.send_command({'command': 'stopLive'})
+
+    def configure(self, fps=None, width=None, height=None, quality=None, roi=None):
         """
-        send_data(self.sock, {'command': 'stopLive'})
+        Sends a command to the camera to change its capture configuration, applied live by the camera.
+        Settings left as None are reset to the camera's defaults.
+
+        Args:
+            fps (float): The target frame rate. Defaults to None.
+            width (int): The target frame width in pixels. Defaults to None.
+            height (int): The target frame height in pixels. Defaults to None.
+            quality (int): The maximum JPEG quality, from 1 to 100. Defaults to None.
+            roi (list): The region of interest [x, y, width, height] the frames are cropped to, as fractions
+                of the frame size. Defaults to None.
+
+        Returns:
+            bool: True if the command was sent successfully, False otherwise.
+
+        Raises:
+            ValueError: If a setting is out of range.
+        """
+        if fps is not None and fps <= 0:
+            raise ValueError('fps must be positive')
+        if (width is None) != (height is None) or (width is not None and (width <= 0 or height <= 0)):
+            raise ValueError('width and height must be both set and positive')
+        if quality is not None and not 1 <= quality <= 100:
+            raise ValueError('quality must be between 1 and 100')
+        if roi is not None:
+            x, y, w, h = roi
+            if not (0 <= x < 1 and 0 <= y < 1 and 0 < w <= 1 - x and 0 < h <= 1 - y):
+                raise ValueError('roi must be fractions [x, y, width, height] inside the frame')
+
+        config = {'fps': fps, 'width': width, 'height': height, 'quality': quality, 'roi': roi}
+
+        if self.send_command({'command': 'configure', 'config': config}):
+            self.config = config
+            return True
+        return False
 
     def close_connection(self):
         """
         Sends a command to the camera to close the connection.
         """
-        send_data(self.sock, {'command': 'closeConn'})
+        self.send_command({'command': 'closeConn'})
 
     def close(self):
         """
@@ -137,10 +255,29 @@ class CameraConnection:
                 if not frame_info:
                     print("Connection closed by server.")
                     break
+                received_at = time.time()
+
+                # frames spooled by the camera while it was disconnected are uploaded in batches, with their
+                # original (older) timestamps
+                replayed = 'frames' in frame_info
+                for frame_info in frame_info.get('frames', [frame_info]):
+                    location = self.get_location_folder()
+                    source = 'replay' if replayed else 'live'
+                    FRAMES_RECEIVED.inc(camera=location, source=source)
 
-                frame = CameraConnection.decode_frame(frame_info['frame'])
-                time = frame_info['time']
-                self.write_file(frame, time)
+                    # a live frame would only be shed by the image processor, skip decoding and writing it. A
+                    # replayed frame was already taken off the camera's spool, it is queued and left to the
+                    # image processor's shed policy
+                    if not replayed and self.pressure and self.pressure(location):
+                        self.dropped_frames += 1
+                        FRAMES_DROPPED.inc(camera=location, source=source)
+                        continue
+
+                    with INGEST_SECONDS.time(step='decode'):
+                        frame = CameraConnection.decode_frame(frame_info['frame'])
+                    trace = FrameTrace(frame_info.get('trace_id'), frame_info.get('captured_at'), received_at, replayed=replayed)
+                    with INGEST_SECONDS.time(step='write'):
+                        self.write_file(frame, frame_info['time'], trace)
     
         except Exception as e:
             print(e)
@@ -165,6 +302,9 @@ class CameraConnections:
         self.server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.running = False
         self.camera_connections = {}
+        # set by the image processor, see CameraConnection
+        self.pressure = None
+        self.credits = None
 
     def handle_client(self, client_sock, address):
         """
@@ -182,9 +322,11 @@ class CameraConnections:
                 port = address[1]
                 print("Connection From: ", address)
                 camera_id = str(uuid4())
-                camera_connection = CameraConnection(client_sock, ip, port, msg['location'], camera_id)
+                camera_connection = CameraConnection(client_sock, ip, port, msg['location'], camera_id,
+                                                     pressure=self.pressure, credits=self.credits,
+                                                     on_close=self.remove_camera_connection)
                 self.camera_connections[camera_id] = camera_connection
-                threading.Thread(target=camera_connection.handle_connection).start()
+                threading.Thread(target=camera_connection.handle_connection, name=f'camera_receive-{camera_id}').start()
 
         except Exception as e:
             print(e)
@@ -204,12 +346,49 @@ class CameraConnections:
         if conn := self.get_camera_connection(camera_id):
             print("Closing conn")
             conn.close()
-            del self.camera_connections[camera_id]
+            self.remove_camera_connection(camera_id)
             return True
 
         print("couldn't find camera")
         return False
+
+    def remove_camera_connection(self, camera_id):
+        """
+        Removes the CameraConnection with the given camera ID, called once its connection is closed.
+
+        Args:
+            camera_id (str): The unique identifier for the camera.
+        """
+        self.camera_connections.pop(camera_id, None)
     
+    def start_live(self, camera_id):
+        """
+        Starts the live feed of the camera with the given camera ID.
+
+        Args:
+            camera_id (str): The unique identifier for the camera.
+
+        Returns:
+            bool: True if the command was sent, False if the camera is not connected.
+        """
+        if conn := self.get_camera_connection(camera_id):
+            return conn.start_live()
+        return False
+
+    def stop_live(self, camera_id):
+        """
+        Stops the live feed of the camera with the given camera ID.
+
+        Args:
+            camera_id (str): The unique identifier for the camera.
+
+        Returns:
+            bool: True if the command was sent, False if the camera is not connected.
+        """
+        if conn := self.get_camera_connection(camera_id):
+            return conn.stop_live()
+        return False
+
     def get_camera_connection(self, camera_id):
         """
         Retrieves the CameraConnection with the given camera ID.
@@ -227,16 +406,16 @@ class CameraConnections:
         Retrieves all current camera connections.
 
         Returns:
-            dict: A dictionary of all current camera connections.
+            dict: A copy of the dictionary of all current camera connections, which are removed as they disconnect.
         """
-        return self.camera_connections
+        return dict(self.camera_connections)
     
     def start(self):
         """
         Starts the camera server.
         """
         self.running = True
-        threading.Thread(target=self.start_server).start()
+        threading.Thread(target=self.start_server, name='camera_server').start()
     
     def stop(self):
         """
@@ -257,7 +436,7 @@ class CameraConnections:
                 try:
                     client_socket, address = self.server_sock.accept()
                     print(f'camera client: {address}')
-                    threading.Thread(target=self.handle_client, args=(client_socket, address)).start()
+                    threading.Thread(target=self.handle_client, args=(client_socket, address), name=f'camera_handshake-{address[0]}:{address[1]}').start()
                 except socket.timeout:
                     pass
         except Exception as e:
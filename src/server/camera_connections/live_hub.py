@@ -0,0 +1,345 @@
+"""
+This module defines a LiveHub class that fans the cameras' live frames out to the web clients watching them.
+The hub tracks the viewers of every camera, starts a camera's live feed on its first subscriber and stops it
+once the last one has left, and sends the frames to every viewer through its own drop-to-latest slot, so a
+slow browser only ever misses frames itself. The last frame of every camera is kept, so a joining viewer sees
+it at once instead of waiting for the next one.
+
+Every viewer picks a rendition of the feed (e.g. a thumbnail for a grid of cameras) when it subscribes, and
+a frame is only rendered in the renditions its camera's viewers are watching.
+
+Imports:
+    - threading: Allows for the creation and management of threads.
+    - traceback: Provides methods for extracting, formatting, and printing stack traces.
+    - time: Provides time-related functions.
+"""
+
+import threading
+import traceback
+import time
+
+class Viewer:
+    """
+    A web client watching live feeds. Every camera it watches has a single pending frame slot, a new frame
+    replaces a pending one that wasn't sent yet, and a sender thread per viewer sends the pending frames.
+    """
+
+    def __init__(self, sid, emit) -> None:
+        """
+        Initializes the Viewer and starts its sender thread.
+
+        Args:
+            sid (str): The SocketIO session id of the client.
+            emit (callable): Called with the event, the data and the session id to send an event to the client.
+        """
+        self.sid = sid
+        self.emit = emit
+        self.pending = {}         # camera id -> latest frame not yet sent
+        self.condition = threading.Condition()
+        self.sent = 0
+        self.dropped = 0
+        self.running = True
+
+        self.sender_thread = threading.Thread(target=self.send_frames, name=f'live_viewer-{sid}', daemon=True)
+        self.sender_thread.start()
+
+    def offer(self, camera_id, data):
+        """
+        Offers a frame to the viewer, replacing the camera's pending frame.
+
+        Args:
+            camera_id (str): The camera of the frame.
+            data (dict): The frame message.
+        """
+        with self.condition:
+            if camera_id in self.pending:
+                self.dropped += 1
+            self.pending[camera_id] = data
+            self.condition.notify()
+
+    def discard(self, camera_id):
+        """
+        Discards the pending frame of a camera the viewer stopped watching.
+        """
+        with self.condition:
+            self.pending.pop(camera_id, None)
+
+    def send_frames(self):
+        """
+        Continuously sends the pending frames to the client.
+        """
+        while self.running:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or not self.running)
+                frames, self.pending = self.pending, {}
+
+            for camera_id, data in frames.items():
+                try:
+                    self.emit(f'live-{camera_id}', data, self.sid)
+                    self.sent += 1
+                except Exception as e:
+                    print(e)
+                    traceback.print_exc()
+
+    def stop(self):
+        """
+        Stops the sender thread, the pending frames are dropped.
+        """
+        with self.condition:
+            self.running = False
+            self.pending = {}
+            self.condition.notify()
+
+class FeedStart:
+    """
+    The start of a camera's live feed by its first viewer. Viewers subscribing in the meantime wait for its
+    outcome.
+    """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.started = False
+
+class LiveHub:
+    """
+    A hub of live feeds and their viewers. A camera's feed is stopped STOP_DELAY seconds after its last viewer
+    left, so a viewer reloading the page doesn't restart the camera's stream.
+
+    The first viewer of a camera starts its feed, the viewers subscribing while it starts get the same
+    outcome, and if the start fails all of them are unsubscribed.
+    """
+    STOP_DELAY = 5
+    # seconds a viewer waits for the start of a feed by another viewer
+    START_TIMEOUT = 10
+    # a cached last frame older than this (seconds) is not shown to joining viewers, and eventually dropped
+    LAST_FRAME_MAX_AGE = 30
+
+    def __init__(self, emit, start_live=None, stop_live=None, render=None) -> None:
+        """
+        Initializes the LiveHub.
+
+        Args:
+            emit (callable): Called with the event, the data and the session id to send an event to a client.
+            start_live (callable): Called with a camera id to start its live feed, returns True if it started.
+                Defaults to None.
+            stop_live (callable): Called with a camera id to stop its live feed. Defaults to None.
+            render (callable): Called with a frame message and a set of renditions, returns the frame message of
+                every rendition. Every rendition is the frame as received if None. Defaults to None.
+        """
+        self.emit = emit
+        self.start_live = start_live
+        self.stop_live = stop_live
+        self.render = render or (lambda data, renditions: {rendition: data for rendition in renditions})
+
+        self.viewers = {}           # sid -> Viewer
+        self.subscriptions = {}     # camera id -> {sid of a viewer: its rendition}
+        self.stop_timers = {}       # camera id -> timer stopping its feed
+        self.last_frames = {}       # camera id -> (monotonic receive time, last frame)
+        self.starts = {}            # camera id -> FeedStart of its running feed
+        self.lock = threading.Lock()
+        # orders the start and stop commands, a feed stopped by its timer while a viewer subscribes is restarted
+        self.feed_lock = threading.Lock()
+
+    def subscribe(self, sid, camera_id, rendition='full'):
+        """
+        Subscribes a client to a rendition of a camera's live feed, starting the feed if it is the camera's
+        first viewer. A client already subscribed to the camera switches to the new rendition.
+
+        Args:
+            sid (str): The SocketIO session id of the client.
+            camera_id (str): The camera id.
+            rendition (str): The rendition of the feed. Defaults to 'full'.
+
+        Returns:
+            bool: True if the client is subscribed, False if the camera's feed could not be started.
+        """
+        with self.lock:
+            if timer := self.stop_timers.pop(camera_id, None):
+                timer.cancel()
+
+            viewers = self.subscriptions.setdefault(camera_id, {})
+            first_viewer = not viewers and timer is None
+            viewers[sid] = rendition
+            if sid not in self.viewers:
+                self.viewers[sid] = Viewer(sid, self.emit)
+            viewer = self.viewers[sid]
+
+            if first_viewer:
+                self.starts[camera_id] = FeedStart()
+            start = self.starts[camera_id]
+
+            self.drop_stale_frames()
+            last_frame = self.last_frames.get(camera_id)
+
+        if last_frame:
+            viewer.offer(camera_id, self.render(last_frame[1], {rendition})[rendition])
+
+        if first_viewer:
+            self.start_feed(camera_id, start)
+        elif not start.done.wait(LiveHub.START_TIMEOUT):
+            self.unsubscribe(sid, camera_id, delay=0)
+            return False
+
+        return start.started
+
+    def start_feed(self, camera_id, start):
+        """
+        Starts a camera's live feed for its first viewer. If it fails, every viewer of the camera (those that
+        subscribed while it was starting included) is unsubscribed, and the feed is not stopped.
+
+        Args:
+            camera_id (str): The camera id.
+            start (FeedStart): The start of the feed, done once the outcome is known.
+        """
+        started = True
+        if self.start_live:
+            try:
+                with self.feed_lock:
+                    started = bool(self.start_live(camera_id))
+            except Exception as e:
+                print(e)
+                traceback.print_exc()
+                started = False
+
+        with self.lock:
+            start.started = started
+            if not started:
+                for sid in self.subscriptions.pop(camera_id, {}):
+                    if viewer := self.viewers.get(sid):
+                        viewer.discard(camera_id)
+                if self.starts.get(camera_id) is start:
+                    del self.starts[camera_id]
+        start.done.set()
+
+    def unsubscribe(self, sid, camera_id, delay=None):
+        """
+        Unsubscribes a client from a camera's live feed, stopping the feed after a delay if it was the camera's
+        last viewer.
+
+        Args:
+            sid (str): The SocketIO session id of the client.
+            camera_id (str): The camera id.
+            delay (float): The delay before the feed is stopped, STOP_DELAY if None. Defaults to None.
+        """
+        with self.lock:
+            viewers = self.subscriptions.get(camera_id)
+            if viewers is None or sid not in viewers:
+                return
+
+            del viewers[sid]
+            if viewer := self.viewers.get(sid):
+                viewer.discard(camera_id)
+
+            if viewers or camera_id in self.stop_timers:
+                return
+
+            del self.subscriptions[camera_id]
+            delay = LiveHub.STOP_DELAY if delay is None else delay
+            timer = threading.Timer(delay, self.stop_idle, args=(camera_id,))
+            timer.daemon = True
+            self.stop_timers[camera_id] = timer
+        timer.start()
+
+    def drop_stale_frames(self):
+        """
+        Drops the cached last frames older than LAST_FRAME_MAX_AGE. Must be called with the lock held.
+        """
+        now = time.monotonic()
+        for camera_id in [camera_id for camera_id, (received_at, _) in self.last_frames.items()
+                          if now - received_at > LiveHub.LAST_FRAME_MAX_AGE]:
+            del self.last_frames[camera_id]
+
+    def stop_idle(self, camera_id):
+        """
+        Stops a camera's live feed, unless a viewer subscribed in the meantime.
+
+        Args:
+            camera_id (str): The camera id.
+        """
+        with self.feed_lock:
+            with self.lock:
+                if self.stop_timers.pop(camera_id, None) is None or self.subscriptions.get(camera_id):
+                    return
+                self.starts.pop(camera_id, None)
+
+            if self.stop_live:
+                try:
+                    self.stop_live(camera_id)
+                except Exception as e:
+                    print(e)
+                    traceback.print_exc()
+
+    def disconnect(self, sid):
+        """
+        Unsubscribes a disconnected client from all its feeds and stops its sender.
+
+        Args:
+            sid (str): The SocketIO session id of the client.
+        """
+        with self.lock:
+            camera_ids = [camera_id for camera_id, viewers in self.subscriptions.items() if sid in viewers]
+
+        for camera_id in camera_ids:
+            self.unsubscribe(sid, camera_id)
+
+        with self.lock:
+            viewer = self.viewers.pop(sid, None)
+        if viewer:
+            viewer.stop()
+
+    def publish(self, camera_id, data):
+        """
+        Offers a live frame to the camera's viewers, rendered once in every rendition they watch, and keeps it
+        as the camera's last frame.
+
+        Args:
+            camera_id (str): The camera id.
+            data (dict): The frame message, the frame as received from the camera.
+
+        Returns:
+            int: The number of viewers the frame was offered to.
+        """
+        with self.lock:
+            self.last_frames[camera_id] = (time.monotonic(), data)
+            viewers = [(self.viewers[sid], rendition) for sid, rendition in self.subscriptions.get(camera_id, {}).items()
+                       if sid in self.viewers]
+
+        if not viewers:
+            return 0
+
+        frames = self.render(data, {rendition for _, rendition in viewers})
+        for viewer, rendition in viewers:
+            viewer.offer(camera_id, frames[rendition])
+        return len(viewers)
+
+    def is_watched(self, camera_id):
+        with self.lock:
+            return bool(self.subscriptions.get(camera_id))
+
+    def get_stats(self):
+        """
+        Reports the viewers of every camera and the frames sent to and dropped for every viewer.
+
+        Returns:
+            dict: The 'cameras' (camera id -> number of viewers), the 'renditions' (camera id -> rendition ->
+                number of viewers) and the 'viewers' (sid -> sent, dropped and watched cameras' renditions).
+        """
+        with self.lock:
+            renditions = {}
+            for camera_id, viewers in self.subscriptions.items():
+                for rendition in viewers.values():
+                    counts = renditions.setdefault(camera_id, {})
+                    counts[rendition] = counts.get(rendition, 0) + 1
+
+            return {
+                'cameras': {camera_id: len(viewers) for camera_id, viewers in self.subscriptions.items()},
+                'renditions': renditions,
+                'viewers': {
+                    sid: {
+                        'sent': viewer.sent,
+                        'dropped': viewer.dropped,
+                        'cameras': {camera_id: viewers[sid] for camera_id, viewers in self.subscriptions.items() if sid in viewers}
+                    }
+                    for sid, viewer in self.viewers.items()
+                }
+            }
@@ -1,25 +1,35 @@
 """
 This module defines a LiveServer class that handles live streaming of camera feeds using Flask and SocketIO.
+The feeds are served in renditions of different sizes, a frame is decoded once and resized only into the
+renditions being watched.
 
 Imports:
-    - Flask: The Flask web application class.
-    - Flask_SocketIO: Flask extension for creating web applications with Socket.IO.
+    - Flask, request: The Flask web application class and the current request (the SocketIO session id).
+    - Flask_SocketIO: Flask extension for creating web applications with Socket.IO, and its rooms.
     - socket: Provides low-level networking interface.
+    - base64: Provides methods for encoding and decoding Base64 data.
     - traceback: Provides methods for extracting, formatting, and printing stack traces.
     - threading: Allows for the creation and management of threads.
+    - cv2: OpenCV library for computer vision tasks.
+    - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
     - .config.settings: Custom module to access configuration settings.
     - src.core.protocol.receive_data: Custom module to handle receiving data.
+    - .live_hub.LiveHub: Custom module to fan the live feeds out to their viewers.
 """
 
-from flask import Flask
-from flask_socketio import SocketIO, emit
+from flask import Flask, request
+from flask_socketio import SocketIO, emit, join_room
 import socket
+import base64
 import traceback
 import threading
 import ssl
+import cv2
+import numpy as np
 
 from .config import settings
 from src.core.protocol import receive_data
+from .live_hub import LiveHub
 
 app = Flask(__name__)
 socketio = SocketIO(app, async_mode=None, cors_allowed_origins="*")
@@ -27,7 +37,19 @@ socketio = SocketIO(app, async_mode=None, cors_allowed_origins="*")
 class LiveServer:
     """
     A class to handle live streaming of camera feeds using Flask and SocketIO.
+
+    Web clients emit 'subscribe' with a camera id and a rendition to watch its feed, and 'unsubscribe' with a
+    camera id to leave it, the LiveHub starts and stops the cameras' live feeds according to their viewers.
+
+    Only clients with a valid session (the 'session_id' cookie of the web server) may connect, they join
+    USERS_ROOM, the room the alerts are sent to.
     """
+    USERS_ROOM = 'users'
+    # rendition -> (maximum width in pixels, JPEG quality), None keeps the frame as sent by the camera
+    RENDITIONS = {
+        'thumb': (320, 70),
+        'full': None
+    }
 
     def __init__(self, host=settings.HTTP_SERVER_IP, port=settings.HTTP_SERVER_CAMERA_LIVE_PORT):
         """
@@ -42,9 +64,108 @@ class LiveServer:
         self.server_sock.listen()
         self.running = False
 
+        # called with a session id and a role, returns True if the session is valid and has the role. Set by
+        # the web server, every client is rejected until then
+        self.check_role = None
+
+        # the start_live and stop_live callbacks are set by the camera server, see CameraConnections
+        self.hub = LiveHub(emit=lambda event, data, sid: socketio.emit(event, data, to=sid), render=self.render_renditions)
+        socketio.on_event('connect', self.on_connect)
+        socketio.on_event('subscribe', self.on_subscribe)
+        socketio.on_event('unsubscribe', self.on_unsubscribe)
+        socketio.on_event('disconnect', self.on_disconnect)
+
+    def is_authorized(self, required_role=1):
+        """
+        Checks the session of the current SocketIO client, sent as a cookie with its handshake.
+
+        Args:
+            required_role (int): The role required. Defaults to 1.
+
+        Returns:
+            bool: True if the client's session is valid and has the required role.
+        """
+        session_id = request.cookies.get('session_id')
+        return bool(session_id and self.check_role and self.check_role(session_id, required_role))
+
+    def on_connect(self, *args):
+        """
+        SocketIO handler of a new client, rejecting it if it has no valid session.
+        """
+        if not self.is_authorized():
+            return False
+        join_room(LiveServer.USERS_ROOM)
+
+    def on_subscribe(self, data):
+        """
+        SocketIO handler of a client subscribing to a camera's live feed. The client's session must be valid,
+        a first viewer starts the camera's feed.
+
+        Args:
+            data (dict): The camera 'id' and the 'rendition', 'full' if not given.
+        """
+        camera_id = data['id']
+        rendition = data.get('rendition', 'full')
+
+        # the session may have expired since the client connected, it is checked like the web server's routes
+        if not self.is_authorized() or rendition not in LiveServer.RENDITIONS or \
+                not self.hub.subscribe(request.sid, camera_id, rendition):
+            emit('liveUnavailable', {'id': camera_id})
+
+    def on_unsubscribe(self, data):
+        """
+        SocketIO handler of a client unsubscribing from a camera's live feed.
+
+        Args:
+            data (dict): The camera 'id'.
+        """
+        self.hub.unsubscribe(request.sid, data['id'])
+
+    def on_disconnect(self, *args):
+        self.hub.disconnect(request.sid)
+
+    @staticmethod
+    def render_renditions(data, renditions):
+        """
+        Renders a live frame in the given renditions. The JPEG is decoded once, only if a resized rendition is
+        watched, and a frame already narrower than a rendition is not scaled up.
+
+        Args:
+            data (dict): The frame message, the JPEG 'frame' as sent by the camera.
+            renditions (set): The renditions to render.
+
+        Returns:
+            dict: The rendition -> frame message, with its 'rendition'. A frame that can't be decoded is
+                served as sent in every rendition.
+        """
+        frames = {}
+        image = None
+
+        for rendition in renditions:
+            size = LiveServer.RENDITIONS.get(rendition)
+            if size is None:
+                frames[rendition] = data
+                continue
+
+            if image is None:
+                image = cv2.imdecode(np.frombuffer(data['frame'], dtype=np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    return {rendition: data for rendition in renditions}
+
+            max_width, quality = size
+            height, width = image.shape[:2]
+            resized = image
+            if width > max_width:
+                resized = cv2.resize(image, (max_width, max(1, round(height * max_width / width))), interpolation=cv2.INTER_AREA)
+
+            _, encoded = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            frames[rendition] = {**data, 'frame': encoded.tobytes(), 'rendition': rendition}
+
+        return frames
+
     def handle_client(self, client_socket, addr):
         """
-        Handles a new client connection, receiving live feed data and emitting it via SocketIO.
+        Handles a new client connection, receiving live feed data and publishing it to the camera's viewers.
 
         Args:
             client_socket (socket.socket): The socket connected to the client.
@@ -62,7 +183,10 @@ class LiveServer:
                     if not data:
                         print("Exiting live feed")
                         break
-                    socketio.emit(f'live-{camera_id}', data)
+
+                    # the JPEG is sent to the browsers as a binary attachment, a third smaller than base64
+                    data['frame'] = base64.b64decode(data['frame'])
+                    self.hub.publish(camera_id, data)
                     
         except Exception as e:
             print(e)
@@ -70,6 +194,17 @@ class LiveServer:
         
         client_socket.close()
 
+    def broadcast(self, event, data, room=USERS_ROOM):
+        """
+        Emits an event to the SocketIO clients of a room.
+
+        Args:
+            event (str): The name of the event.
+            data (dict): The JSON serializable event data.
+            room (str): The room. Defaults to USERS_ROOM, every authenticated client.
+        """
+        socketio.emit(event, data, to=room)
+
     def start_server(self):
         """
         Starts the server to accept new client connections.
@@ -77,7 +212,7 @@ class LiveServer:
         while self.running:
             try:
                 client_socket, addr = self.server_sock.accept()
-                threading.Thread(target=self.handle_client, args=(client_socket, addr)).start()
+                threading.Thread(target=self.handle_client, args=(client_socket, addr), name=f'live_receive-{addr[0]}:{addr[1]}').start()
             except socket.timeout:
                 pass
 
@@ -91,8 +226,9 @@ class LiveServer:
         ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
         ssl_context.load_cert_chain(certfile=settings.SSL_CERT_FILE, keyfile=settings.SSL_KEY_FILE)
 
-        threading.Thread(target=socketio.run, args=(app, settings.HTTP_SERVER_IP, 5000), kwargs={'ssl_context': ssl_context}).start()
-        threading.Thread(target=self.start_server).start()
+        threading.Thread(target=socketio.run, args=(app, settings.HTTP_SERVER_IP, 5000), kwargs={'ssl_context': ssl_context},
+                         name='live_socketio').start()
+        threading.Thread(target=self.start_server, name='live_server').start()
 
     def stop(self):
         """
@@ -0,0 +1,88 @@
+"""
+This module defines a BlacklistDbManager class that handles the blacklist metadata database operations using the DatabaseManager.
+
+Imports:
+    - .database_manager.db_manager: Instance of DatabaseManager for executing database operations.
+"""
+
+from .database_manager import db_manager
+
+class BlacklistDbManager:
+    """
+    A class to manage the blacklisted suspects and the rows of their embeddings in the embeddings matrix file.
+    """
+
+    def __init__(self):
+        """
+        Initializes the BlacklistDbManager and ensures the blacklist tables exist.
+        """
+        self.db_manager = db_manager
+        self.initialize_blacklist_tables()
+
+    def initialize_blacklist_tables(self):
+        """
+        Creates the suspects and suspect_embeddings tables if they don't exist.
+        """
+        self.db_manager.execute_update('''CREATE TABLE IF NOT EXISTS suspects (
+                            suspect_id TEXT PRIMARY KEY, name TEXT NOT NULL,
+                            profile_photo_url TEXT NOT NULL)''')
+        self.db_manager.execute_update('''CREATE TABLE IF NOT EXISTS suspect_embeddings (
+                            row INTEGER PRIMARY KEY, suspect_id TEXT NOT NULL)''')
+
+    def get_suspects(self):
+        """
+        Retrieves all the suspects.
+
+        Returns:
+            list: A list of the suspect id, name and profile photo url of every suspect.
+        """
+        return self.db_manager.execute_query_all("SELECT suspect_id, name, profile_photo_url FROM suspects")
+
+    def get_embedding_rows(self):
+        """
+        Retrieves the matrix rows of all the suspects' embeddings.
+
+        Returns:
+            list: A list of (row, suspect id) tuples.
+        """
+        return self.db_manager.execute_query_all("SELECT row, suspect_id FROM suspect_embeddings ORDER BY row")
+
+    def insert_suspect(self, suspect_id, name, profile_photo_url, rows):
+        """
+        Inserts a suspect and the matrix rows of its embeddings.
+
+        Args:
+            suspect_id (str): The unique identifier of the suspect.
+            name (str): The suspect's name.
+            profile_photo_url (str): The url of the suspect's profile photo.
+            rows (list): The rows of the suspect's embeddings in the embeddings matrix file.
+        """
+        self.db_manager.execute_transaction([
+            ("INSERT INTO suspects (suspect_id, name, profile_photo_url) VALUES (?, ?, ?)",
+             [(suspect_id, name, profile_photo_url)]),
+            ("INSERT INTO suspect_embeddings (row, suspect_id) VALUES (?, ?)", [(row, suspect_id) for row in rows]),
+        ])
+
+    def delete_suspect(self, suspect_id):
+        """
+        Deletes a suspect and the references to its embeddings rows.
+
+        Args:
+            suspect_id (str): The unique identifier of the suspect.
+        """
+        self.db_manager.execute_transaction([
+            ("DELETE FROM suspect_embeddings WHERE suspect_id = ?", [(suspect_id,)]),
+            ("DELETE FROM suspects WHERE suspect_id = ?", [(suspect_id,)]),
+        ])
+
+    def replace_embedding_rows(self, rows):
+        """
+        Replaces all the embeddings rows, used after the embeddings matrix file is compacted.
+
+        Args:
+            rows (list): A list of (row, suspect id) tuples.
+        """
+        self.db_manager.execute_transaction([
+            ("DELETE FROM suspect_embeddings", [()]),
+            ("INSERT INTO suspect_embeddings (row, suspect_id) VALUES (?, ?)", rows),
+        ])
@@ -0,0 +1,151 @@
+"""
+This module defines a BlacklistStore class that stores the blacklisted suspects, their metadata in SQLite and
+their embeddings in an append-only float32 matrix file.
+
+Imports:
+    - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
+    - os: Provides a way of using operating system-dependent functionality.
+    - threading: Allows for the creation and management of threads.
+    - bson.json_util: Provides BSON (Binary JSON) utilities, used to read the legacy blacklist.json.
+    - .blacklist_db_manager.BlacklistDbManager: Custom module to manage the blacklist metadata in the database.
+"""
+
+import numpy as np
+import os
+import threading
+from bson import json_util
+
+from .blacklist_db_manager import BlacklistDbManager
+
+class BlacklistStore:
+    """
+    A class to store the blacklist. Adding a suspect appends its embeddings to the matrix file and removing one
+    only deletes its rows references, the matrix file is compacted once most of its rows are unreferenced.
+    """
+    DIM = 128
+    # the matrix file is compacted when it holds more unreferenced rows than this, and than referenced ones
+    COMPACT_MIN_ROWS = 64
+
+    def __init__(self, matrix_path):
+        """
+        Initializes the BlacklistStore.
+
+        Args:
+            matrix_path (str): The path of the embeddings matrix file.
+        """
+        self.matrix_path = matrix_path
+        self.db_manager = BlacklistDbManager()
+        self.lock = threading.Lock()
+
+    def count_rows(self):
+        """
+        Counts the rows of the embeddings matrix file.
+
+        Returns:
+            int: The number of complete rows in the file.
+        """
+        if not os.path.isfile(self.matrix_path):
+            return 0
+        return os.path.getsize(self.matrix_path) // (BlacklistStore.DIM * np.dtype(np.float32).itemsize)
+
+    def read_matrix(self):
+        """
+        Reads the embeddings matrix file.
+
+        Returns:
+            np.array: The embeddings matrix shaped (rows, DIM).
+        """
+        rows = self.count_rows()
+        if not rows:
+            return np.empty((0, BlacklistStore.DIM), dtype=np.float32)
+        return np.fromfile(self.matrix_path, dtype=np.float32, count=rows * BlacklistStore.DIM).reshape(rows, BlacklistStore.DIM)
+
+    def load(self):
+        """
+        Loads the blacklist.
+
+        Returns:
+            dict: The suspects by id, each with its 'suspectName', 'embeddings' and 'profilePhotoUrl'.
+        """
+        matrix = self.read_matrix()
+
+        suspect_rows = {}
+        for row, suspect_id in self.db_manager.get_embedding_rows():
+            suspect_rows.setdefault(suspect_id, []).append(row)
+
+        return {
+            suspect_id: {
+                'suspectName': name,
+                'embeddings': matrix[suspect_rows.get(suspect_id, [])],
+                'profilePhotoUrl': profile_photo_url
+            }
+            for suspect_id, name, profile_photo_url in self.db_manager.get_suspects()
+        }
+
+    def add(self, suspect_id, name, profile_photo_url, embeddings):
+        """
+        Adds a suspect, appending its embeddings to the matrix file.
+
+        Args:
+            suspect_id (str): The unique identifier of the suspect.
+            name (str): The suspect's name.
+            profile_photo_url (str): The url of the suspect's profile photo.
+            embeddings (list): The suspect's embeddings.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, BlacklistStore.DIM)
+
+        with self.lock:
+            first_row = self.count_rows()
+
+            with open(self.matrix_path, 'ab') as f:
+                # truncate a partially written row left by an interrupted append
+                f.truncate(first_row * BlacklistStore.DIM * embeddings.itemsize)
+                f.write(embeddings.tobytes())
+
+            self.db_manager.insert_suspect(suspect_id, name, profile_photo_url,
+                                           list(range(first_row, first_row + len(embeddings))))
+
+    def remove(self, suspect_id):
+        """
+        Removes a suspect, compacting the matrix file if most of its rows are no longer referenced.
+
+        Args:
+            suspect_id (str): The unique identifier of the suspect.
+        """
+        with self.lock:
+            self.db_manager.delete_suspect(suspect_id)
+
+            rows = self.db_manager.get_embedding_rows()
+            unreferenced = self.count_rows() - len(rows)
+            if unreferenced > BlacklistStore.COMPACT_MIN_ROWS and unreferenced > len(rows):
+                self.compact(rows)
+
+    def compact(self, rows):
+        """
+        Rewrites the matrix file with only the referenced rows.
+
+        Args:
+            rows (list): The (row, suspect id) tuples of the referenced rows.
+        """
+        matrix = self.read_matrix()
+
+        with open(f'{self.matrix_path}.tmp', 'wb') as f:
+            f.write(matrix[[row for row, _ in rows]].tobytes())
+
+        self.db_manager.replace_embedding_rows([(new_row, suspect_id) for new_row, (_, suspect_id) in enumerate(rows)])
+        os.replace(f'{self.matrix_path}.tmp', self.matrix_path)
+
+    def migrate_json(self, json_path):
+        """
+        Imports a legacy blacklist.json file and renames it so it is imported only once.
+
+        Args:
+            json_path (str): The path of the blacklist.json file.
+        """
+        with open(json_path, 'r') as f:
+            blacklist = json_util.loads(f.read())
+
+        for suspect_id, suspect in blacklist.items():
+            self.add(suspect_id, suspect['suspectName'], suspect['profilePhotoUrl'], suspect['embeddings'])
+
+        os.replace(json_path, f'{json_path}.migrated')
@@ -80,5 +80,33 @@ class DatabaseManager:
             cursor.execute(query, params)
             conn.commit()
 
+    def execute_update_many(self, query, params_list):
+        """
+        Executes an update query (INSERT, UPDATE, DELETE) for every set of parameters, in a single transaction.
+
+        Args:
+            query (str): The SQL query to execute.
+            params_list (list): A list of parameter tuples to execute the query with.
+        """
+        with self.__create_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(query, params_list)
+            conn.commit()
+
+    def execute_transaction(self, statements):
+        """
+        Executes several update queries (INSERT, UPDATE, DELETE) in a single transaction, so either all or none of
+        them are committed.
+
+        Args:
+            statements (list): A list of (query, params_list) tuples, each query executed for every parameter tuple
+                in its params_list.
+        """
+        with self.__create_connection() as conn:
+            cursor = conn.cursor()
+            for query, params_list in statements:
+                cursor.executemany(query, params_list)
+            conn.commit()
+
 # Create an instance of DatabaseManager
 db_manager = DatabaseManager()
@@ -89,9 +89,33 @@ $(document).ready(function() {
 
     }
 
-    // Initial check
+    // Initial check, catches up on sightings stored before this page was opened
     checkBlacklist();
 
-    // Set the interval to check every 10 seconds
-    setInterval(checkBlacklist, 10000);
+    // New sightings of blacklisted suspects are pushed by the server as they are processed, the session cookie
+    // authenticates the socket
+    let alertsSocket = io.connect(location.protocol + '//' + document.domain + ':' + '5000', {withCredentials: true});
+    alertsSocket.on('blacklistAlert', function(alert) {
+        // the alert only holds the person's id, its sightings are fetched separately
+        fetch(`getPerson?id=${alert.personId.$oid}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok')
+            }
+            return response.json()
+        })
+        .then(person => {
+            // the alert's sighting may not be stored yet
+            person.locations.push({'coordinates': alert.location, 'date': alert.time});
+
+            if ($('#blacklistMapContainer').is(':hidden')) {
+                $('#blacklistMapContainer').show();
+            }
+
+            displayPersonsOnMap([person])
+        })
+        .catch(error => {
+            console.error('Could not fetch the person of a blacklist alert:', error);
+        });
+    });
 });
@@ -36,6 +36,79 @@ $(document).ready(function () {
 
     let liveVideosDiv = document.getElementById("liveVideos")
 
+    // a single socket for all the live feeds, the server starts a camera's feed while it has subscribers
+    let liveSocket = io.connect(location.protocol + '//' + document.domain + ':' + '5000', {withCredentials: true});
+    let watchedCameras = new Map();     // camera id -> watched rendition
+
+    liveSocket.on('connect', function () {
+        // subscriptions don't survive a reconnection
+        watchedCameras.forEach((rendition, id) => liveSocket.emit('subscribe', {'id': id, 'rendition': rendition}));
+    });
+
+    liveSocket.on('liveUnavailable', function (data) {
+        console.error('Could not start live video for', data.id);
+        unwatchCamera(data.id);
+    });
+
+    function pickRendition(id) {
+        // a small tile gets the thumbnail, the server only resizes the renditions someone watches
+        let img = document.getElementById(`live-${id}`);
+        let width = img && img.parentElement ? img.parentElement.clientWidth : 0;
+        return width && width <= 480 ? 'thumb' : 'full';
+    }
+
+    function setRendition(id, rendition) {
+        if (!watchedCameras.has(id) || watchedCameras.get(id) === rendition) {
+            return;
+        }
+        watchedCameras.set(id, rendition);
+        liveSocket.emit('subscribe', {'id': id, 'rendition': rendition});
+    }
+
+    function watchCamera(id) {
+        if (watchedCameras.has(id)) {
+            return;
+        }
+        let rendition = pickRendition(id);
+        watchedCameras.set(id, rendition);
+
+        liveSocket.on(`live-${id}`, function (data) {
+            let img = document.getElementById(`live-${id}`);
+            if (img) {
+                // the frame is the raw JPEG, shown through a blob URL released once the next frame replaces it
+                let previousUrl = img.dataset.blobUrl;
+                img.dataset.blobUrl = URL.createObjectURL(new Blob([data.frame], {type: 'image/jpeg'}));
+                img.src = img.dataset.blobUrl;
+                if (previousUrl) {
+                    URL.revokeObjectURL(previousUrl);
+                }
+            }
+
+            let timestamp = document.getElementById(`timestamp-${id}`);
+            if (timestamp) {
+                timestamp.innerText = Date(data.time)
+            }
+        });
+        liveSocket.emit('subscribe', {'id': id, 'rendition': rendition});
+    }
+
+    function unwatchCamera(id) {
+        if (!watchedCameras.has(id)) {
+            return;
+        }
+        watchedCameras.delete(id);
+
+        liveSocket.off(`live-${id}`);
+        liveSocket.emit('unsubscribe', {'id': id});
+
+        let img = document.getElementById(`live-${id}`);
+        if (img && img.dataset.blobUrl) {
+            URL.revokeObjectURL(img.dataset.blobUrl);
+            delete img.dataset.blobUrl;
+            img.removeAttribute('src');
+        }
+    }
+
     function addLiveStreamDiv(id, ip, port, location) {
         // Create card container
         const card = document.createElement('div');
@@ -53,6 +126,8 @@ $(document).ready(function () {
         const img = document.createElement('img');
         img.id = `live-${id}`;
         img.className = 'videoImg';
+        img.title = 'Double-click to switch between the thumbnail and the full resolution';
+        img.addEventListener('dblclick', () => setRendition(id, watchedCameras.get(id) === 'thumb' ? 'full' : 'thumb'));
         imageCont.appendChild(img);
         
         const timestamp = document.createElement('div');
@@ -128,6 +203,8 @@ $(document).ready(function () {
             .then(data => {
                 console.log('Disconnection response:', data);
                 if (data.success) {
+                    unwatchCamera(id);
+
                     let row = $(this).closest('tr');
                     connectedCamerasTable.row(row).remove().draw(false);
 
@@ -147,44 +224,16 @@ $(document).ready(function () {
         // This function is called whenever a .startBtn within #liveVideos is clicked
         let id = $(this).data('host');  // Retrieve the host data attribute
         console.log('Starting video for', id);
-        // Add your logic here to start the video stream
-
-        fetch('/startLive', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({"id" : id})
-        })
-        .then(response => response.json())
-        .then(data => {
-            if(data.success) {
-                let socket = io.connect(location.protocol + '//' + document.domain + ':' + '5000');
-                socket.on(`live-${id}`, function(data) {
-                    let img = document.getElementById(`live-${id}`);
-                    img.src = 'data:image/jpeg;base64,' + data.frame;
 
-                    let timestamp = document.getElementById(`timestamp-${id}`);
-                    timestamp.innerText = Date(data.time)
-
-                });
-            }
-        })
+        watchCamera(id);
     });
 
     $('#liveVideos').on('click', '.stopBtn', function () {
         // This function is called whenever a .stopBtn within #liveVideos is clicked
         let id = $(this).data('host');  // Retrieve the host data attribute
         console.log('Stopping video for', id);
-        // Add your logic here to stop the video stream
 
-        fetch('/stopLive', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({"id" : id})
-        })
+        unwatchCamera(id);
     });
 
 
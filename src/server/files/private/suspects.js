@@ -107,6 +107,8 @@ document.getElementById('searchSuspectForm').addEventListener('submit', function
                             .then(response => response.json())
                             .then(data => {
                                 console.log('Success:', data);
+                                // Candidates are sorted best first, the map shows the best one
+                                data = data.candidates[0];
                                 // Assume data.locations is available and contains lat, lng
                                 initMap(data.locations.map(location => ({
                                     coordinates: {
@@ -9,14 +9,20 @@ Imports:
     - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
     - cv2: OpenCV library for computer vision tasks.
     - bson.json_util: Provides BSON (Binary JSON) utilities for working with MongoDB documents.
+    - bson.ObjectId: The MongoDB document id.
     - uuid: Provides methods for generating universally unique identifiers.
     - os: Provides a way of using operating system-dependent functionality.
+    - datetime: Supplies classes for manipulating dates and times.
+    - concurrent.futures.ThreadPoolExecutor: Provides a pool of threads to run calls in parallel.
     - .auth.verifier.Verifier: Custom verifier module for authentication.
     - .camera_connections.camera_radar.CameraRadar: Custom module for camera radar connections.
     - .camera_connections.camera_client.CameraClient: Custom module for camera client connections.
     - .camera_connections.camera_connections.CameraConnections, CameraConnection: Custom modules for managing multiple camera connections.
     - .camera_connections.live_server.LiveServer: Custom module for live server connections.
     - .image_process.process_images.ImageProcessor: Custom module for image processing.
+    - .db.blacklist_store.BlacklistStore: Custom module to store the blacklist.
+    - src.core.metrics: Custom module for the in-process metrics.
+    - src.core.profiler.SamplingProfiler: Custom module to profile the running server.
 """
 
 import json
@@ -25,22 +31,33 @@ import traceback
 import base64
 import numpy as np
 import cv2
-from bson import json_util
+from bson import json_util, ObjectId
 import uuid
 import os
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from .auth.verifier import Verifier
 from .camera_connections.camera_connections import CameraConnections, CameraConnection
 from .camera_connections.live_server import LiveServer
 from .image_process.image_processor import ImageProcessor
+from .db.blacklist_store import BlacklistStore
+from src.core import metrics
+from src.core.profiler import SamplingProfiler
 
 PRIVATE_FILES_PATH = "src/server/files/private"
+MAX_SIGHTINGS_PAGE = 500
+DECODE_WORKERS = min(8, os.cpu_count() or 1)
 
 ROUTING_DICT = {}
 services = []
 
 verifier = Verifier()
 
+profiler = SamplingProfiler()
+
+decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix='decode')
+
 camera_connections = CameraConnections()
 services.append(camera_connections)
 
@@ -54,13 +71,57 @@ for service in services:
     service.start()
 
 os.makedirs(f'{PRIVATE_FILES_PATH}/blacklist/profile_photos/', exist_ok=True)
-blacklist = {}
 
 BLACKLIST_PATH = f'{PRIVATE_FILES_PATH}/blacklist/blacklist.json'
-if not blacklist:
-    if os.path.isfile(BLACKLIST_PATH):
-        with open(BLACKLIST_PATH, 'r') as f:
-            blacklist = json_util.loads(f.read())
+BLACKLIST_EMBEDDINGS_PATH = f'{PRIVATE_FILES_PATH}/blacklist/embeddings.f32'
+
+blacklist_store = BlacklistStore(BLACKLIST_EMBEDDINGS_PATH)
+if os.path.isfile(BLACKLIST_PATH):
+    blacklist_store.migrate_json(BLACKLIST_PATH)
+
+blacklist = blacklist_store.load()
+
+for _id, suspect in blacklist.items():
+    image_processor.blacklist_index.add_suspect(_id, suspect['suspectName'], suspect['embeddings'])
+
+def check_session_role(session_id, required_role):
+    """
+    Checks that a session is valid and that its user has the required role.
+
+    Args:
+        session_id (str): The session ID.
+        required_role (int): The required role.
+
+    Returns:
+        bool: True if the session may access a resource of the role.
+    """
+    return verifier.check_role(session_id, required_role) and verifier.check_session(session_id)
+
+# SocketIO clients are checked against the web server's sessions
+live_server.check_role = check_session_role
+
+def push_blacklist_alert(alert):
+    """
+    Pushes a blacklist hit found while processing faces to the authenticated web clients over SocketIO.
+
+    Args:
+        alert (dict): The matched suspect's id, name and distance, the person's id and last seen time, and the
+            sighting's location and time.
+    """
+    if suspect := blacklist.get(alert['suspectId']):
+        suspect['last_seen'] = alert['lastSeen']
+
+    live_server.broadcast('blacklistAlert', json.loads(json_util.dumps(alert)))
+
+image_processor.blacklist_listeners.append(push_blacklist_alert)
+
+# cameras hold back their frames while the processing pipeline can't keep up with them
+camera_connections.pressure = image_processor.is_under_pressure
+camera_connections.credits = image_processor.get_credits
+
+# live feeds are started on their first viewer and stopped after their last one
+live_server.hub.start_live = camera_connections.start_live
+live_server.hub.stop_live = camera_connections.stop_live
 
 class Functions:
     """
@@ -88,7 +149,7 @@ class Functions:
 
                     session_id = cookies['session_id']
 
-                    if verifier.check_role(session_id, required_role) and verifier.check_session(session_id):
+                    if check_session_role(session_id, required_role):
                         return func(*args, **kwargs)
                     
                     elif required_role == 0 and verifier.check_role(session_id, 1):
@@ -318,13 +379,16 @@ class Functions:
         cameras = {}
 
         try:
+            viewers = live_server.hub.get_stats()['cameras']
 
             for _, camera_conn in camera_connections.get_cameras().items():
                 camera = camera_conn
                 cameras[f'{camera_conn.camera_id}'] = {
                     'host': camera.camera_ip,
                     'port': camera.camera_port,
-                    'location': camera.camera_location
+                    'location': camera.camera_location,
+                    'config': camera.config,
+                    'viewers': viewers.get(camera_conn.camera_id, 0)
                 }
         except Exception as e:
             print(e)
@@ -343,38 +407,45 @@ class Functions:
         }
     
     @staticmethod
-    @route("/startLive")
-    @role(1)
-    def start_live(*args, **kwargs):
+    @route("/configureCamera")
+    @role(0)
+    def configure_camera(*args, **kwargs):
         """
-        Route handler to start live streaming from a specified camera.
+        Route handler to change the frame rate, resolution, JPEG quality and region of interest of a camera.
 
         Returns:
             dict: The response containing status code, content type, and data.
         """
-        try: 
+        try:
             body = kwargs['body']
             data_dict = json.loads(body)
 
             camera_id = data_dict['id']
 
             camera = camera_connections.get_camera_connection(camera_id)
-            
-            if camera:
-                camera.start_live()
 
-                return {
-                    'code' : 200,
-                    'content_type' : 'application/json',
-                    'data' : json.dumps({'message': f'Started Live Video from {camera_id}', 'success' : True})
-                }
+            if camera:
+                if camera.configure(fps=data_dict.get('fps'), width=data_dict.get('width'), height=data_dict.get('height'),
+                                    quality=data_dict.get('quality'), roi=data_dict.get('roi')):
+                    return {
+                        'code' : 200,
+                        'content_type' : 'application/json',
+                        'data' : json.dumps({'message': f'Configured {camera_id}', 'success' : True})
+                    }
 
             return {
                 'code' : 500,
                 'content_type' : 'application/json',
-                'data' : json.dumps({'message': f'Could not find and start live video with {camera_id}'}),
+                'data' : json.dumps({'message': f'Could not find and configure {camera_id}'}),
             }
-        
+
+        except ValueError as e:
+            return {
+                'code' : 400,
+                'content_type' : 'application/json',
+                'data' : json.dumps({'message': str(e)}),
+            }
+
         except Exception as e:
             print(e)
             traceback.print_exc()
@@ -382,51 +453,23 @@ class Functions:
             return {
                 'code' : 500,
                 'content_type' : 'application/json',
-                'data' : json.dumps({'message': 'Error on starting live video'}),
+                'data' : json.dumps({'message': 'Error on configuring camera'}),
             }
 
     @staticmethod
-    @route("/stopLive")
-    @role(1)
-    def stop_live(*args, **kwargs):
+    def decodeImage(image):
         """
-        Route handler to stop live streaming from a specified camera.
+        Decodes a base64 data URL image.
+
+        Args:
+            image (str): The image as a base64 data URL.
 
         Returns:
-            dict: The response containing status code, content type, and data.
+            numpy.ndarray: The decoded image, or None if it could not be decoded.
         """
-        try: 
-            body = kwargs['body']
-            data_dict = json.loads(body)
-
-            camera_id = data_dict['id']
-
-            camera = camera_connections.get_camera_connection(camera_id)
-            
-            if camera:
-                camera.stop_live()
-
-                return {
-                    'code' : 200,
-                    'content_type' : 'application/json',
-                    'data' : json.dumps({'message': f'Stopped Live Video from {camera_id}', 'success' : True})
-                }
-
-            return {
-                'code' : 500,
-                'content_type' : 'application/json',
-                'data' : json.dumps({'message': f'Could not find and Stop live video with {camera_id}'}),
-            }
-        
-        except Exception as e:
-            print(e)
-            traceback.print_exc()
-
-            return {
-                'code' : 500,
-                'content_type' : 'application/json',
-                'data' : json.dumps({'message': 'Error on stopping live video'}),
-            }
+        image_data = base64.b64decode(image.split(',')[1])  # Remove the base64 prefix and decode
+        image = np.frombuffer(image_data, dtype=np.uint8)  # Convert to a matrix-like object
+        return cv2.imdecode(image, cv2.IMREAD_COLOR)
 
     @staticmethod
     def parseSuspectFormData(*args, **kwargs):
@@ -436,14 +479,8 @@ class Functions:
 
         suspect_name = data_dict['fullName']
 
-        images = data_dict['images']
-
-        for idx, image in enumerate(images):
-            image_data = base64.b64decode(image.split(',')[1])  # Remove the base64 prefix and decode
-            image = np.frombuffer(image_data, dtype=np.uint8)  # Convert to a matrix-like object
-            frame = cv2.imdecode(image, cv2.IMREAD_COLOR)
-            
-            images[idx] = frame
+        # base64 and jpeg decoding release the GIL, so the images are decoded in parallel
+        images = list(decode_pool.map(Functions.decodeImage, data_dict['images']))
 
         return suspect_name, images
 
@@ -460,10 +497,10 @@ class Functions:
         try:
             suspect_name, images = Functions.parseSuspectFormData(*args, **kwargs)
 
-            person = image_processor.match_suspect_to_person(suspect_name, images)
+            candidates = image_processor.match_suspect_to_person(suspect_name, images)
 
-            if person:
-                data = json_util.dumps(person)
+            if candidates:
+                data = json_util.dumps({'candidates': candidates})
                 
             else:
                 data = json.dumps({'message' : 'Suspect not found!'})
@@ -484,6 +521,107 @@ class Functions:
                 'data' : json.dumps({'message': 'Failed while searching suspect'}),
             }
 
+    @staticmethod
+    @route("/searchSightings")
+    @role(1)
+    def searchSightings(*args, **kwargs):
+        """
+        Route handler to query sightings by time range, camera and radius, one page at a time.
+
+        Query parameters (all optional):
+            start, end: ISO formatted times (e.g. 2024-05-01T14:00:00).
+            camera: The camera ('<lat>_<lng>' folder name) of the sightings.
+            lat, lng, radius: The center and radius (meters) of the searched area.
+            cursor: The 'nextCursor' returned with the previous page.
+            limit: The page size, between 1 and MAX_SIGHTINGS_PAGE.
+
+        Returns:
+            dict: The response containing status code, content type, and data.
+        """
+        try:
+            parameters = kwargs.get('parameters', {})
+
+            start = datetime.fromisoformat(parameters['start']) if parameters.get('start') else None
+            end = datetime.fromisoformat(parameters['end']) if parameters.get('end') else None
+
+            center = None
+            if parameters.get('lat') and parameters.get('lng'):
+                center = (float(parameters['lat']), float(parameters['lng']))
+            radius = float(parameters['radius']) if parameters.get('radius') else None
+
+            limit = max(1, min(int(parameters.get('limit', MAX_SIGHTINGS_PAGE)), MAX_SIGHTINGS_PAGE))
+
+            sightings, next_cursor = image_processor.data_manager.query_sightings(
+                start=start, end=end, camera=parameters.get('camera'),
+                center=center, radius=radius, cursor=parameters.get('cursor'), limit=limit)
+
+            for sighting in sightings:
+                person = image_processor.data_manager.get_person_summary(sighting['meta']['person_id'])
+                sighting['name'] = person.get('name') if person else None
+
+            return {
+                'code': 200,
+                'content_type': 'application/json',
+                'data': json_util.dumps({'sightings': sightings, 'nextCursor': next_cursor})
+            }
+
+        except ValueError as e:
+            return {
+                'code' : 400,
+                'content_type' : 'application/json',
+                'data' : json.dumps({'message': str(e)}),
+            }
+
+        except Exception as e:
+            print(e)
+            traceback.print_exc()
+
+            return {
+                'code' : 500,
+                'content_type' : 'application/json',
+                'data' : json.dumps({'message': 'Failed while searching sightings'}),
+            }
+
+    @staticmethod
+    @route('/getPerson')
+    @role(1)
+    def getPerson(*args, **kwargs):
+        """
+        Route handler to get a person with its most recent sightings.
+
+        Query parameters:
+            id: The person's id.
+
+        Returns:
+            dict: The response containing status code, content type, and data.
+        """
+        try:
+            parameters = kwargs.get('parameters', {})
+            person = image_processor.data_manager.get_person(ObjectId(parameters['id']))
+
+            if not person:
+                return {
+                    'code' : 404,
+                    'content_type' : 'application/json',
+                    'data' : json.dumps({'message': 'Person not found'}),
+                }
+
+            return {
+                'code': 200,
+                'content_type': 'application/json',
+                'data': json_util.dumps(person)
+            }
+
+        except Exception as e:
+            print(e)
+            traceback.print_exc()
+
+            return {
+                'code' : 500,
+                'content_type' : 'application/json',
+                'data' : json.dumps({'message': 'Failed while retrieving person'}),
+            }
+
     @staticmethod
     @route('/addSuspectToBlacklist')
     @role(1)
@@ -497,7 +635,7 @@ class Functions:
         try:
             suspect_name, images = Functions.parseSuspectFormData(*args, **kwargs)
             
-            embeddings = list(image_processor.get_embeddings(images))
+            embeddings = image_processor.get_embeddings(images)
 
             _id = str(uuid.uuid4())
             
@@ -511,8 +649,9 @@ class Functions:
 
             cv2.imwrite(PRIVATE_FILES_PATH + blacklist[_id]['profilePhotoUrl'], image_processor.get_face_from_image(images[0]))
 
-            with open(BLACKLIST_PATH, 'w') as f:
-                f.write(json_util.dumps(blacklist))
+            image_processor.blacklist_index.add_suspect(_id, suspect_name, embeddings)
+
+            blacklist_store.add(_id, suspect_name, blacklist[_id]['profilePhotoUrl'], embeddings)
 
             return {
                 'code': 200,
@@ -538,32 +677,42 @@ class Functions:
     @role(1)
     def checkBlackList(*args, **kwargs):
         """
-        Route handler to retrieve the blacklist.
+        Route handler to search the already stored persons for blacklisted suspects. New sightings are matched
+        while they are processed and pushed as 'blacklistAlert' events, this catches up on older ones.
 
         Returns:
             dict: The response containing status code, content type, and data.
         """
         try:
             criminalsFound = []
-            
-            for _id in blacklist:
-                suspect = blacklist[_id]
 
-                for embedding in suspect['embeddings']:
-                    if person := image_processor.match_embedding_to_person(embedding=embedding, suspect_name=suspect['suspectName']):
+            suspect_ids = [_id for _id in blacklist if len(blacklist[_id]['embeddings'])]
+
+            if suspect_ids:
+                # every suspect embedding is searched at once, each suspect is a group of votes
+                embeddings = np.vstack([np.asarray(blacklist[_id]['embeddings'], dtype=np.float32).reshape(-1, 128) for _id in suspect_ids])
+                groups = np.repeat(np.arange(len(suspect_ids)), [len(blacklist[_id]['embeddings']) for _id in suspect_ids])
 
-                        locations = person['locations']
+                matches = image_processor.data_manager.match_embeddings(embeddings, groups)
+            else:
+                matches = {}
+
+            for group, group_matches in matches.items():
+                suspect = blacklist[suspect_ids[group]]
+                person_id = group_matches[0][0]
 
-                        last_seen = locations[-1]
+                person = image_processor.data_manager.get_person_summary(person_id)
+                if not person:
+                    continue
 
-                        if not 'last_seen' in suspect:
-                            suspect['last_seen'] = None
+                if person.get('name') != suspect['suspectName']:
+                    image_processor.data_manager.insert_name(_id=person_id, name=suspect['suspectName'])
 
-                        if suspect['last_seen'] != last_seen:
-                            criminalsFound.append(person)
-                            suspect['last_seen'] = last_seen
-                        
-                        break
+                last_seen = person.get('last_seen')
+
+                if suspect.get('last_seen') != last_seen:
+                    criminalsFound.append(image_processor.data_manager.get_person(person_id))
+                    suspect['last_seen'] = last_seen
                 
             return {
                 'code' : 200,
@@ -599,6 +748,147 @@ class Functions:
         
         return jpg_as_text
 
+    @staticmethod
+    @route('/getInferenceStats')
+    @role(0)
+    def getInferenceStats(*args, **kwargs):
+        """
+        Route handler to get the queue depth and latency of every inference priority class.
+
+        Returns:
+            dict: The response containing status code, content type, and data.
+        """
+        try:
+            return {
+                'code' : 200,
+                'content_type': 'application/json',
+                'data': json.dumps(image_processor.scheduler.get_stats())
+            }
+
+        except Exception as e:
+            print(e)
+            traceback.print_exc()
+
+            return {
+                'code' : 500,
+                'content_type' : 'application/json',
+                'data' : json.dumps({'message': 'Failed while retrieving inference stats'}),
+            }
+
+    @staticmethod
+    @route('/getIngestStats')
+    @role(0)
+    def getIngestStats(*args, **kwargs):
+        """
+        Route handler to get the queued, processed and shed frames of every camera, the pipeline stages stats and
+        the capture to indexed latency percentiles and slow frames.
+
+        Returns:
+            dict: The response containing status code, content type, and data.
+        """
+        try:
+            data = {
+                'cameras': image_processor.file_paths.get_stats(),
+                'stages': image_processor.get_pipeline_stats(),
+                'droppedAtCamera': {camera_id: conn.dropped_frames for camera_id, conn in camera_connections.get_cameras().items()},
+                'latency': image_processor.traces.get_stats()
+            }
+
+            return {
+                'code' : 200,
+                'content_type': 'application/json',
+                'data': json.dumps(data)
+            }
+
+        except Exception as e:
+            print(e)
+            traceback.print_exc()
+
+            return {
+                'code' : 500,
+                'content_type' : 'application/json',
+                'data' : json.dumps({'message': 'Failed while retrieving ingest stats'}),
+            }
+
+    @staticmethod
+    @route('/metrics')
+    @role(0)
+    def getMetrics(*args, **kwargs):
+        """
+        Route handler to get the pipeline metrics (frames and faces counts, stage, inference, FAISS and MongoDB
+        timings, queue depths and camera lag) in the Prometheus text format. The scraper has to send an admin
+        session cookie.
+
+        Returns:
+            dict: The response containing status code, content type, and data.
+        """
+        try:
+            return {
+                'code' : 200,
+                'content_type': 'text/plain; version=0.0.4; charset=utf-8',
+                'data': metrics.render()
+            }
+
+        except Exception as e:
+            print(e)
+            traceback.print_exc()
+
+            return {
+                'code' : 500,
+                'content_type' : 'application/json',
+                'data' : json.dumps({'message': 'Failed while retrieving metrics'}),
+            }
+
+    @staticmethod
+    @route('/profile')
+    @role(0)
+    def profile(*args, **kwargs):
+        """
+        Route handler to profile the server: samples the stacks of all the threads for a number of seconds and
+        measures their CPU time. The query parameters are 'seconds' (default 10), 'interval' between two
+        samples in milliseconds (default 10) and 'format', 'json' (default) or 'collapsed' for the collapsed
+        stacks only, ready for flamegraph.pl or speedscope.
+
+        Returns:
+            dict: The response containing status code, content type, and data.
+        """
+        try:
+            parameters = kwargs.get('parameters', {})
+            seconds = float(parameters.get('seconds', 10))
+            interval = float(parameters.get('interval', 10)) / 1000
+
+            try:
+                result = profiler.profile(seconds, interval)
+            except RuntimeError as e:
+                return {
+                    'code' : 409,
+                    'content_type' : 'application/json',
+                    'data' : json.dumps({'message': str(e)}),
+                }
+
+            if parameters.get('format') == 'collapsed':
+                return {
+                    'code' : 200,
+                    'content_type': 'text/plain; charset=utf-8',
+                    'data': SamplingProfiler.to_collapsed(result)
+                }
+
+            return {
+                'code' : 200,
+                'content_type': 'application/json',
+                'data': json.dumps(result)
+            }
+
+        except Exception as e:
+            print(e)
+            traceback.print_exc()
+
+            return {
+                'code' : 500,
+                'content_type' : 'application/json',
+                'data' : json.dumps({'message': 'Failed while profiling'}),
+            }
+
     @staticmethod
     @route('/getBlacklist')
     @role(1)
@@ -652,9 +942,9 @@ class Functions:
                 os.remove(PRIVATE_FILES_PATH + blacklist[suspectId]['profilePhotoUrl'])
 
                 del blacklist[suspectId]
+                image_processor.blacklist_index.remove_suspect(suspectId)
 
-                with open(BLACKLIST_PATH, 'w') as f:
-                    json.dump(blacklist, f)
+                blacklist_store.remove(suspectId)
             
                 return {
                     'code' : 200,
@@ -56,7 +56,7 @@ class Server:
                 try:
                     client_socket, addr = self.socket.accept()
                     print(f"Connection from {addr}")
-                    threading.Thread(target=self.handle_client, args=(client_socket,)).start()
+                    threading.Thread(target=self.handle_client, args=(client_socket,), name=f'http_client-{addr[0]}:{addr[1]}').start()
                 except ssl.SSLError as e:
                     print(f"SSL error: {e}")
                 except Exception as e:
@@ -11,4 +11,13 @@ class Settings(BaseSettings):
     ROOT_PATH_IMAGES: str
     MONGODB_URL: str
 
+    FAISS_STORAGE: str = 'flat'
+    FAISS_RERANK: bool = True
+
+    CAMERA_QUEUE_SIZE: int = 50
+    SHED_POLICY: str = 'newest'
+    SHED_SAMPLE_EVERY: int = 2
+    STAGE_QUEUE_SIZE: int = 64
+    SLOW_FRAME_SECONDS: float = 10
+
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+This module defines a BlacklistIndex class that keeps the embeddings of blacklisted suspects in their own
+small FAISS index, so every new face can be checked against the blacklist as it is processed.
+
+Imports:
+    - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
+    - faiss: Library for efficient similarity search of dense vectors.
+    - threading: Allows for the creation and management of threads.
+    - .deepface_encapsulator.FeatureExtractor: Custom module to extract features from faces.
+"""
+
+import numpy as np
+import faiss
+import threading
+
+from .deepface_encapsulator import FeatureExtractor
+
+class BlacklistIndex:
+    """
+    A thread safe in-memory FAISS index of the blacklisted suspects' embeddings.
+
+    Args:
+        dim (int): The dimension of the embeddings. Defaults to 128.
+    """
+
+    def __init__(self, dim=128) -> None:
+        self.index = faiss.IndexIDMap(faiss.IndexFlatL2(dim))
+        self.suspects = {}        # suspect id -> suspect name
+        self.suspect_ids = {}     # embedding id -> suspect id
+        self.embedding_ids = {}   # suspect id -> embedding ids
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.suspects)
+
+    def add_suspect(self, suspect_id, suspect_name, embeddings):
+        """
+        Adds a suspect's embeddings to the index.
+
+        Args:
+            suspect_id (str): The unique identifier of the suspect.
+            suspect_name (str): The suspect's name.
+            embeddings (list): The suspect's embeddings.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.index.d)
+
+        with self.lock:
+            ids = np.arange(self.next_id, self.next_id + len(embeddings), dtype=np.int64)
+            self.next_id += len(embeddings)
+
+            if len(embeddings):
+                self.index.add_with_ids(embeddings, ids)
+
+            self.suspects[suspect_id] = suspect_name
+            self.embedding_ids[suspect_id] = ids
+            self.suspect_ids.update({int(_id): suspect_id for _id in ids})
+
+    def remove_suspect(self, suspect_id):
+        """
+        Removes a suspect's embeddings from the index.
+
+        Args:
+            suspect_id (str): The unique identifier of the suspect.
+        """
+        with self.lock:
+            ids = self.embedding_ids.pop(suspect_id, np.empty((0,), dtype=np.int64))
+            self.suspects.pop(suspect_id, None)
+
+            if len(ids):
+                self.index.remove_ids(ids)
+            for _id in ids:
+                self.suspect_ids.pop(int(_id), None)
+
+    def match(self, embedding):
+        """
+        Matches an embedding against the blacklisted suspects.
+
+        Args:
+            embedding (np.array): The embedding to match.
+
+        Returns:
+            dict: The matched suspect's id, name and the distance, or None if no suspect is close enough.
+        """
+        with self.lock:
+            if self.index.ntotal == 0:
+                return None
+
+            distances, ids = self.index.search(np.asarray(embedding, dtype=np.float32).reshape(1, -1), 1)
+
+            if ids[0][0] != -1 and distances[0][0] <= FeatureExtractor.FACENET_THRESHOLD_EUCLIDEAN:
+                suspect_id = self.suspect_ids[int(ids[0][0])]
+                return {
+                    'suspectId': suspect_id,
+                    'suspectName': self.suspects[suspect_id],
+                    'distance': float(distances[0][0])
+                }
+        return None
@@ -0,0 +1,112 @@
+"""
+This module defines a CentroidIndex class that keeps one representative vector (the running mean of the
+stored embeddings) per person, so new faces can be matched against people instead of every stored sighting.
+
+Imports:
+    - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
+    - faiss: Library for efficient similarity search of dense vectors.
+    - threading: Allows for the creation and management of threads.
+"""
+
+import numpy as np
+import faiss
+import threading
+
+class CentroidIndex:
+    """
+    A thread safe FAISS index of person centroids, keyed by the person's `index_id`.
+
+    The index is saved to `<index_path>.centroids` and the number of embeddings behind every centroid
+    to `<index_path>.centroids.counts.npy`.
+
+    Args:
+        index_path (str): The file path of the embeddings FAISS index, used as the base path.
+        dim (int): The dimension of the embeddings. Defaults to 128.
+    """
+
+    def __init__(self, index_path, dim=128) -> None:
+        self.path = f'{index_path}.centroids'
+        self.counts_path = f'{self.path}.counts.npy'
+        self.dim = dim
+        self.index, self.counts = self.read_index()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def read_index(self):
+        """
+        Reads the centroid index and counts from disk, or creates empty ones.
+
+        Returns:
+            tuple: The FAISS index and a dictionary of person key to embeddings count.
+        """
+        try:
+            index = faiss.read_index(self.path)
+            counts = {int(key): int(count) for key, count in np.load(self.counts_path)}
+            return index, counts
+        except Exception as e:
+            print(e)
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(self.dim)), {}
+
+    def save(self):
+        """
+        Saves the centroid index and counts to disk.
+        """
+        with self.lock:
+            faiss.write_index(self.index, self.path)
+            np.save(self.counts_path, np.array(list(self.counts.items()), dtype=np.int64).reshape(-1, 2))
+
+    def set(self, person_key, centroid, count):
+        """
+        Sets the centroid of a person, replacing the existing one.
+
+        Args:
+            person_key (int): The index_id of the person.
+            centroid (np.array): The centroid vector.
+            count (int): The number of embeddings the centroid was computed from.
+        """
+        ids = np.array([person_key], dtype=np.int64)
+
+        with self.lock:
+            if int(person_key) in self.counts:
+                self.index.remove_ids(ids)
+            self.index.add_with_ids(np.asarray(centroid, dtype=np.float32).reshape(1, -1), ids)
+            self.counts[int(person_key)] = int(count)
+
+    def update(self, person_key, embedding):
+        """
+        Moves the centroid of a person towards a newly stored embedding (incremental mean), creating it if
+        needed. Replacing a centroid compacts the flat index, so only stored embeddings should update it.
+
+        Args:
+            person_key (int): The index_id of the person.
+            embedding (np.array): The new stored embedding of the person.
+        """
+        embedding = np.asarray(embedding, dtype=np.float32)
+        ids = np.array([person_key], dtype=np.int64)
+
+        with self.lock:
+            count = self.counts.get(int(person_key), 0)
+
+            if count:
+                centroid = self.index.reconstruct(int(person_key))
+                self.index.remove_ids(ids)
+                embedding = centroid + (embedding - centroid) / (count + 1)
+
+            self.index.add_with_ids(embedding.reshape(1, -1), ids)
+            self.counts[int(person_key)] = count + 1
+
+    def search(self, embedding, k):
+        """
+        Searches the k nearest person centroids.
+
+        Args:
+            embedding (np.array): The query vectors, shaped (nq, dim).
+            k (int): The number of persons to return.
+
+        Returns:
+            tuple: The distances and person keys arrays, both shaped (nq, k).
+        """
+        with self.lock:
+            return self.index.search(np.asarray(embedding, dtype=np.float32), k)
@@ -1,4 +1,6 @@
 from pymongo import MongoClient
+from bson import ObjectId
+from datetime import datetime
 from uuid import uuid4
 import numpy as np
 import faiss
@@ -6,25 +8,133 @@ import os
 import threading
 
 from .models.person import Person
+from .models.sighting import Sighting
+from .sighting_writer import SightingWriter, MONGO_WRITE_SECONDS
+from .vector_store import RawVectorStore
+from .centroid_index import CentroidIndex
+from src.core.lru_cache import LRUCache
+from src.core import metrics
 from .deepface_encapsulator import FeatureExtractor
 
+FAISS_SECONDS = metrics.histogram('faiss_seconds', 'Time spent in FAISS index operations (search, add)', ['operation'])
+
 class ThreadSafeFaissIndex:
-    def __init__(self, index_path) -> None:
+    """
+    A thread safe wrapper around a FAISS index of face embeddings.
+
+    The index can store the embeddings compressed ('fp16' halves and 'sq8' quarters the 512 bytes of a
+    float32 FaceNet embedding). The raw embeddings are always kept in a memory-mapped RawVectorStore
+    sidecar, which is used to re-rank the compressed search results with exact distances.
+
+    Args:
+        index_path (str): The file path to the FAISS index.
+        storage (str): The storage mode of new indexes, one of STORAGE_TYPES. Defaults to 'flat'.
+        rerank (bool): Whether to re-rank compressed search results with the raw vectors. Defaults to True.
+        dim (int): The dimension of the embeddings. Defaults to 128.
+    """
+    STORAGE_TYPES = {
+        'flat': None,
+        'fp16': faiss.ScalarQuantizer.QT_fp16,
+        'sq8': faiss.ScalarQuantizer.QT_8bit,
+    }
+    # number of raw vectors needed before training a quantizer that requires it (sq8)
+    TRAIN_SIZE = 4096
+    # candidates fetched per requested neighbour when re-ranking
+    RERANK_FACTOR = 4
+
+    def __init__(self, index_path, storage='flat', rerank=True, dim=128) -> None:
+        if storage not in ThreadSafeFaissIndex.STORAGE_TYPES:
+            raise ValueError(f"Unknown FAISS storage '{storage}', expected one of {list(ThreadSafeFaissIndex.STORAGE_TYPES)}")
+
         os.environ['KMP_DUPLICATE_LIB_OK'] = "True"
         self.index_path = index_path
+        self.storage = storage
+        self.rerank = rerank
+        self.dim = dim
+        self.raw = RawVectorStore(index_path, dim=dim)
         self.index = self.read_faiss_index()
         self.lock = threading.Lock()
-       
+
+    def create_index(self):
+        """
+        Creates an empty index with the configured storage mode.
+
+        Returns:
+            faiss.IndexIDMap: The new index.
+        """
+        if self.storage == 'flat':
+            return faiss.IndexIDMap(faiss.IndexFlatL2(self.dim))
+        return faiss.IndexIDMap(faiss.IndexScalarQuantizer(self.dim, ThreadSafeFaissIndex.STORAGE_TYPES[self.storage]))
+
+    @staticmethod
+    def storage_of(index):
+        """
+        Finds the storage mode of a loaded index.
+
+        Args:
+            index (faiss.IndexIDMap): The index to inspect.
+
+        Returns:
+            str: The storage mode of the index, or None if it is not one of STORAGE_TYPES.
+        """
+        inner = faiss.downcast_index(index.index)
+        if isinstance(inner, faiss.IndexFlatL2):
+            return 'flat'
+        if isinstance(inner, faiss.IndexScalarQuantizer):
+            for storage, qtype in ThreadSafeFaissIndex.STORAGE_TYPES.items():
+                if qtype == inner.sq.qtype:
+                    return storage
+        return None
+
     def read_faiss_index(self):
+        """
+        Reads the index from disk, backfilling the raw vector sidecar from it if the sidecar is missing and
+        rebuilding the index from the sidecar if it was saved with a different storage mode.
+
+        Returns:
+            faiss.IndexIDMap: The loaded index.
+        """
         try:
             index = faiss.read_index(self.index_path)
         except Exception as e:
             print(e)
-            index = faiss.IndexIDMap(faiss.IndexFlatL2(128))
+            return self.rebuild_index()
+
+        if len(self.raw) == 0 and index.ntotal > 0:
+            vectors = index.index.reconstruct_n(0, index.ntotal)
+            self.raw.add(vectors, faiss.vector_to_array(index.id_map))
+            self.raw.flush()
+
+        if ThreadSafeFaissIndex.storage_of(index) != self.storage:
+            print(f"Converting FAISS index to '{self.storage}' storage.")
+            index = self.rebuild_index()
+
+        return index
+
+    def rebuild_index(self):
+        """
+        Builds a new index with the configured storage mode from the raw vectors. An index that needs
+        training stays empty until TRAIN_SIZE raw vectors are available.
+
+        Returns:
+            faiss.IndexIDMap: The new index.
+        """
+        index = self.create_index()
+        vectors, ids = self.raw.all()
+
+        if not index.is_trained:
+            if len(vectors) < ThreadSafeFaissIndex.TRAIN_SIZE:
+                return index
+            index.train(np.asarray(vectors))
+
+        if len(vectors):
+            index.add_with_ids(np.asarray(vectors), np.asarray(ids))
         return index
 
     def save_faiss(self):
-        faiss.write_index(self.index, self.index_path)
+        with self.lock:
+            faiss.write_index(self.index, self.index_path)
+            self.raw.flush()
     
     def add_embedding_to_faiss(self, embedding, ids):
         """
@@ -35,23 +145,55 @@ class ThreadSafeFaissIndex:
             ids (np.array.int64): The unique identifier for the vector.
         """
 
+        embedding = np.asarray(embedding, dtype=np.float32)
         if len(embedding.shape) == 1:
             embedding = np.expand_dims(embedding, axis=0)
 
-        with self.lock:
-            self.index.add_with_ids(embedding, ids)
+        with self.lock, FAISS_SECONDS.time(operation='add'):
+            self.raw.add(embedding, ids)
+
+            if self.index.is_trained:
+                self.index.add_with_ids(embedding, ids)
+            elif len(self.raw) >= ThreadSafeFaissIndex.TRAIN_SIZE:
+                self.index = self.rebuild_index()
     
     def search(self, embedding, k):
         """
-        Adds a given vector to the FAISS index with a specified ID.
+        Searches the k nearest embeddings. Compressed results are re-ranked with the exact raw vectors, so the
+        returned distances are always exact squared L2 distances.
         
         Args:
-            vector (np.array): The feature vector to be added.
-            ids (np.array.int64): The unique identifier for the vector.
+            embedding (np.array): The query vectors, shaped (nq, dim).
+            k (int): The number of neighbours to return.
+
+        Returns:
+            tuple: The distances and ids arrays, both shaped (nq, k).
+        """
+        embedding = np.asarray(embedding, dtype=np.float32)
+
+        with self.lock, FAISS_SECONDS.time(operation='search'):
+            if not self.index.is_trained:
+                return self.raw.search(embedding, k)
+
+            if self.storage == 'flat' or not self.rerank:
+                return self.index.search(embedding, k)
+
+            _, candidate_ids = self.index.search(embedding, k * ThreadSafeFaissIndex.RERANK_FACTOR)
+            return self.raw.rerank(embedding, candidate_ids, k)
+
+    def get_vectors(self, ids):
         """
+        Retrieves the exact stored vectors of the given embedding ids.
+
+        Args:
+            ids (iterable): The embedding ids to look up.
 
+        Returns:
+            tuple: The found vectors shaped (m, dim) and their ids, unknown ids are skipped.
+        """
         with self.lock:
-            return self.index.search(embedding, k)
+            vectors, found_ids = self.raw.get(ids)
+            return np.array(vectors), found_ids
     
 
 class DataManager:
@@ -62,72 +204,529 @@ class DataManager:
     Attributes:
         db (MongoClient): A client connected to the MongoDB database.
         index (faiss.Index): A FAISS index for efficient similarity search of feature vectors.
+        centroids (CentroidIndex): A FAISS index of one centroid vector per person, searched before the embeddings.
+        sightings (Collection): A time-series collection of every sighting, the persons only keep a summary.
     
     Args:
         index_path (str): The file path to the FAISS index.
         db_path (str): The path/url to the database
+        index_storage (str): The storage mode of the FAISS index ('flat', 'fp16' or 'sq8'). Defaults to 'flat'.
+        rerank (bool): Whether to re-rank compressed search results with exact distances. Defaults to True.
+        client (MongoClient): An already connected client used instead of connecting to mongodb_url, e.g. a local
+            stand-in for benchmarks. Defaults to None.
     """
+    # number of nearest person centroids considered for a match
+    CENTROID_CANDIDATES = 3
+    # centroids further than this multiple of the match threshold are not considered
+    CENTROID_SEARCH_RADIUS = 2
+    # a person keeps at most this many embeddings in the index, further sightings are recorded without theirs
+    MAX_EMBEDDINGS_PER_PERSON = 32
+    # a new embedding is stored only if it is at least this far from the person's stored embeddings
+    MIN_EMBEDDING_DISTANCE = FeatureExtractor.FACENET_THRESHOLD_EUCLIDEAN / 4
+    # number of person summaries kept in the LRU cache
+    PERSON_CACHE_SIZE = 4096
+    PERSON_SUMMARY_PROJECTION = {'embeddings_ids': 0, 'locations': 0}
+    # number of most recent sightings attached to a person by get_person
+    PERSON_LOCATIONS_LIMIT = 1000
+    EARTH_RADIUS_METERS = 6378100
+    CURSOR_TIME_FORMAT = '%Y%m%d%H%M%S%f'
+    # number of neighbours searched per embedding when matching many embeddings at once
+    MATCH_NEIGHBOURS = 10
     
-    def __init__(self, mongodb_url, index_path) -> None:
-        client = MongoClient(mongodb_url)
+    def __init__(self, mongodb_url, index_path, index_storage='flat', rerank=True, client=None) -> None:
+        client = client if client is not None else MongoClient(mongodb_url)
 
         self.db = client['gods_eye']
         self.collection = self.db['persons']
 
         self.collection.create_index([('embeddings_ids', 1)])
+        self.collection.create_index([('index_id', 1)])
+
+        if 'sightings' not in self.db.list_collection_names():
+            self.db.create_collection('sightings', timeseries={'timeField': 'time', 'metaField': 'meta', 'granularity': 'seconds'})
+        self.sightings = self.db['sightings']
+        self.sightings.create_index([('meta.person_id', 1), ('time', -1)])
+        self.sightings.create_index([('meta.camera', 1), ('time', 1)])
+        self.sightings.create_index([('time', 1)])
+        self.sightings.create_index([('geo', '2dsphere')])
+        self.sightings_writer = SightingWriter(self.sightings)
+
+        self.migrate_embedded_sightings()
+
+        self.index = ThreadSafeFaissIndex(index_path=index_path, storage=index_storage, rerank=rerank)
+        self.centroids = CentroidIndex(index_path=index_path)
+
+        # in-process maps so matches are resolved without querying mongo
+        self.embedding_owners = {}   # embedding id -> person _id
+        self.person_ids = {}         # person index_id -> person _id
+        self.person_embeddings = {}  # person index_id -> embedding ids
+        self.person_cache = LRUCache(DataManager.PERSON_CACHE_SIZE)
+
+        self.load_person_map()
+
+        if len(self.centroids) != len(self.person_ids):
+            self.rebuild_centroids()
+
+    def migrate_embedded_sightings(self):
+        """
+        Moves the 'locations' arrays of persons stored before the sightings collection existed into the
+        sightings collection, keeping only the sighting summary on the person.
+        """
+        for person in self.collection.find({'locations': {'$exists': True}}, {'locations': 1}):
+            sightings = [Sighting.from_location_time(person['_id'], location_time) for location_time in person['locations']]
+
+            if sightings:
+                # a crash between the two writes leaves the locations array in place, so drop the sightings a previous
+                # run already inserted for it before inserting them again (filtering on the meta field only, as
+                # time-series collections require)
+                cameras = list({sighting.camera for sighting in sightings})
+                self.sightings.delete_many({'meta.person_id': person['_id'], 'meta.camera': {'$in': cameras}})
+                self.sightings.insert_many([sighting.to_dict() for sighting in sightings], ordered=False)
+
+            summary = {'sightings_count': len(sightings)}
+            if sightings:
+                last = max(sightings, key=lambda sighting: sighting.time)
+                summary.update({'last_seen': last.time, 'last_location': last.location})
 
-        self.index = ThreadSafeFaissIndex(index_path=index_path)
+            self.collection.update_one({'_id': person['_id']}, {'$set': summary, '$unset': {'locations': ''}})
 
-    def insert_new_person(self, embedding_id, location, time):
+    def load_person_map(self):
+        """
+        Loads the embedding id to person maps from the persons collection, assigning an index_id to persons
+        created before the centroid index existed.
+        """
+        for person in self.collection.find({}, {'index_id': 1, 'embeddings_ids': 1}):
+            person_key = person.get('index_id')
+
+            if person_key is None:
+                person_key = int(DataManager.generate_ids(1)[0])
+                self.collection.update_one({'_id': person['_id']}, {'$set': {'index_id': person_key}})
+
+            self.register_person(person['_id'], person_key, person.get('embeddings_ids', []))
+
+    def register_person(self, _id, person_key, embedding_ids):
+        """
+        Adds a person and its embeddings to the in-process maps.
+
+        Args:
+            _id (ObjectId): The mongo id of the person.
+            person_key (int): The index_id of the person.
+            embedding_ids (list): The ids of the person's stored embeddings.
+        """
+        self.person_ids[int(person_key)] = _id
+        self.person_embeddings.setdefault(int(person_key), [])
+
+        for embedding_id in embedding_ids:
+            self.register_embedding(person_key, embedding_id)
+
+    def register_embedding(self, person_key, embedding_id):
+        """
+        Adds a stored embedding of a known person to the in-process maps.
+
+        Args:
+            person_key (int): The index_id of the person.
+            embedding_id (int): The id of the stored embedding.
+        """
+        self.embedding_owners[int(embedding_id)] = self.person_ids[int(person_key)]
+        self.person_embeddings[int(person_key)].append(int(embedding_id))
+
+    def rebuild_centroids(self):
+        """
+        Rebuilds the person centroid index from the stored embeddings.
+        """
+        print("Rebuilding person centroid index.")
+
+        for person_key, embedding_ids in self.person_embeddings.items():
+            vectors, _ = self.index.get_vectors(embedding_ids)
+            if len(vectors):
+                self.centroids.set(person_key, vectors.mean(axis=0), len(vectors))
+
+        self.centroids.save()
+
+    def insert_new_person(self, person_key, embedding_id, location, time):
         """
         Inserts a new person into the database with a unique ID and location.
         
         Args:
-            id (UUID): The unique identifier for the new person.
+            person_key (int): The index_id of the new person, its key in the centroid index.
+            embedding_id (int): The unique identifier of the person's first embedding.
             location (tuple): The location of the new person sighting.
         """
-        return Person.create_person(self.db, embedding_id=embedding_id,  location=location, time=time)
+        with MONGO_WRITE_SECONDS.time(operation='create_person'):
+            return Person.create_person(self.db, index_id=person_key, embedding_id=embedding_id, location=location, time=time)
     
-    def insert_new_sighting(self, embedding_id, new_embedding_id, location, time):
+    def insert_new_sighting(self, person_key, new_embedding_id, location, time):
         """
         Inserts a new sighting of an existing person identified by ID with a new location.
         
         Args:
-            id (UUID): The unique identifier of the existing person.
-            new_id (UUID): The unique identifier for the new sighting.
+            person_key (int): The index_id of the existing person.
+            new_embedding_id (int): The unique identifier for the new sighting's embedding, or None if the
+                embedding is not stored.
             location (tuple): The location of the new sighting.
         """
-        return Person.add_sighting(self.db, embedding_id=embedding_id, new_embedding_id=new_embedding_id, location=location, time=time)
+        with MONGO_WRITE_SECONDS.time(operation='add_sighting'):
+            return Person.add_sighting(self.db, index_id=person_key, new_embedding_id=new_embedding_id, location=location, time=time)
+
+    def get_person_summary(self, _id):
+        """
+        Retrieves a slim projection of a person (without its embeddings and locations), cached in an LRU cache.
+
+        Args:
+            _id (ObjectId): The mongo id of the person.
+
+        Returns:
+            dict: The person's summary, or None if not found.
+        """
+        person = self.person_cache.get(_id)
+
+        if person is None:
+            person = self.collection.find_one({'_id': _id}, DataManager.PERSON_SUMMARY_PROJECTION)
+            if person:
+                self.person_cache.put(_id, person)
+
+        return person
+
+    def update_person_summary(self, _id, location, time):
+        """
+        Applies a new sighting to the cached summary of a person, the same way Person.add_sighting updates the
+        person's document, so the active persons stay cached.
+
+        Args:
+            _id (ObjectId): The mongo id of the person.
+            location (tuple): The location of the sighting.
+            time (datetime): The time of the sighting.
+        """
+        def add_sighting(person):
+            last_seen = person.get('last_seen')
+            if last_seen is None or last_seen <= time:
+                person['last_seen'] = time
+                person['last_location'] = location
+            person['sightings_count'] = person.get('sightings_count', 0) + 1
+
+        self.person_cache.update(_id, add_sighting)
+
+    def get_person_locations(self, _id, limit=None):
+        """
+        Retrieves the most recent sightings of a person, oldest first, in the 'locations' format of the
+        persons documents ({'coordinates', 'date'}). Sightings still pending in the writer are not included.
+
+        Args:
+            _id (ObjectId): The mongo id of the person.
+            limit (int): The maximum number of sightings to return. Defaults to PERSON_LOCATIONS_LIMIT.
+
+        Returns:
+            list: The person's sightings.
+        """
+        cursor = self.sightings.find({'meta.person_id': _id}, {'coordinates': 1, 'time': 1}).sort('time', -1) \
+            .limit(limit or DataManager.PERSON_LOCATIONS_LIMIT)
+
+        return [{'coordinates': sighting['coordinates'], 'date': sighting['time']} for sighting in cursor][::-1]
+
+    def query_sightings(self, start=None, end=None, camera=None, center=None, radius=None, cursor=None, limit=100):
+        """
+        Queries sightings by time range, camera and distance from a point, oldest first, one page at a time.
+
+        Args:
+            start (datetime): The earliest sighting time. Defaults to None (no lower bound).
+            end (datetime): The latest sighting time. Defaults to None (no upper bound).
+            camera (str): The camera of the sightings. Defaults to None (all cameras).
+            center (tuple): The (lat, lng) of the center of the searched area. Defaults to None (anywhere).
+            radius (float): The radius of the searched area in meters, used with center.
+            cursor (str): The cursor returned with the previous page. Defaults to None (first page).
+            limit (int): The maximum number of sightings in the page, at least 1. Defaults to 100.
+
+        Returns:
+            tuple: The list of sightings and the cursor of the next page, or None if this is the last page.
+        """
+        conditions = []
+
+        time_range = {}
+        if start:
+            time_range['$gte'] = start
+        if end:
+            time_range['$lte'] = end
+        if time_range:
+            conditions.append({'time': time_range})
+
+        if camera:
+            conditions.append({'meta.camera': camera})
+
+        if center and radius:
+            lat, lng = center
+            conditions.append({'geo': {'$geoWithin': {'$centerSphere': [[lng, lat], radius / DataManager.EARTH_RADIUS_METERS]}}})
+
+        if cursor:
+            last_time, last_id = DataManager.decode_cursor(cursor)
+            conditions.append({'$or': [{'time': {'$gt': last_time}}, {'time': last_time, '_id': {'$gt': last_id}}]})
+
+        # a limit of 0 would be no limit at all for Mongo, and leave no last sighting to encode the cursor from
+        limit = max(1, limit)
+
+        query = {'$and': conditions} if conditions else {}
+        sightings = list(self.sightings.find(query).sort([('time', 1), ('_id', 1)]).limit(limit + 1))
+
+        next_cursor = None
+        if len(sightings) > limit:
+            sightings = sightings[:limit]
+            next_cursor = DataManager.encode_cursor(sightings[-1])
+
+        return sightings, next_cursor
+
+    @staticmethod
+    def encode_cursor(sighting):
+        """
+        Encodes the position of a sighting in the (time, _id) order as a URL safe cursor.
+
+        Args:
+            sighting (dict): The last sighting of a page.
+
+        Returns:
+            str: The cursor.
+        """
+        return f"{sighting['time'].strftime(DataManager.CURSOR_TIME_FORMAT)}_{sighting['_id']}"
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Decodes a cursor created by encode_cursor.
+
+        Args:
+            cursor (str): The cursor.
+
+        Returns:
+            tuple: The time and _id of the last sighting of the previous page.
+        """
+        last_time, last_id = cursor.split('_')
+        return datetime.strptime(last_time, DataManager.CURSOR_TIME_FORMAT), ObjectId(last_id)
+
+    def get_person(self, _id):
+        """
+        Retrieves the full document of a person, with its most recent sightings under 'locations'.
+
+        Args:
+            _id (ObjectId): The mongo id of the person.
+
+        Returns:
+            dict: The person's document, or None if not found.
+        """
+        person = self.collection.find_one({'_id': _id}, {'embeddings_ids': 0})
+        if person:
+            person['locations'] = self.get_person_locations(_id)
+        return person
 
     def search_person_by_id(self, id):
-        return self.db['persons'].find_one({'embeddings_ids': int(id)})
+        if (_id := self.embedding_owners.get(int(id))) is not None:
+            return self.get_person_summary(_id)
+        return None
+
+    def search_person_by_key(self, person_key):
+        if (_id := self.person_ids.get(int(person_key))) is not None:
+            return self.get_person_summary(_id)
+        return None
     
     def insert_name(self, _id, name):
+        self.person_cache.invalidate(_id)
         return self.db['persons'].update_one({'_id': _id}, {'$set': {'name': name}})
+
+    def get_person_embedding_ids(self, person_key):
+        """
+        Retrieves the embedding ids of a person.
+
+        Args:
+            person_key (int): The index_id of the person.
+
+        Returns:
+            list: The person's embedding ids.
+        """
+        return self.person_embeddings.get(int(person_key), [])
+
+    def nearest_embedding_distance(self, embedding, embedding_ids):
+        """
+        Computes the exact distance from an embedding to the closest of the given stored embeddings.
+
+        Args:
+            embedding (np.array): The feature vector.
+            embedding_ids (list): The ids of the stored embeddings to compare with.
+
+        Returns:
+            float: The smallest squared L2 distance, or None if none of the embeddings are stored.
+        """
+        vectors, _ = self.index.get_vectors(embedding_ids)
+        if not len(vectors):
+            return None
+        return float(((vectors - np.asarray(embedding, dtype=np.float32)) ** 2).sum(axis=1).min())
+
+    def is_representative(self, embedding, embedding_ids):
+        """
+        Checks if a new embedding of a person is worth storing: the person has less than
+        MAX_EMBEDDINGS_PER_PERSON embeddings and the new one is far enough from all of them.
+
+        Args:
+            embedding (np.array): The new feature vector of the person.
+            embedding_ids (list): The ids of the person's stored embeddings.
+
+        Returns:
+            bool: True if the embedding should be added to the index.
+        """
+        if len(embedding_ids) >= DataManager.MAX_EMBEDDINGS_PER_PERSON:
+            return False
+
+        distance = self.nearest_embedding_distance(embedding, embedding_ids)
+        return distance is None or distance >= DataManager.MIN_EMBEDDING_DISTANCE
+
+    def match_embeddings(self, embeddings, groups=None, k=None):
+        """
+        Matches many embeddings at once with a single index search, and aggregates the hits within the match
+        threshold per person. Every query embedding votes at most once for a person.
+
+        Args:
+            embeddings (np.array): The query embeddings, shaped (n, dim).
+            groups (np.array): The group (e.g. suspect) of every query embedding, votes are counted per group.
+                Defaults to None (all the embeddings are one group, 0).
+            k (int): The number of neighbours searched per embedding. Defaults to MATCH_NEIGHBOURS.
+
+        Returns:
+            dict: For every group with hits, a list of (person _id, votes, best distance) tuples, sorted by
+                most votes and then by smallest distance.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.index.dim)
+        if not len(embeddings):
+            return {}
+
+        groups = np.zeros(len(embeddings), dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+        distances, ids = self.index.search(embeddings, k or DataManager.MATCH_NEIGHBOURS)
+
+        rows, cols = np.nonzero((ids != -1) & (distances <= FeatureExtractor.FACENET_THRESHOLD_EUCLIDEAN))
+        if not len(rows):
+            return {}
+
+        # map the hit embedding ids to dense person indexes
+        unique_ids, inverse = np.unique(ids[rows, cols], return_inverse=True)
+        owners = [self.embedding_owners.get(int(_id)) for _id in unique_ids]
+        persons = list({owner for owner in owners if owner is not None})
+        person_indexes = {person: i for i, person in enumerate(persons)}
+        hit_persons = np.array([person_indexes.get(owner, -1) for owner in owners], dtype=np.int64)[inverse]
+
+        known = hit_persons != -1
+        rows, hit_persons, hit_distances = rows[known], hit_persons[known], distances[rows, cols][known]
+
+        # one key per (group, person) pair, a query embedding votes once even if several embeddings of the person hit
+        keys = groups[rows] * len(persons) + hit_persons
+        votes = np.bincount(np.unique(np.stack([rows, keys]), axis=1)[1])
+        best = np.full(len(votes), np.inf)
+        np.minimum.at(best, keys, hit_distances)
+
+        matches = {}
+        for key in np.flatnonzero(votes):
+            group, person = divmod(int(key), len(persons))
+            matches.setdefault(group, []).append((persons[person], int(votes[key]), float(best[key])))
+
+        for group_matches in matches.values():
+            group_matches.sort(key=lambda match: (-match[1], match[2]))
+
+        return matches
+
+    def find_match(self, embedding):
+        """
+        Matches an embedding to a known person in two stages. The person centroids are searched first, a single
+        close centroid is accepted as is, otherwise the nearby candidates are re-ranked against their own stored
+        embeddings.
+
+        Args:
+            embedding (np.array): The feature vector to match.
+
+        Returns:
+            tuple: The matched person's index_id and the distance, or None if no person is close enough.
+        """
+        threshold = FeatureExtractor.FACENET_THRESHOLD_EUCLIDEAN
+
+        distances, keys = self.centroids.search(np.expand_dims(embedding, axis=0), DataManager.CENTROID_CANDIDATES)
+        candidates = [(distance, key) for distance, key in zip(distances[0], keys[0])
+                      if key != -1 and distance <= threshold * DataManager.CENTROID_SEARCH_RADIUS]
+
+        if not candidates:
+            return None
+
+        if len(candidates) == 1 and candidates[0][0] <= threshold:
+            distance, person_key = candidates[0]
+            return int(person_key), float(distance)
+
+        best = None
+        for _, person_key in candidates:
+            distance = self.nearest_embedding_distance(embedding, self.get_person_embedding_ids(person_key))
+            if distance is None:
+                continue
+
+            if best is None or distance < best[1]:
+                best = (int(person_key), distance)
+
+        if best and best[1] <= threshold:
+            return best
+        return None
     
-    def insert(self, embedding, location, time):
+    def insert(self, embedding, location, time, camera=None, trace=None):
         """
         Inserts a feature vector and location into the database, updating existing person records or creating new ones as necessary.
         
         Args:
             vector (np.array): The feature vector of the person to insert.
             location (tuple): The location of the person to insert.
+            time (datetime): The time of the sighting.
+            camera (str): The camera the sighting comes from. Defaults to '<lat>_<lng>' of the location.
+            trace (FrameTrace): The trace of the frame, marked 'indexed' and stored on the sighting. Defaults to None.
 
+        Returns:
+            ObjectId: The mongo id of the matched or created person, or None if nothing was written.
         """
 
-        distances, ids = self.index.search(np.expand_dims(embedding, axis=0), 1)
+        match = self.find_match(embedding)
 
         new_embedding_ids = DataManager.generate_ids(1)
 
         new_embedding_id = new_embedding_ids[0]
         
-        if distances.size > 0 and distances[0][0] <= FeatureExtractor.FACENET_THRESHOLD_EUCLIDEAN:
+        if match:
+            person_key, _ = match
 
-            db_resp = self.insert_new_sighting(embedding_id=ids[0][0], new_embedding_id=new_embedding_id, location=location, time=time)
+            # the sighting is always recorded, the embedding only if it adds diversity to the person's set
+            if not self.is_representative(embedding, self.get_person_embedding_ids(person_key)):
+                new_embedding_id = None
+
+            db_resp = self.insert_new_sighting(person_key=person_key, new_embedding_id=new_embedding_id, location=location, time=time)
         else:
-            db_resp = self.insert_new_person(new_embedding_id, location, time=time)
+            person_key = int(DataManager.generate_ids(1)[0])
+            db_resp = self.insert_new_person(person_key, new_embedding_id, location, time=time)
         if db_resp.acknowledged:
-            self.index.add_embedding_to_faiss(embedding=np.array(embedding), ids=new_embedding_ids)
+            if match:
+                self.update_person_summary(self.person_ids[person_key], location, time)
+            else:
+                self.register_person(db_resp.inserted_id, person_key, [])
+
+            # the centroid is the mean of the stored embeddings only, as rebuild_centroids computes it, and is
+            # moved at most MAX_EMBEDDINGS_PER_PERSON times per person
+            if new_embedding_id is not None:
+                self.register_embedding(person_key, new_embedding_id)
+                self.index.add_embedding_to_faiss(embedding=np.array(embedding), ids=new_embedding_ids)
+                self.centroids.update(person_key, embedding)
+
+            if trace is not None:
+                trace.mark('indexed')
+
+            camera = camera or f"{location['lat']}_{location['lng']}"
+            self.sightings_writer.add(Sighting(self.person_ids[person_key], camera, location, time,
+                                               trace=trace.to_dict() if trace is not None else None).to_dict())
+
+            return self.person_ids[person_key]
+        return None
+
+    def save(self):
+        """
+        Saves the FAISS embeddings index and the person centroid index, and writes the pending sightings.
+        """
+        self.index.save_faiss()
+        self.centroids.save()
+        self.sightings_writer.flush()
 
     @staticmethod
     def generate_ids(n: int):
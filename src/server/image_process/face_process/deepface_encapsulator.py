@@ -116,6 +116,30 @@ class FeatureExtractor:
     
     def get_embedding(self, image):
         return self.represent(image)[0]['embedding']
+
+    def get_embeddings(self, images: List[np.ndarray]) -> List[List[float]]:
+        """
+        Represent several face images (already cropped, as with detector_backend "skip") in a single forward
+        pass of the model.
+
+        Args:
+            images (List[np.ndarray]): The face images in BGR format.
+
+        Returns:
+            embeddings (List[List[float]]): The embedding of every image, in the same order.
+        """
+        if not images:
+            return []
+
+        target_size = self.model.input_shape
+        batch = []
+        for img in images:
+            img = cv2.resize(img, target_size)
+            if img.max() > 1:
+                img = (img.astype(np.float32) / 255.0).astype(np.float32)
+            batch.append(preprocessing.normalize_input(img=img, normalization="base"))
+
+        return self.model.model(np.stack(batch), training=False).numpy().tolist()
     
     @staticmethod
     def find_threshold(model_name: str = 'Facenet', distance_metric: str = 'euclidean') -> float:
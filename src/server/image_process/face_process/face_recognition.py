@@ -17,3 +17,10 @@ class FaceRecognition:
         with self.lock:
             return self.model(frame)
 
+    def predict_batch(self, frames):
+        """Runs the detection on several frames in a single model call, returning one result per frame."""
+        if not frames:
+            return []
+        with self.lock:
+            return self.model(list(frames))
+
@@ -2,18 +2,25 @@ from datetime import datetime
 from uuid import uuid4
 
 class Person:
-    def __init__(self):
+    def __init__(self, index_id):
         self.id = str(uuid4())
+        self.index_id = int(index_id)
         # self.embedding = None
         self.embeddings_ids = []
-        self.locations_time = []
+        self.last_seen = None
+        self.last_location = None
+        self.sightings_count = 0
 
     def to_dict(self):
         # Convert the object to a dictionary, suitable for MongoDB.
+        # The sightings themselves are kept in the sightings collection, the person only keeps a summary.
         return {
             "id": self.id,
+            "index_id": self.index_id,
             "embeddings_ids": self.embeddings_ids,
-            "locations" : self.locations_time
+            "last_seen": self.last_seen,
+            "last_location": self.last_location,
+            "sightings_count": self.sightings_count
         }
     
     def save(self, db):
@@ -22,25 +29,34 @@ class Person:
 
 
     @classmethod
-    def create_person(cls, db, embedding_id, location, time=datetime.now()):
-        # This class method creates a person and inserts it's embedding and location_time to the db.
-        p = Person()
-        location_time = {
-            'coordinates' : location,
-            'date': time
-        }
+    def create_person(cls, db, index_id, embedding_id, location, time=datetime.now()):
+        # This class method creates a person with it's first embedding and sighting summary in the db.
+        p = Person(index_id)
         p.embeddings_ids.append(int(embedding_id))
-        p.locations_time.append(location_time)
+        p.last_seen = time
+        p.last_location = location
+        p.sightings_count = 1
 
         response = p.save(db)
 
         return response
 
     @classmethod
-    def add_sighting(cls, db, embedding_id, new_embedding_id, location, time=datetime.now()):
-        # This class method appends a embedding and location to the person.
+    def add_sighting(cls, db, index_id, new_embedding_id, location, time=datetime.now()):
+        # This class method updates the sighting summary of the person, and appends the embedding if it is stored (not None).
+        # Sightings may arrive out of order (cameras upload their spooled frames after reconnecting), so the last location
+        # is only replaced by a sighting that is not older than the last seen time. It is a single pipeline update, every
+        # expression of the $set stage sees the document as it was before the update.
+        summary = {
+            "last_location": {"$cond": [{"$lte": ["$last_seen", time]}, {"$literal": location}, "$last_location"]},
+            "last_seen": {"$max": ["$last_seen", time]},
+            "sightings_count": {"$add": [{"$ifNull": ["$sightings_count", 0]}, 1]}
+        }
+        if new_embedding_id is not None:
+            summary["embeddings_ids"] = {"$concatArrays": [{"$ifNull": ["$embeddings_ids", []]}, [int(new_embedding_id)]]}
+
         response = db['persons'].update_one(
-            {"embeddings_ids": int(embedding_id)},
-            {"$push": {"locations" : {'coordinates' : location, 'date': time}, "embeddings_ids" : int(new_embedding_id)}}
+            {"index_id": int(index_id)},
+            [{"$set": summary}]
         )
-        return response
\ No newline at end of file
+        return response
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+class Sighting:
+    def __init__(self, person_id, camera, location, time, trace=None):
+        self.person_id = person_id
+        self.camera = camera
+        self.location = location
+        self.time = time
+        self.trace = trace
+
+    def to_dict(self):
+        # Convert the object to a dictionary, suitable for the sightings time-series collection.
+        sighting = {
+            "time": self.time,
+            "meta": {
+                "person_id": self.person_id,
+                "camera": self.camera
+            },
+            "coordinates": self.location,
+            "geo": self.to_geojson()
+        }
+        # the id and latencies of the frame's trace, from its capture to this sighting being indexed
+        if self.trace is not None:
+            sighting["trace"] = self.trace
+        return sighting
+
+    def to_geojson(self):
+        # Convert the location to a GeoJSON point for the 2dsphere index, None if it has no valid coordinates.
+        try:
+            return {"type": "Point", "coordinates": [float(self.location['lng']), float(self.location['lat'])]}
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @classmethod
+    def from_location_time(cls, person_id, location_time):
+        # This class method converts a location_time entry of the legacy persons 'locations' array to a sighting.
+        coordinates = location_time.get('coordinates') or {}
+        camera = f"{coordinates.get('lat')}_{coordinates.get('lng')}"
+        return Sighting(person_id, camera, coordinates, location_time.get('date', datetime.now()))
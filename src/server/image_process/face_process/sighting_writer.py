@@ -0,0 +1,89 @@
+"""
+This module defines a SightingWriter class that writes sightings to the sightings time-series collection
+with bulk inserts.
+
+Imports:
+    - threading: Allows for the creation and management of threads.
+    - traceback: Provides methods for extracting, formatting, and printing stack traces.
+    - src.core.metrics: Custom module for the in-process metrics.
+"""
+
+import threading
+import traceback
+
+from src.core import metrics
+
+MONGO_WRITE_SECONDS = metrics.histogram('mongo_write_seconds', 'Time spent writing to MongoDB, by operation', ['operation'])
+SIGHTINGS_WRITTEN = metrics.counter('sightings_written_total', 'Sightings written to the sightings collection')
+
+class SightingWriter:
+    """
+    A class that buffers sightings and writes them with a single `insert_many`, when BATCH_SIZE sightings are
+    pending or every FLUSH_INTERVAL seconds.
+    """
+    BATCH_SIZE = 256
+    FLUSH_INTERVAL = 1
+
+    def __init__(self, collection) -> None:
+        """
+        Initializes the SightingWriter and starts its flushing thread.
+
+        Args:
+            collection (pymongo.collection.Collection): The sightings collection.
+        """
+        self.collection = collection
+        self.pending = []
+        self.lock = threading.Lock()
+        self.flush_event = threading.Event()
+        self.is_running = True
+
+        self.flush_thread = threading.Thread(target=self.run, name='sighting_writer', daemon=True)
+        self.flush_thread.start()
+
+    def add(self, sighting):
+        """
+        Queues a sighting to be written.
+
+        Args:
+            sighting (dict): The sighting document.
+        """
+        with self.lock:
+            self.pending.append(sighting)
+            is_full = len(self.pending) >= SightingWriter.BATCH_SIZE
+
+        if is_full:
+            self.flush_event.set()
+
+    def flush(self):
+        """
+        Writes all the pending sightings.
+        """
+        with self.lock:
+            batch, self.pending = self.pending, []
+
+        if batch:
+            try:
+                with MONGO_WRITE_SECONDS.time(operation='insert_sightings'):
+                    self.collection.insert_many(batch, ordered=False)
+                SIGHTINGS_WRITTEN.inc(len(batch))
+            except Exception as e:
+                print(e)
+                traceback.print_exc()
+
+    def run(self):
+        """
+        Continuously flushes the pending sightings.
+        """
+        while self.is_running:
+            self.flush_event.wait(SightingWriter.FLUSH_INTERVAL)
+            self.flush_event.clear()
+            self.flush()
+
+    def stop(self):
+        """
+        Stops the flushing thread and writes the remaining sightings.
+        """
+        self.is_running = False
+        self.flush_event.set()
+        self.flush_thread.join()
+        self.flush()
@@ -0,0 +1,229 @@
+"""
+This module defines a RawVectorStore class that keeps the exact float32 embeddings next to the FAISS index,
+in memory-mapped `.npy` sidecar files.
+
+Imports:
+    - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
+    - numpy.lib.format.open_memmap: Creates memory-mapped `.npy` files.
+    - os: Provides a way of using operating system-dependent functionality.
+"""
+
+import numpy as np
+from numpy.lib.format import open_memmap
+import os
+
+class RawVectorStore:
+    """
+    An append-only store of raw embeddings and their ids, backed by two memory-mapped `.npy` files
+    (`<path>.vectors.npy` and `<path>.ids.npy`). The files are preallocated and doubled when full,
+    unused rows are marked with EMPTY_ID.
+
+    The store is not thread safe on its own, callers are expected to hold their own lock.
+    """
+    EMPTY_ID = np.iinfo(np.int64).min
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, path, dim=128) -> None:
+        """
+        Initializes the RawVectorStore, opening the sidecar files or creating them if they don't exist.
+
+        Args:
+            path (str): The base path of the sidecar files, usually the FAISS index path.
+            dim (int): The dimension of the stored vectors. Defaults to 128.
+        """
+        self.vectors_path = f'{path}.vectors.npy'
+        self.ids_path = f'{path}.ids.npy'
+        self.dim = dim
+
+        self.vectors, self.ids = self.open()
+        self.size = self.count_rows()
+        self.rows = {int(_id): row for row, _id in enumerate(self.ids[:self.size])}
+
+    def __len__(self):
+        return self.size
+
+    def open(self):
+        """
+        Opens the memory-mapped sidecar files, creating them with the initial capacity if they are missing.
+
+        Returns:
+            tuple: The vectors memmap and the ids memmap.
+        """
+        if os.path.isfile(self.vectors_path) and os.path.isfile(self.ids_path):
+            return np.load(self.vectors_path, mmap_mode='r+'), np.load(self.ids_path, mmap_mode='r+')
+
+        return self.allocate(self.vectors_path, self.ids_path, RawVectorStore.INITIAL_CAPACITY)
+
+    def allocate(self, vectors_path, ids_path, capacity):
+        """
+        Creates new sidecar files with the given capacity.
+
+        Args:
+            vectors_path (str): The path of the vectors file.
+            ids_path (str): The path of the ids file.
+            capacity (int): The number of rows to preallocate.
+
+        Returns:
+            tuple: The vectors memmap and the ids memmap.
+        """
+        os.makedirs(os.path.dirname(vectors_path) or '.', exist_ok=True)
+
+        vectors = open_memmap(vectors_path, mode='w+', dtype=np.float32, shape=(capacity, self.dim))
+        ids = open_memmap(ids_path, mode='w+', dtype=np.int64, shape=(capacity,))
+        ids[:] = RawVectorStore.EMPTY_ID
+
+        return vectors, ids
+
+    def count_rows(self):
+        """
+        Counts the used rows, which are always the leading rows of the files.
+
+        Returns:
+            int: The number of stored vectors.
+        """
+        empty = np.flatnonzero(self.ids == RawVectorStore.EMPTY_ID)
+        return int(empty[0]) if empty.size else len(self.ids)
+
+    def grow(self, required):
+        """
+        Doubles the capacity of the sidecar files until `required` rows fit, copying the stored rows.
+
+        Args:
+            required (int): The number of rows the files must be able to hold.
+        """
+        capacity = len(self.ids)
+        while capacity < required:
+            capacity *= 2
+
+        vectors, ids = self.allocate(f'{self.vectors_path}.tmp', f'{self.ids_path}.tmp', capacity)
+        vectors[:self.size] = self.vectors[:self.size]
+        ids[:self.size] = self.ids[:self.size]
+
+        for memmap in (vectors, ids, self.vectors, self.ids):
+            memmap.flush()
+            memmap._mmap.close()
+
+        # the old maps must be closed before replacing the files (required on windows)
+        os.replace(f'{self.vectors_path}.tmp', self.vectors_path)
+        os.replace(f'{self.ids_path}.tmp', self.ids_path)
+
+        self.vectors, self.ids = self.open()
+
+    def add(self, vectors, ids):
+        """
+        Appends vectors with their ids to the store.
+
+        Args:
+            vectors (np.array): The vectors to store, shaped (n, dim).
+            ids (np.array.int64): The ids of the vectors.
+        """
+        n = len(ids)
+        if self.size + n > len(self.ids):
+            self.grow(self.size + n)
+
+        self.vectors[self.size:self.size + n] = vectors
+        self.ids[self.size:self.size + n] = ids
+
+        for offset, _id in enumerate(ids):
+            self.rows[int(_id)] = self.size + offset
+
+        self.size += n
+
+    def get(self, ids):
+        """
+        Retrieves the stored vectors of the given ids.
+
+        Args:
+            ids (iterable): The ids to look up.
+
+        Returns:
+            tuple: The found vectors shaped (m, dim) and their ids, unknown ids are skipped.
+        """
+        found = [(int(_id), self.rows[int(_id)]) for _id in ids if int(_id) in self.rows]
+
+        if not found:
+            return np.empty((0, self.dim), dtype=np.float32), np.empty((0,), dtype=np.int64)
+
+        found_ids, rows = zip(*found)
+        return self.vectors[list(rows)], np.array(found_ids, dtype=np.int64)
+
+    def all(self):
+        """
+        Returns all the stored vectors and their ids.
+
+        Returns:
+            tuple: The vectors shaped (n, dim) and their ids.
+        """
+        return self.vectors[:self.size], self.ids[:self.size]
+
+    @staticmethod
+    def top_k(queries, vectors, ids, k):
+        """
+        Computes exact squared L2 distances (the metric of faiss.IndexFlatL2) and keeps the k closest vectors
+        for every query, padding with (FLT_MAX, -1) like FAISS does.
+
+        Args:
+            queries (np.array): The query vectors shaped (nq, dim).
+            vectors (np.array): The candidate vectors shaped (n, dim).
+            ids (np.array.int64): The ids of the candidate vectors.
+            k (int): The number of neighbours to return.
+
+        Returns:
+            tuple: The distances and ids arrays, both shaped (nq, k).
+        """
+        distances = np.full((len(queries), k), np.finfo(np.float32).max, dtype=np.float32)
+        result_ids = np.full((len(queries), k), -1, dtype=np.int64)
+
+        if len(vectors) == 0:
+            return distances, result_ids
+
+        all_distances = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+        order = np.argsort(all_distances, axis=1)[:, :k]
+
+        n = order.shape[1]
+        distances[:, :n] = np.take_along_axis(all_distances, order, axis=1)
+        result_ids[:, :n] = ids[order]
+
+        return distances, result_ids
+
+    def search(self, queries, k):
+        """
+        Exhaustively searches the store, used while a compressed index is still untrained.
+
+        Args:
+            queries (np.array): The query vectors shaped (nq, dim).
+            k (int): The number of neighbours to return.
+
+        Returns:
+            tuple: The distances and ids arrays, both shaped (nq, k).
+        """
+        vectors, ids = self.all()
+        return RawVectorStore.top_k(queries, np.asarray(vectors), np.asarray(ids), k)
+
+    def rerank(self, queries, candidate_ids, k):
+        """
+        Re-ranks approximate FAISS candidates with the exact stored vectors.
+
+        Args:
+            queries (np.array): The query vectors shaped (nq, dim).
+            candidate_ids (np.array.int64): The candidate ids returned by FAISS, shaped (nq, k').
+            k (int): The number of neighbours to return.
+
+        Returns:
+            tuple: The distances and ids arrays, both shaped (nq, k).
+        """
+        distances = np.full((len(queries), k), np.finfo(np.float32).max, dtype=np.float32)
+        result_ids = np.full((len(queries), k), -1, dtype=np.int64)
+
+        for i, (query, candidates) in enumerate(zip(queries, candidate_ids)):
+            vectors, ids = self.get(candidates[candidates != -1])
+            distances[i], result_ids[i] = (arr[0] for arr in RawVectorStore.top_k(query[None, :], vectors, ids, k))
+
+        return distances, result_ids
+
+    def flush(self):
+        """
+        Flushes the memory-mapped files to disk.
+        """
+        self.vectors.flush()
+        self.ids.flush()
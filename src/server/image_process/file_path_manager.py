@@ -0,0 +1,256 @@
+"""
+This module defines a FilePathManager class, the per camera queues of the frame files waiting to be processed,
+served round-robin between the cameras and shed when a camera's queue is full.
+
+Imports:
+    - os: Provides a way of using operating system-dependent functionality.
+    - threading: Allows for the creation and management of threads.
+    - time: Provides time-related functions.
+    - datetime: Supplies classes for manipulating dates and times.
+    - collections.deque: Provides a double-ended queue implementation.
+    - src.core.thread_safe_set.ThreadSafeSet: Custom thread-safe set implementation.
+    - src.core.frame_trace.FrameTrace, FRAMES_DROPPED: Custom module to trace the frames through the pipeline.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from collections import deque
+
+from src.core.thread_safe_set import ThreadSafeSet
+from src.core.frame_trace import FrameTrace, FRAMES_DROPPED
+
+class FilePathManager:
+    """
+    A class to manage file paths, including adding, removing, and retrieving file paths in a thread-safe manner.
+
+    Every camera (location) has its own bounded queue and the cameras are served round-robin, a camera with a
+    weight of n getting up to n frames per turn. When a camera's queue is full, frames are shed according to
+    the shedding policy:
+        - 'newest': the oldest queued frame is dropped to make room for the new one.
+        - 'sample': only every `sample_every`-th new frame is admitted (dropping the oldest queued frame),
+          the others are dropped.
+    Dropped frames are deleted from disk and counted per camera, and by source (live or replayed, from the
+    frame's trace) in the dropped frames metric.
+    """
+    SHED_POLICIES = ('newest', 'sample')
+
+    def __init__(self, capacity=50, shed_policy='newest', sample_every=2) -> None:
+        """
+        Initializes the FilePathManager with the per camera queues and a thread-safe set.
+
+        Args:
+            capacity (int): The maximum number of queued frames per camera. Defaults to 50.
+            shed_policy (str): The shedding policy, 'newest' or 'sample'. Defaults to 'newest'.
+            sample_every (int): The sampling period of the 'sample' policy. Defaults to 2.
+        """
+        if shed_policy not in FilePathManager.SHED_POLICIES:
+            raise ValueError(f'Unknown shed policy {shed_policy}')
+
+        self.capacity = capacity
+        self.shed_policy = shed_policy
+        self.sample_every = max(1, sample_every)
+
+        self.queues = {}          # location -> deque of file paths
+        self.turns = deque()      # locations with queued frames, in round-robin order
+        self.served = 0           # frames served to the location at the head of turns in its current turn
+        self.weights = {}
+        self.overflows = {}       # location -> frames received while its queue was full
+        self.shed_counts = {}
+        self.processed_counts = {}
+        self.taken_counts = {}
+        self.queued_at = {}       # file path -> time it was queued
+        self.set = ThreadSafeSet()
+        self.lock = threading.Lock()
+
+    def __contains__(self, file_path):
+        """
+        Checks if the file path is in the set.
+
+        Args:
+            file_path (str): The file path to check.
+
+        Returns:
+            bool: True if the file path is in the set, False otherwise.
+        """
+        return file_path in self.set
+
+    def set_weight(self, location, weight):
+        """
+        Sets the number of frames a camera is served per round-robin turn.
+
+        Args:
+            location (str): The location of the camera.
+            weight (int): The weight of the camera.
+        """
+        with self.lock:
+            self.weights[location] = max(1, int(weight))
+
+    def shed(self, location, file_path):
+        """
+        Drops a frame, deleting its file. Must be called with the lock held.
+
+        Args:
+            location (str): The location of the file.
+            file_path (str): The file path to drop.
+        """
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            print(e)
+        self.set.remove(file_path)
+        self.queued_at.pop(file_path, None)
+        self.shed_counts[location] = self.shed_counts.get(location, 0) + 1
+
+        trace = FrameTrace.from_filename(file_path)
+        FRAMES_DROPPED.inc(camera=location, source=trace.source if trace else 'live')
+
+    def add(self, location, file_path):
+        """
+        Adds a file path to its camera's queue and to the set, shedding frames if the queue is full.
+
+        Args:
+            location (str): The location of the file.
+            file_path (str): The file path to add.
+        """
+        with self.lock:
+            self.set.add(file_path)
+            queue = self.queues.setdefault(location, deque())
+
+            if len(queue) >= self.capacity:
+                self.overflows[location] = self.overflows.get(location, 0) + 1
+
+                if self.shed_policy == 'sample' and self.overflows[location] % self.sample_every:
+                    self.shed(location, file_path)
+                    return
+                self.shed(location, queue.popleft())
+            else:
+                self.overflows[location] = 0
+
+            if not queue:
+                self.turns.append(location)
+            queue.append(file_path)
+            self.queued_at[file_path] = time.time()
+
+    def remove(self, location, file_path):
+        """
+        Removes a processed file path from the disk and the set.
+
+        Args:
+            location (str): The location of the file.
+            file_path (str): The file path to remove.
+        """
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            print(e)
+        with self.lock:
+            self.set.remove(file_path)
+            self.processed_counts[location] = self.processed_counts.get(location, 0) + 1
+
+    def get(self):
+        """
+        Takes the next file path to process, in round-robin order between the cameras. The file path stays in
+        the set until it is removed.
+
+        Returns:
+            tuple: The location, the file path and the time it was queued, or None if all the queues are empty.
+        """
+        with self.lock:
+            if not self.turns:
+                return None
+
+            location = self.turns[0]
+            queue = self.queues[location]
+            file_path = queue.popleft()
+            self.served += 1
+            self.taken_counts[location] = self.taken_counts.get(location, 0) + 1
+
+            if not queue or self.served >= self.weights.get(location, 1):
+                self.turns.popleft()
+                if queue:
+                    self.turns.append(location)
+                self.served = 0
+
+            return (location, file_path, self.queued_at.pop(file_path, None))
+
+    def is_full(self, location):
+        """
+        Checks if a camera's queue is full.
+
+        Args:
+            location (str): The location of the camera.
+
+        Returns:
+            bool: True if the camera's queue is full.
+        """
+        with self.lock:
+            return len(self.queues.get(location, ())) >= self.capacity
+
+    def get_load(self, location):
+        """
+        Gets the load of a camera's queue.
+
+        Args:
+            location (str): The location of the camera.
+
+        Returns:
+            tuple: The number of queued frames and the total number of frames taken from the queue.
+        """
+        with self.lock:
+            return len(self.queues.get(location, ())), self.taken_counts.get(location, 0)
+
+    def get_lag(self, location):
+        """
+        Gets how far behind the processing of a camera's frames is.
+
+        Args:
+            location (str): The location of the camera.
+
+        Returns:
+            float: The age in seconds of the camera's oldest queued frame, 0 if none is queued.
+        """
+        with self.lock:
+            queue = self.queues.get(location)
+            oldest = queue[0] if queue else None
+
+        if oldest is None:
+            return 0
+        return max(0, (datetime.now() - FilePathManager.extract_datetime_from_filename(oldest)).total_seconds())
+
+    def get_stats(self):
+        """
+        Reports the queue depth, processed and shed frames of every camera.
+
+        Returns:
+            dict: Per location, its 'queued', 'processed' and 'shed' counts and its 'weight'.
+        """
+        with self.lock:
+            return {
+                location: {
+                    'queued': len(queue),
+                    'processed': self.processed_counts.get(location, 0),
+                    'shed': self.shed_counts.get(location, 0),
+                    'weight': self.weights.get(location, 1)
+                }
+                for location, queue in self.queues.items()
+            }
+
+    @staticmethod
+    def extract_datetime_from_filename(filename):
+        """
+        Extracts the datetime object from a filename formatted with a trailing datetime stamp
+        after the last dash '-' and before the '.jpg' extension.
+
+        Args:
+            filename (str): A string representing the filename with format 'uuid-datetime.jpg'
+
+        Returns:
+            datetime: A datetime object representing the datetime extracted from the filename
+        """
+        parts = filename.split('-')
+        datetime_part = parts[-1]
+        datetime_without_extension = datetime_part.split('.')[0]
+        datetime_object = datetime.strptime(datetime_without_extension, '%Y%m%d_%H%M%S')
+        return datetime_object
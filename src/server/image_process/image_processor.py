@@ -5,7 +5,6 @@ Imports:
     - cv2: OpenCV library for computer vision tasks.
     - os: Provides a way of using operating system-dependent functionality.
     - threading: Allows for the creation and management of threads.
-    - datetime: Supplies classes for manipulating dates and times.
     - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
     - traceback: Provides methods for extracting, formatting, and printing stack traces.
     - time: Provides time-related functions.
@@ -13,15 +12,17 @@ Imports:
     - .face_process.face_recognition.FaceRecognition: Custom module for face recognition.
     - .face_process.data_manager.DataManager: Custom module to manage face data.
     - .face_process.deepface_encapsulator.FeatureExtractor: Custom module to extract features from faces.
-    - src.core.thread_safe_set.ThreadSafeSet: Custom thread-safe set implementation.
-    - collections.deque: Provides a double-ended queue implementation.
-    - queue.Queue, queue.Empty: Queue module provides a FIFO implementation.
+    - .face_process.blacklist_index.BlacklistIndex: Custom module to match faces against the blacklist.
+    - .inference_scheduler.InferenceScheduler: Custom module to run the model calls by priority.
+    - .pipeline.Stage: Custom module for the bounded stages of the processing pipeline.
+    - .file_path_manager.FilePathManager: Custom module for the per camera queues of the frames to process.
+    - src.core.metrics: Custom module for the in-process metrics.
+    - src.core.frame_trace.FrameTrace, TraceRecorder: Custom module to trace the frames through the pipeline.
 """
 
 import cv2
 import os
 import threading
-from datetime import datetime
 import numpy as np
 import traceback
 import time
@@ -30,105 +31,26 @@ from .config import settings
 from .face_process.face_recognition import FaceRecognition
 from .face_process.data_manager import DataManager
 from .face_process.deepface_encapsulator import FeatureExtractor
-from src.core.thread_safe_set import ThreadSafeSet
-from collections import deque
-from queue import Queue, Empty
+from .face_process.blacklist_index import BlacklistIndex
+from .inference_scheduler import InferenceScheduler
+from .pipeline import Stage
+from .file_path_manager import FilePathManager
+from src.core import metrics
+from src.core.frame_trace import FrameTrace, TraceRecorder
 
-class FilePathManager:
-    """
-    A class to manage file paths, including adding, removing, and retrieving file paths in a thread-safe manner.
-    """
-    
-    def __init__(self) -> None:
-        """
-        Initializes the FilePathManager with a deque and a thread-safe set.
-        """
-        self.dq = deque()
-        self.set = ThreadSafeSet()
-        self.lock = threading.Lock()
-
-    def __contains__(self, file_path):
-        """
-        Checks if the file path is in the set.
-
-        Args:
-            file_path (str): The file path to check.
-
-        Returns:
-            bool: True if the file path is in the set, False otherwise.
-        """
-        return file_path in self.set
-
-    def add(self, location, file_path):
-        """
-        Adds a file path to the deque and set.
-
-        Args:
-            location (str): The location of the file.
-            file_path (str): The file path to add.
-        """
-        with self.lock:
-            self.dq.append((location, file_path))
-            self.set.add(file_path)
-
-    def remove(self, location, file_path):
-        """
-        Removes a file path from the deque and set.
-
-        Args:
-            location (str): The location of the file.
-            file_path (str): The file path to remove.
-        """
-        os.remove(file_path)
-        with self.lock:
-            self.dq.remove((location, file_path))
-            self.set.remove(file_path)
-
-    def get(self):
-        """
-        Retrieves the first file path from the deque.
-
-        Returns:
-            tuple: The first file path in the deque, or None if the deque is empty.
-        """
-        if not self.set.is_empty():
-            return self.dq[0]
-        return None
-    
-    def pop(self):
-        """
-        Removes and returns the last file path from the deque.
-
-        Returns:
-            tuple: The last file path in the deque.
-        """
-        with self.lock:
-            loc, file_path = self.dq.pop()
-            self.set.remove(file_path)
-        return (loc, file_path)
-    
-    @staticmethod
-    def extract_datetime_from_filename(filename):
-        """
-        Extracts the datetime object from a filename formatted with a trailing datetime stamp
-        after the last dash '-' and before the '.jpg' extension.
-
-        Args:
-            filename (str): A string representing the filename with format 'uuid-datetime.jpg'
-
-        Returns:
-            datetime: A datetime object representing the datetime extracted from the filename
-        """
-        parts = filename.split('-')
-        datetime_part = parts[-1]
-        datetime_without_extension = datetime_part.split('.')[0]
-        datetime_object = datetime.strptime(datetime_without_extension, '%Y%m%d_%H%M%S')
-        return datetime_object
+FRAMES_PROCESSED = metrics.counter('frames_processed_total', 'Frames run through face detection', ['camera'])
+FACES_DETECTED = metrics.counter('faces_detected_total', 'Faces detected in the processed frames', ['camera'])
 
 class ImageProcessor:
     """
     A class to process images, including face detection, feature extraction, and matching suspects to known individuals.
     """
+    # minimum number of seconds between two alerts about the same blacklisted suspect
+    BLACKLIST_ALERT_INTERVAL = 5
+    # number of candidate persons returned when searching a suspect
+    SUSPECT_CANDIDATES = 5
+    # upper bound of the frames a camera is allowed to send per second
+    MAX_CREDITS_PER_SECOND = 10
 
     def __init__(self):
         """
@@ -136,20 +58,47 @@ class ImageProcessor:
         and feature extraction.
         """
         self.face_model = FaceRecognition()
-        self.data_manager = DataManager(mongodb_url=settings.MONGODB_URL, index_path=settings.FAISS_PATH)
+        self.data_manager = DataManager(mongodb_url=settings.MONGODB_URL, index_path=settings.FAISS_PATH,
+                                        index_storage=settings.FAISS_STORAGE, rerank=settings.FAISS_RERANK)
         self.feature_extractor = FeatureExtractor('Facenet')
+        # every model call goes through the scheduler, interactive requests before the camera ingest
+        self.scheduler = InferenceScheduler()
         self.folder_path = settings.ROOT_PATH_IMAGES
 
-        self.file_paths = FilePathManager()
-        self.faces_queue = Queue()
+        self.file_paths = FilePathManager(capacity=settings.CAMERA_QUEUE_SIZE, shed_policy=settings.SHED_POLICY,
+                                          sample_every=settings.SHED_SAMPLE_EVERY)
+
+        # detect -> crop -> embed -> store, every stage has a bounded queue so a slow stage holds back the ones
+        # before it, and eventually the per camera queues, where the frames are shed
+        store_stage = Stage('store', self.store_face, settings.STAGE_QUEUE_SIZE)
+        embed_stage = Stage('embed', self.embed_face, settings.STAGE_QUEUE_SIZE, next_stage=store_stage)
+        crop_stage = Stage('crop', self.crop_faces, settings.STAGE_QUEUE_SIZE, next_stage=embed_stage)
+        detect_stage = Stage('detect', self.detect_faces, settings.STAGE_QUEUE_SIZE, next_stage=crop_stage)
+        self.stages = [detect_stage, crop_stage, embed_stage, store_stage]
+
+        # frames taken from every camera's queue when its credits were last computed
+        self.taken_counts = {}
+
+        # capture to indexed latency of the recent faces
+        self.traces = TraceRecorder(slow_threshold=settings.SLOW_FRAME_SECONDS)
 
-        self.images_finder_thread = threading.Thread(target=self.find_images, daemon=True)
-        self.process_images_thread = threading.Thread(target=self.process_images)
-        self.process_faces_thread = threading.Thread(target=self.process_faces)
+        self.blacklist_index = BlacklistIndex()
+        self.blacklist_listeners = []
+        self.last_alerts = {}
+
+        self.images_finder_thread = threading.Thread(target=self.find_images, name='find_images', daemon=True)
+        self.process_images_thread = threading.Thread(target=self.process_images, name='process_images')
 
         self.conf_threshold = 0.25
         self.is_running = True
 
+        metrics.gauge('pipeline_stage_depth', 'Items queued in a pipeline stage', ['stage'],
+                      collect=lambda: {(stage.name,): len(stage) for stage in self.stages})
+        metrics.gauge('camera_queue_depth', 'Frames queued for processing, by camera', ['camera'],
+                      collect=lambda: {(location,): stats['queued'] for location, stats in self.file_paths.get_stats().items()})
+        metrics.gauge('camera_lag_seconds', 'Age of the oldest queued frame, by camera', ['camera'],
+                      collect=lambda: {(location,): self.file_paths.get_lag(location) for location in self.file_paths.get_stats()})
+
     def find_images(self):
         """
         Continuously searches for new images in the specified folder path.
@@ -185,88 +134,211 @@ class ImageProcessor:
                 pred_data.append((top_left, bottom_right, conf))
         return pred_data
 
-    def process_image_path(self, location, file_path):
+    def detect_faces(self, item):
         """
-        Processes an image from the specified file path, detects faces, and puts them in the faces queue.
+        Detection stage: reads and decodes an image file, removes it and detects the faces in it.
 
         Args:
-            location (str): The location of the image.
-            file_path (str): The file path of the image.
+            item (tuple): The location, the file path and the trace of the image.
+
+        Returns:
+            list: The (location, datetime, image, prediction data, trace) of the image, empty if it could not be read.
         """
-        with open(file_path, 'rb') as f:
-            content = f.read()
-            image_data = np.frombuffer(content, dtype=np.uint8)
+        location, file_path, trace = item
+        try:
+            with open(file_path, 'rb') as f:
+                image = cv2.imdecode(np.frombuffer(f.read(), dtype=np.uint8), cv2.IMREAD_COLOR)
+            # the camera's capture time is more precise than the file name's, which is to the second
+            image_datetime = trace.captured_datetime() or FilePathManager.extract_datetime_from_filename(file_path)
+        finally:
+            self.file_paths.remove(location=location, file_path=file_path)
 
-            try:
-                image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-            except Exception as e:
-                print(e)
-                return
-                
-        results = self.face_model.predict(image)
+        if image is None:
+            return []
+
+        results = self.scheduler.run(InferenceScheduler.BULK, self.face_model.predict, image)
         pred_data = self.get_prediction_data(results[0].boxes)
-        image_datetime = FilePathManager.extract_datetime_from_filename(file_path)
-        
+        trace.mark('detected')
+
+        FRAMES_PROCESSED.inc(camera=location)
+        FACES_DETECTED.inc(len(pred_data), camera=location)
+        return [(location, image_datetime, image, pred_data, trace)]
+
+    def crop_faces(self, item):
+        """
+        Crop stage: crops the detected faces out of an image.
+
+        Args:
+            item (tuple): The location, datetime, image, prediction data and trace.
+
+        Yields:
+            tuple: The location, datetime, cropped face and trace of every detected face.
+        """
+        location, image_datetime, image, pred_data, trace = item
         for top_left, bottom_right, _ in pred_data:
-            cropped_face = image[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]]
-            self.faces_queue.put((location, image_datetime, cropped_face))
+            yield (location, image_datetime, image[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]], trace.fork())
+
+    def embed_face(self, item):
+        """
+        Embedding stage: extracts the embedding of a cropped face.
+
+        Args:
+            item (tuple): The location, datetime, cropped face and trace.
+
+        Returns:
+            list: The location, datetime, embedding and trace of the face.
+        """
+        location, image_datetime, face_frame, trace = item
+        embedding = self.scheduler.run(InferenceScheduler.BULK, self.feature_extractor.get_embedding, face_frame)
+        trace.mark('embedded')
+        return [(location, image_datetime, embedding, trace)]
+
+    def store_face(self, item):
+        """
+        Store stage: stores the embedding as a sighting, records its trace and checks it against the blacklist.
+
+        Args:
+            item (tuple): The location, datetime, embedding and trace of a face.
+        """
+        location, image_datetime, embedding, trace = item
+
+        camera = location
+        lat, lng = location.split('_')
+        location = {'lat': lat, 'lng': lng}
+
+        person_id = self.data_manager.insert(embedding=embedding, location=location, time=image_datetime, camera=camera, trace=trace)
+        if person_id is not None:
+            self.traces.record(trace, camera)
+        self.check_blacklist(embedding, person_id, location, image_datetime)
 
     def process_images(self):
         """
-        Continuously processes images from the file paths manager.
+        Continuously feeds the images from the file paths manager to the detection stage. Blocks while the
+        pipeline is full, so the frames wait (and are shed) in the per camera queues.
         """
         while self.is_running:
             try:
                 data = self.file_paths.get()
 
                 if data:
-                    location, file_path = data
-                    self.process_image_path(location=location, file_path=file_path)
-                    self.file_paths.remove(location=location, file_path=file_path)
+                    location, file_path, queued_at = data
+
+                    # frames written without a trace (by an older camera server) get a new one here
+                    trace = FrameTrace.from_filename(file_path) or FrameTrace()
+                    if queued_at is not None:
+                        trace.mark('queued', queued_at)
+                    trace.mark('dequeued')
+
+                    self.stages[0].put((location, file_path, trace))
                 else:
                     time.sleep(1)
             except Exception as e:
                 print(e)
                 traceback.print_exc()
 
-    def process_faces(self):
+    def is_under_pressure(self, location):
+        """
+        Checks whether new frames of a camera would only be shed, because its queue is full.
+
+        Args:
+            location (str): The location of the camera.
+
+        Returns:
+            bool: True if the camera should hold back its frames.
         """
-        Continuously processes faces from the faces queue, extracting embeddings and storing them.
+        return self.file_paths.is_full(location)
+
+    def get_credits(self, location, interval):
         """
-        while self.is_running:
+        Computes the number of frames a camera may send in the next interval: as many as were taken from its
+        queue in the last interval, plus half of its queue's free room. A camera whose frames are not being
+        processed gets no credits until its queue drains.
+
+        Args:
+            location (str): The location of the camera.
+            interval (float): The credit interval in seconds.
+
+        Returns:
+            tuple: The credits, the pressure of the camera's queue, from 0 (empty) to 1 (full), and the processing
+                lag of the camera in seconds.
+        """
+        queued, taken = self.file_paths.get_load(location)
+        taken_last_interval = taken - self.taken_counts.get(location, taken)
+        self.taken_counts[location] = taken
+
+        # the pipeline itself is full, the camera's queue will not drain any faster
+        free = self.file_paths.capacity - queued
+        if self.stages[0].saturated:
+            free //= 2
+
+        credits = min(ImageProcessor.MAX_CREDITS_PER_SECOND * interval, taken_last_interval + free // 2)
+        return credits, queued / self.file_paths.capacity, self.file_paths.get_lag(location)
+
+    def get_pipeline_stats(self):
+        """
+        Reports the statistics of every pipeline stage.
+
+        Returns:
+            dict: The stats of every stage by name, in pipeline order.
+        """
+        return {stage.name: stage.get_stats() for stage in self.stages}
+
+    def check_blacklist(self, embedding, person_id, location, image_datetime):
+        """
+        Checks a newly processed face against the blacklisted suspects, and notifies the blacklist listeners
+        on a hit. A suspect is reported at most once every BLACKLIST_ALERT_INTERVAL seconds.
+
+        The alert only holds the suspect, the person's id and the sighting, it is sent from the store stage and
+        fetching the person's sightings here would stall the pipeline. Clients fetch the details with /getPerson.
+
+        Args:
+            embedding (numpy.ndarray): The embedding of the face.
+            person_id (ObjectId): The mongo id of the person the face was stored as.
+            location (dict): The location of the sighting.
+            image_datetime (datetime): The time of the sighting.
+        """
+        hit = self.blacklist_index.match(embedding)
+        if not hit or person_id is None:
+            return
+
+        now = time.time()
+        if now - self.last_alerts.get(hit['suspectId'], 0) < ImageProcessor.BLACKLIST_ALERT_INTERVAL:
+            return
+        self.last_alerts[hit['suspectId']] = now
+
+        summary = self.data_manager.get_person_summary(person_id)
+        if summary and summary.get('name') != hit['suspectName']:
+            self.data_manager.insert_name(_id=person_id, name=hit['suspectName'])
+
+        alert = {**hit, 'personId': person_id, 'location': location, 'time': image_datetime,
+                 'lastSeen': summary.get('last_seen') if summary else image_datetime}
+        for listener in self.blacklist_listeners:
             try:
-                location, image_datetime, face_frame = self.faces_queue.get(timeout=5)
-
-                lat, lng = location.split('_')
-                location = {'lat': lat, 'lng': lng}
-
-                embedding = self.feature_extractor.get_embedding(face_frame)
-                try:
-                    self.data_manager.insert(embedding=embedding, location=location, time=image_datetime)
-                except Exception as e:
-                    print(e)
-                    traceback.print_exc()
-            except Empty as e:
+                listener(alert)
+            except Exception as e:
                 print(e)
+                traceback.print_exc()
 
-    def get_embeddings(self, images):
+    def get_embeddings(self, images, priority=InferenceScheduler.INTERACTIVE):
         """
-        Generates embeddings for the given images.
+        Generates embeddings for the given images, detecting the faces of all the images in one batch and
+        embedding all the faces in one batch.
 
         Args:
             images (list): A list of images to process.
+            priority (int): The scheduling priority of the model calls. Defaults to INTERACTIVE.
 
-        Yields:
-            numpy.ndarray: The embeddings for each image.
+        Returns:
+            list: The embeddings of every face found in the images.
         """
-        for image in images:
-            results = self.face_model.predict(image)
-            pred_data = self.get_prediction_data(results[0].boxes)
-            
-            for top_left, bottom_right, _ in pred_data:
-                cropped_face = image[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]]
-                embedding = self.feature_extractor.get_embedding(cropped_face)
-                yield embedding
+        images = [image for image in images if image is not None]
+        faces = []
+
+        for image, results in zip(images, self.scheduler.run(priority, self.face_model.predict_batch, images)):
+            for top_left, bottom_right, _ in self.get_prediction_data(results.boxes):
+                faces.append(image[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]])
+
+        return self.scheduler.run(priority, self.feature_extractor.get_embeddings, faces)
 
     def match_embedding_to_person(self, embedding, suspect_name):
         """
@@ -279,32 +351,42 @@ class ImageProcessor:
         Returns:
             dict: The matched person's data, or None if no match is found.
         """
-        distances, ids = self.data_manager.index.search(np.expand_dims(embedding, axis=0), 1)
-
-        if distances.size > 0 and distances[0][0] <= FeatureExtractor.FACENET_THRESHOLD_EUCLIDEAN:
-            person = self.data_manager.search_person_by_id(ids[0][0])
+        if match := self.data_manager.find_match(embedding):
+            person = self.data_manager.search_person_by_key(match[0])
 
             if person:
-                self.data_manager.insert_name(_id=person['_id'], name=suspect_name)
-                return person
+                if person.get('name') != suspect_name:
+                    self.data_manager.insert_name(_id=person['_id'], name=suspect_name)
+                return self.data_manager.get_person(person['_id'])
         return None
 
-    def match_suspect_to_person(self, suspect_name, images):
+    def match_suspect_to_person(self, suspect_name, images, k=None):
         """
-        Matches a suspect to a known person using the provided images.
+        Matches a suspect to known persons using all the provided images in a single index search. The best
+        candidate's name is updated to the suspect's name.
 
         Args:
             suspect_name (str): The suspect's name.
             images (list): A list of images of the suspect.
+            k (int): The maximum number of candidates to return. Defaults to SUSPECT_CANDIDATES.
 
         Returns:
-            dict: The matched person's data, or None if no match is found.
+            list: The candidate persons' data with their 'votes' (number of matching suspect faces) and best
+                'distance', best candidate first. Empty if no match is found.
         """
-        for embedding in self.get_embeddings(images):
-            person = self.match_embedding_to_person(embedding, suspect_name)
-            if person:
-                return person
-        return None
+        matches = self.data_manager.match_embeddings(self.get_embeddings(images)).get(0, [])
+
+        candidates = []
+        for person_id, votes, distance in matches[:k or ImageProcessor.SUSPECT_CANDIDATES]:
+            if person := self.data_manager.get_person(person_id):
+                person.update({'votes': votes, 'distance': distance})
+                candidates.append(person)
+
+        if candidates and candidates[0].get('name') != suspect_name:
+            self.data_manager.insert_name(_id=candidates[0]['_id'], name=suspect_name)
+            candidates[0]['name'] = suspect_name
+
+        return candidates
     
     def get_face_from_image(self, image):
         """
@@ -316,7 +398,7 @@ class ImageProcessor:
         Returns:
             numpy.ndarray: The cropped face image.
         """
-        results = self.face_model.predict(image)
+        results = self.scheduler.run(InferenceScheduler.INTERACTIVE, self.face_model.predict, image)
         pred_data = self.get_prediction_data(results[0].boxes)
 
         for top_left, bottom_right, _ in pred_data:
@@ -329,13 +411,17 @@ class ImageProcessor:
         """
         Starts the image processing threads.
         """
+        for stage in self.stages:
+            stage.start()
         self.images_finder_thread.start()
         self.process_images_thread.start()
-        self.process_faces_thread.start()
     
     def stop(self):
         """
         Stops the image processing and saves the FAISS index.
         """
         self.is_running = False
-        self.data_manager.index.save_faiss()
+        for stage in self.stages:
+            stage.stop()
+        self.scheduler.stop()
+        self.data_manager.save()
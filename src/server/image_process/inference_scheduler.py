@@ -0,0 +1,157 @@
+"""
+This module defines an InferenceScheduler class that runs all the model calls (face detection and feature
+extraction) on a single worker thread, ordered by priority, so interactive requests are not stuck behind
+the camera ingest backlog.
+
+Imports:
+    - threading: Allows for the creation and management of threads.
+    - time: Provides time-related functions.
+    - itertools: Provides a counter to keep the jobs of the same priority in order.
+    - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
+    - collections.deque: Provides a double-ended queue implementation.
+    - concurrent.futures.Future: Holds the result of a scheduled job.
+    - queue.PriorityQueue, queue.Empty: Queue module provides a priority queue implementation.
+    - src.core.metrics: Custom module for the in-process metrics.
+"""
+
+import threading
+import time
+import itertools
+import numpy as np
+from collections import deque
+from concurrent.futures import Future
+from queue import PriorityQueue, Empty
+
+from src.core import metrics
+
+INFERENCE_WAIT_SECONDS = metrics.histogram('inference_wait_seconds', 'Time model calls wait for the inference worker', ['priority'])
+INFERENCE_SECONDS = metrics.histogram('inference_seconds', 'Time spent in a model call, by model function', ['model', 'priority'])
+
+class InferenceScheduler:
+    """
+    A priority scheduler in front of the inference engines. Jobs are executed one at a time, the lowest
+    priority value first and in submission order within a priority, so an interactive job waits at most
+    for the job currently running.
+    """
+    INTERACTIVE = 0
+    BULK = 1
+    PRIORITY_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+    # number of recent jobs per priority kept for the latency statistics
+    STATS_WINDOW = 1000
+
+    def __init__(self) -> None:
+        """
+        Initializes the InferenceScheduler and starts its worker thread.
+        """
+        self.queue = PriorityQueue()
+        self.sequence = itertools.count()
+        self.stats = {priority: deque(maxlen=InferenceScheduler.STATS_WINDOW) for priority in InferenceScheduler.PRIORITY_NAMES}
+        self.completed = {priority: 0 for priority in InferenceScheduler.PRIORITY_NAMES}
+        self.stats_lock = threading.Lock()
+
+        self.is_running = True
+        self.worker_thread = threading.Thread(target=self.run_jobs, name='inference_scheduler', daemon=True)
+        self.worker_thread.start()
+
+    def submit(self, priority, func, *args, **kwargs):
+        """
+        Schedules a call.
+
+        Args:
+            priority (int): The priority of the call, INTERACTIVE or BULK.
+            func (callable): The function to call.
+            *args, **kwargs: The arguments of the call.
+
+        Returns:
+            Future: The future result of the call.
+        """
+        future = Future()
+        self.queue.put((priority, next(self.sequence), time.perf_counter(), future, func, args, kwargs))
+        return future
+
+    def run(self, priority, func, *args, **kwargs):
+        """
+        Schedules a call and waits for its result.
+
+        Args:
+            priority (int): The priority of the call, INTERACTIVE or BULK.
+            func (callable): The function to call.
+            *args, **kwargs: The arguments of the call.
+
+        Returns:
+            The result of the call, exceptions raised by the call are re-raised.
+        """
+        return self.submit(priority, func, *args, **kwargs).result()
+
+    def run_jobs(self):
+        """
+        Continuously executes the scheduled calls by priority.
+        """
+        while self.is_running:
+            try:
+                priority, _, queued_at, future, func, args, kwargs = self.queue.get(timeout=1)
+            except Empty:
+                continue
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            started_at = time.perf_counter()
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            finished_at = time.perf_counter()
+
+            with self.stats_lock:
+                self.stats[priority].append((started_at - queued_at, finished_at - started_at))
+                self.completed[priority] += 1
+
+            priority_name = InferenceScheduler.PRIORITY_NAMES[priority]
+            INFERENCE_WAIT_SECONDS.observe(started_at - queued_at, priority=priority_name)
+            INFERENCE_SECONDS.observe(finished_at - started_at, model=getattr(func, '__name__', 'unknown'), priority=priority_name)
+
+    def get_stats(self):
+        """
+        Reports the queue depth and the latency of the recent jobs of every priority.
+
+        Returns:
+            dict: Per priority name, the number of completed and queued jobs and the mean, p50 and p95 of the
+                wait (time in queue), service (time running) and total latencies, in milliseconds.
+        """
+        queued = {priority: 0 for priority in InferenceScheduler.PRIORITY_NAMES}
+        with self.queue.mutex:
+            for job in self.queue.queue:
+                queued[job[0]] += 1
+
+        stats = {}
+        with self.stats_lock:
+            for priority, name in InferenceScheduler.PRIORITY_NAMES.items():
+                samples = np.array(self.stats[priority], dtype=np.float64).reshape(-1, 2) * 1000
+                latencies = {'wait': samples[:, 0], 'service': samples[:, 1], 'total': samples.sum(axis=1)}
+
+                stats[name] = {
+                    'completed': self.completed[priority],
+                    'queued': queued[priority],
+                    **{
+                        f'{kind}_ms': {
+                            'mean': float(values.mean()),
+                            'p50': float(np.percentile(values, 50)),
+                            'p95': float(np.percentile(values, 95))
+                        } if len(values) else None
+                        for kind, values in latencies.items()
+                    }
+                }
+        return stats
+
+    def stop(self):
+        """
+        Stops the worker thread and cancels the pending calls, so no caller is left waiting.
+        """
+        self.is_running = False
+
+        while True:
+            try:
+                self.queue.get_nowait()[3].cancel()
+            except Empty:
+                break
@@ -0,0 +1,158 @@
+"""
+This module defines a Stage class, a step of the image processing pipeline with a bounded input queue and its
+own worker threads. Stages are chained, a stage blocks while the next one is full, so a slow stage holds back
+the stages before it (backpressure) instead of letting its queue grow without limit.
+
+Imports:
+    - threading: Allows for the creation and management of threads.
+    - time: Provides time-related functions.
+    - traceback: Provides methods for extracting, formatting, and printing stack traces.
+    - numpy as np: Provides support for large, multi-dimensional arrays and matrices.
+    - collections.deque: Provides a double-ended queue implementation.
+    - queue.Queue, queue.Empty, queue.Full: Queue module provides a FIFO implementation.
+    - src.core.metrics: Custom module for the in-process metrics.
+"""
+
+import threading
+import time
+import traceback
+import numpy as np
+from collections import deque
+from queue import Queue, Empty, Full
+
+from src.core import metrics
+
+STAGE_WAIT_SECONDS = metrics.histogram('pipeline_stage_wait_seconds', 'Time items wait in a stage queue', ['stage'])
+STAGE_SERVICE_SECONDS = metrics.histogram('pipeline_stage_service_seconds', 'Time a stage spends handling an item', ['stage'])
+STAGE_ITEMS = metrics.counter('pipeline_stage_items_total', 'Items handled by a stage, by result (ok, failed)', ['stage', 'result'])
+
+class Stage:
+    """
+    A pipeline stage. Every item put in the stage is passed to the handler by one of the stage's workers, and
+    every item the handler yields is put in the next stage.
+    """
+    # number of recent items kept for the latency statistics
+    STATS_WINDOW = 1000
+    # fraction of the capacity above which the stage is reported as saturated
+    HIGH_WATERMARK = 0.8
+
+    def __init__(self, name, handler, capacity, workers=1, next_stage=None) -> None:
+        """
+        Initializes the Stage.
+
+        Args:
+            name (str): The name of the stage.
+            handler (callable): Called with every item, returns an iterable of items for the next stage (or None).
+            capacity (int): The maximum number of queued items.
+            workers (int): The number of worker threads. Defaults to 1.
+            next_stage (Stage): The stage the handler's output is put in. Defaults to None.
+        """
+        self.name = name
+        self.handler = handler
+        self.capacity = capacity
+        self.next_stage = next_stage
+        self.queue = Queue(maxsize=capacity)
+
+        self.stats = deque(maxlen=Stage.STATS_WINDOW)
+        self.processed = 0
+        self.failed = 0
+        self.stats_lock = threading.Lock()
+
+        self.is_running = False
+        self.workers = [threading.Thread(target=self.run, name=f'stage-{name}-{i}') for i in range(workers)]
+
+    def __len__(self):
+        return self.queue.qsize()
+
+    @property
+    def saturated(self):
+        """
+        Whether the stage's queue is above its high watermark.
+        """
+        return self.queue.qsize() >= self.capacity * Stage.HIGH_WATERMARK
+
+    def put(self, item):
+        """
+        Puts an item in the stage, blocking while the stage is full and running.
+
+        Args:
+            item: The item to process.
+
+        Returns:
+            bool: True if the item was queued, False if the stage stopped first.
+        """
+        entry = (time.perf_counter(), item)
+        while self.is_running:
+            try:
+                self.queue.put(entry, timeout=1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def run(self):
+        """
+        Continuously processes the queued items.
+        """
+        while self.is_running:
+            try:
+                queued_at, item = self.queue.get(timeout=1)
+            except Empty:
+                continue
+
+            started_at = time.perf_counter()
+            result = 'ok'
+            try:
+                for output in self.handler(item) or ():
+                    if self.next_stage is not None:
+                        self.next_stage.put(output)
+            except Exception as e:
+                print(e)
+                traceback.print_exc()
+                result = 'failed'
+                with self.stats_lock:
+                    self.failed += 1
+
+            # the service time includes the time blocked on a full next stage, which is how backpressure shows
+            finished_at = time.perf_counter()
+            with self.stats_lock:
+                self.stats.append((started_at - queued_at, finished_at - started_at))
+                self.processed += 1
+
+            STAGE_WAIT_SECONDS.observe(started_at - queued_at, stage=self.name)
+            STAGE_SERVICE_SECONDS.observe(finished_at - started_at, stage=self.name)
+            STAGE_ITEMS.inc(stage=self.name, result=result)
+
+    def get_stats(self):
+        """
+        Reports the queue depth and the latency of the recent items.
+
+        Returns:
+            dict: The depth, capacity, processed and failed counts and the mean and p95 wait (time in queue) and
+                service (time in the handler) in milliseconds.
+        """
+        with self.stats_lock:
+            samples = np.array(self.stats, dtype=np.float64).reshape(-1, 2) * 1000
+            stats = {'depth': self.queue.qsize(), 'capacity': self.capacity, 'processed': self.processed,
+                     'failed': self.failed}
+
+        for kind, values in (('wait', samples[:, 0]), ('service', samples[:, 1])):
+            stats[f'{kind}_ms'] = {
+                'mean': float(values.mean()),
+                'p95': float(np.percentile(values, 95))
+            } if len(values) else None
+        return stats
+
+    def start(self):
+        """
+        Starts the stage's workers.
+        """
+        self.is_running = True
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        """
+        Stops the stage's workers, the queued items are dropped.
+        """
+        self.is_running = False
@@ -47,7 +47,7 @@ class Server:
 
             while True:
                 client_socket, _ = self.socket.accept()
-                threading.Thread(target=self.handle_client, args=(client_socket,)).start()
+                threading.Thread(target=self.handle_client, args=(client_socket,), name='http_client').start()
         except KeyboardInterrupt:
             print("Server shutting down...")
         except Exception as e:
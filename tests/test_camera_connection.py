@@ -0,0 +1,79 @@
+import base64
+import threading
+
+import cv2
+import numpy as np
+
+from src.core.frame_trace import FRAMES_DROPPED
+from src.server.camera_connections import camera_connections
+from src.server.camera_connections.camera_connections import CameraConnection, CameraConnections
+
+def frame_info(trace_id):
+    jpeg = cv2.imencode('.jpg', np.zeros((8, 8, 3), dtype=np.uint8))[1].tobytes()
+    return {'frame': base64.b64encode(jpeg).decode(), 'time': '20260101_000000', 'trace_id': trace_id, 'captured_at': 1.0}
+
+def receive(monkeypatch, messages, pressure):
+    """
+    Runs a camera connection's receive loop over the given messages, returns the traces of the written frames.
+    """
+    messages = list(messages) + [None]
+    monkeypatch.setattr(camera_connections, 'receive_data', lambda sock: messages.pop(0))
+
+    connection = CameraConnection(None, '127.0.0.1', 0, {'lat': 1, 'lng': 2}, 'camera', pressure=lambda location: pressure)
+    written = []
+    connection.write_file = lambda frame, time, trace: written.append(trace)
+    connection.running = True
+    connection.receive_frames()
+    return connection, written
+
+def test_live_frames_are_dropped_under_pressure(monkeypatch):
+    before = FRAMES_DROPPED.values.get(('1_2', 'live'), 0)
+    connection, written = receive(monkeypatch, [frame_info('live')], pressure=True)
+
+    assert written == []
+    assert connection.dropped_frames == 1
+    assert FRAMES_DROPPED.values[('1_2', 'live')] - before == 1
+
+def test_replayed_frames_are_queued_under_pressure(monkeypatch):
+    before = FRAMES_DROPPED.values.get(('1_2', 'replay'), 0)
+    connection, written = receive(monkeypatch, [{'frames': [frame_info('a'), frame_info('b')]}], pressure=True)
+
+    assert [trace.trace_id for trace in written] == ['a', 'b']
+    assert all(trace.replayed for trace in written)
+    assert connection.dropped_frames == 0
+    assert FRAMES_DROPPED.values.get(('1_2', 'replay'), 0) == before
+
+def test_frames_are_written_without_pressure(monkeypatch):
+    _, written = receive(monkeypatch, [frame_info('live')], pressure=False)
+
+    assert [(trace.trace_id, trace.replayed) for trace in written] == [('live', False)]
+
+class FakeSocket:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+def test_disconnect_stops_credits_and_removes_connection(monkeypatch):
+    monkeypatch.setattr(camera_connections, 'receive_data', lambda sock: None)
+    monkeypatch.setattr(camera_connections, 'send_data', lambda sock, message: True)
+    monkeypatch.setattr(CameraConnection, 'CREDIT_INTERVAL', 0.01)
+
+    cameras = CameraConnections()
+    cameras.server_sock.close()
+    sock = FakeSocket()
+    connection = CameraConnection(sock, '127.0.0.1', 0, {'lat': 1, 'lng': 2}, 'camera',
+                                  credits=lambda location, interval: (1, 0, 0),
+                                  on_close=cameras.remove_camera_connection)
+    cameras.camera_connections['camera'] = connection
+
+    connection.handle_connection()
+
+    assert not connection.running
+    assert sock.closed
+    assert cameras.get_cameras() == {}
+    for thread in threading.enumerate():
+        if thread.name == 'camera_credits-camera':
+            thread.join(timeout=1)
+            assert not thread.is_alive()
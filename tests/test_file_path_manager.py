@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from src.core.frame_trace import FrameTrace, FRAMES_DROPPED
+from src.server.image_process.file_path_manager import FilePathManager
+
+def make_frame(tmp_path, location, name, replayed=False):
+    """
+    Writes an empty frame file named like the camera server does, '<trace prefix>-<time>.jpg'.
+    """
+    directory = tmp_path / location
+    directory.mkdir(exist_ok=True)
+    trace = FrameTrace(name, 1, 2, replayed=replayed)
+    file_path = directory / f'{trace.filename_prefix()}-20260101_000000.jpg'
+    file_path.touch()
+    return str(file_path)
+
+def add_frames(manager, tmp_path, location, names, replayed=False):
+    paths = [make_frame(tmp_path, location, name, replayed) for name in names]
+    for file_path in paths:
+        manager.add(location, file_path)
+    return paths
+
+def drain(manager):
+    taken = []
+    while (item := manager.get()) is not None:
+        taken.append(item[:2])
+    return taken
+
+def dropped(location, source):
+    return FRAMES_DROPPED.values.get((location, source), 0)
+
+def test_cameras_are_served_round_robin(tmp_path):
+    manager = FilePathManager(capacity=10)
+    a = add_frames(manager, tmp_path, 'a', ['a0', 'a1', 'a2'])
+    b = add_frames(manager, tmp_path, 'b', ['b0', 'b1'])
+
+    assert drain(manager) == [('a', a[0]), ('b', b[0]), ('a', a[1]), ('b', b[1]), ('a', a[2])]
+
+def test_a_camera_gets_up_to_its_weight_per_turn(tmp_path):
+    manager = FilePathManager(capacity=10)
+    manager.set_weight('a', 2)
+    a = add_frames(manager, tmp_path, 'a', ['a0', 'a1', 'a2', 'a3'])
+    b = add_frames(manager, tmp_path, 'b', ['b0', 'b1'])
+
+    assert drain(manager) == [('a', a[0]), ('a', a[1]), ('b', b[0]), ('a', a[2]), ('a', a[3]), ('b', b[1])]
+
+def test_newest_policy_sheds_the_oldest_queued_frame(tmp_path):
+    manager = FilePathManager(capacity=2, shed_policy='newest')
+    shed_before = dropped('newest', 'live')
+    paths = add_frames(manager, tmp_path, 'newest', ['f0', 'f1', 'f2', 'f3'])
+
+    assert [file_path for _, file_path in drain(manager)] == paths[2:]
+    assert not any(os.path.exists(file_path) for file_path in paths[:2])
+    assert paths[0] not in manager
+    assert manager.get_stats()['newest']['shed'] == 2
+    assert dropped('newest', 'live') - shed_before == 2
+
+def test_sample_policy_admits_every_nth_frame_of_an_overflow(tmp_path):
+    manager = FilePathManager(capacity=2, shed_policy='sample', sample_every=2)
+    paths = add_frames(manager, tmp_path, 'sample', [f'f{i}' for i in range(6)])
+
+    # f2 and f4 are dropped on arrival, f3 and f5 are admitted in place of the oldest queued frames
+    assert [file_path for _, file_path in drain(manager)] == [paths[3], paths[5]]
+    assert [os.path.exists(file_path) for file_path in paths] == [False, False, False, True, False, True]
+    assert manager.get_stats()['sample']['shed'] == 4
+
+def test_a_queue_that_drained_below_capacity_resets_the_sampling(tmp_path):
+    manager = FilePathManager(capacity=1, shed_policy='sample', sample_every=2)
+    add_frames(manager, tmp_path, 'reset', ['f0', 'f1'])
+    manager.get()
+    paths = add_frames(manager, tmp_path, 'reset', ['f2', 'f3'])
+
+    # f2 found room, so f3 is the first frame of a new overflow and is dropped
+    assert [file_path for _, file_path in drain(manager)] == [paths[0]]
+
+def test_shed_replayed_frames_are_counted_apart(tmp_path):
+    manager = FilePathManager(capacity=1)
+    replay_before, live_before = dropped('replayed', 'replay'), dropped('replayed', 'live')
+
+    add_frames(manager, tmp_path, 'replayed', ['r0', 'r1'], replayed=True)
+    add_frames(manager, tmp_path, 'replayed', ['l0'])
+
+    assert dropped('replayed', 'replay') - replay_before == 2
+    assert dropped('replayed', 'live') - live_before == 0
+
+def test_full_queue_and_load(tmp_path):
+    manager = FilePathManager(capacity=2)
+    assert not manager.is_full('load')
+
+    add_frames(manager, tmp_path, 'load', ['f0', 'f1'])
+    assert manager.is_full('load')
+
+    manager.get()
+    assert not manager.is_full('load')
+    assert manager.get_load('load') == (1, 1)
+
+def test_removed_frames_are_deleted_and_counted(tmp_path):
+    manager = FilePathManager()
+    (file_path,) = add_frames(manager, tmp_path, 'done', ['f0'])
+    location, taken, queued_at = manager.get()
+
+    assert queued_at is not None
+    manager.remove(location, taken)
+    assert not os.path.exists(file_path)
+    assert file_path not in manager
+    assert manager.get_stats()['done']['processed'] == 1
+
+def test_unknown_shed_policy():
+    with pytest.raises(ValueError):
+        FilePathManager(shed_policy='oldest')
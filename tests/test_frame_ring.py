@@ -0,0 +1,67 @@
+import threading
+
+import numpy as np
+
+from src.camera_server.frame_ring import FrameRing, CapturedFrame
+
+def put_frames(ring, count, start=0):
+    frames = [CapturedFrame(np.zeros((4, 4, 3), dtype=np.uint8), f't{i}') for i in range(start, start + count)]
+    for frame in frames:
+        ring.put(frame)
+    return frames
+
+def test_drop_to_latest_cursor_gets_the_newest_frame():
+    ring = FrameRing(capacity=4)
+    cursor = ring.cursor()
+    frames = put_frames(ring, 3)
+
+    assert cursor.get(timeout=0) is frames[2]
+    assert cursor.dropped == 2
+    assert cursor.get(timeout=0) is None
+
+def test_cursor_without_drop_gets_every_frame_still_in_the_ring():
+    ring = FrameRing(capacity=3)
+    cursor = ring.cursor(drop_to_latest=False)
+    frames = put_frames(ring, 5)
+
+    # the first two frames were overwritten before they were read
+    assert [cursor.get(timeout=0) for _ in range(3)] == frames[2:]
+    assert cursor.dropped == 2
+    assert cursor.get(timeout=0) is None
+
+def test_cursors_read_independently():
+    ring = FrameRing(capacity=4)
+    live, analysis = ring.cursor(), ring.cursor(drop_to_latest=False)
+    frames = put_frames(ring, 2)
+
+    assert live.get(timeout=0) is frames[1]
+    assert analysis.get(timeout=0) is frames[0]
+    assert analysis.get(timeout=0) is frames[1]
+
+    newer = put_frames(ring, 1, start=2)
+    assert live.get(timeout=0) is newer[0]
+    assert analysis.get(timeout=0) is newer[0]
+
+def test_a_new_cursor_starts_at_the_end_of_the_ring():
+    ring = FrameRing()
+    put_frames(ring, 2)
+    cursor = ring.cursor()
+
+    assert cursor.get(timeout=0) is None
+    (frame,) = put_frames(ring, 1, start=2)
+    assert cursor.get(timeout=0) is frame
+
+def test_get_waits_for_the_next_frame():
+    ring = FrameRing()
+    cursor = ring.cursor()
+    frame = CapturedFrame(np.zeros((4, 4, 3), dtype=np.uint8), 't')
+
+    threading.Timer(0.05, ring.put, args=(frame,)).start()
+    assert cursor.get(timeout=5) is frame
+
+def test_a_frame_is_encoded_once_per_quality():
+    frame = CapturedFrame(np.zeros((4, 4, 3), dtype=np.uint8), 't')
+
+    assert frame.encode(90) is frame.encode(90)
+    assert frame.encode(90) != frame.encode(10)
+    assert set(frame.encodings) == {90, 10}
@@ -0,0 +1,81 @@
+import os
+
+from src.camera_server.frame_spool import FrameSpool
+
+def messages(start, count):
+    return [{'frame': f'frame-{i}', 'time': f't{i}'} for i in range(start, start + count)]
+
+def append_all(spool, frame_messages):
+    for message in frame_messages:
+        spool.append(message)
+
+def test_frames_are_appended_to_segments_of_fixed_size(tmp_path):
+    spool = FrameSpool(tmp_path, segment_frames=2)
+    append_all(spool, messages(0, 5))
+
+    assert len(spool) == 3
+    assert [spool.read(segment) for segment in spool.segments] == [messages(0, 2), messages(2, 2), messages(4, 1)]
+
+def test_the_oldest_segment_is_dropped_beyond_max_segments(tmp_path):
+    spool = FrameSpool(tmp_path, segment_frames=2, max_segments=2)
+    append_all(spool, messages(0, 5))
+
+    assert spool.segments == [1, 2]
+    assert spool.dropped_frames == 2
+    assert not os.path.exists(spool.segment_path(0))
+    assert spool.oldest() == (1, messages(2, 2))
+
+def test_replay_reads_oldest_first_and_removes_uploaded_segments(tmp_path):
+    spool = FrameSpool(tmp_path, segment_frames=2)
+    append_all(spool, messages(0, 4))
+
+    replayed = []
+    while oldest := spool.oldest():
+        segment, segment_messages = oldest
+        replayed.extend(segment_messages)
+        spool.remove(segment)
+        assert not os.path.exists(spool.segment_path(segment))
+
+    assert replayed == messages(0, 4)
+    assert len(spool) == 0
+    assert os.listdir(tmp_path) == []
+
+def test_reading_the_segment_being_written_closes_it(tmp_path):
+    spool = FrameSpool(tmp_path, segment_frames=10)
+    append_all(spool, messages(0, 2))
+
+    assert spool.oldest() == (0, messages(0, 2))
+    spool.append(messages(2, 1)[0])
+
+    # the frame appended after the read went to a new segment, removing the read one loses nothing
+    spool.remove(0)
+    assert spool.oldest() == (1, messages(2, 1))
+
+def test_a_segment_is_kept_until_removed(tmp_path):
+    spool = FrameSpool(tmp_path, segment_frames=2)
+    append_all(spool, messages(0, 2))
+
+    # a failed upload doesn't remove the segment, it is replayed again
+    assert spool.oldest() == spool.oldest() == (0, messages(0, 2))
+    spool.remove(5)
+    assert len(spool) == 1
+
+def test_segments_left_by_a_previous_run_are_picked_up_but_not_appended_to(tmp_path):
+    append_all(FrameSpool(tmp_path, segment_frames=10), messages(0, 3))
+
+    spool = FrameSpool(tmp_path, segment_frames=10)
+    assert spool.segments == [0]
+    spool.append(messages(3, 1)[0])
+
+    assert spool.segments == [0, 1]
+    assert spool.read(0) == messages(0, 3)
+    assert spool.read(1) == messages(3, 1)
+
+def test_a_truncated_last_record_is_ignored(tmp_path):
+    spool = FrameSpool(tmp_path, segment_frames=10)
+    append_all(spool, messages(0, 2))
+
+    with open(spool.segment_path(0), 'r+b') as f:
+        f.truncate(os.path.getsize(spool.segment_path(0)) - 3)
+
+    assert spool.read(0) == messages(0, 1)
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from src.server.image_process.inference_scheduler import InferenceScheduler
+
+@pytest.fixture
+def scheduler():
+    scheduler = InferenceScheduler()
+    yield scheduler
+    scheduler.stop()
+
+def block_worker(scheduler):
+    """
+    Occupies the worker with a job that runs until the returned event is set, so the next jobs queue up.
+    """
+    started, release = threading.Event(), threading.Event()
+
+    def blocking_job():
+        started.set()
+        release.wait(5)
+
+    scheduler.submit(InferenceScheduler.BULK, blocking_job)
+    assert started.wait(5)
+    return release
+
+def test_interactive_jobs_run_before_queued_bulk_jobs(scheduler):
+    order = []
+    release = block_worker(scheduler)
+
+    futures = [scheduler.submit(InferenceScheduler.BULK, order.append, f'bulk-{i}') for i in range(3)]
+    futures.append(scheduler.submit(InferenceScheduler.INTERACTIVE, order.append, 'interactive'))
+    release.set()
+
+    for future in futures:
+        future.result(timeout=5)
+    assert order == ['interactive', 'bulk-0', 'bulk-1', 'bulk-2']
+
+def test_jobs_of_the_same_priority_run_in_submission_order(scheduler):
+    order = []
+    release = block_worker(scheduler)
+
+    futures = [scheduler.submit(InferenceScheduler.INTERACTIVE, order.append, i) for i in range(5)]
+    release.set()
+
+    for future in futures:
+        future.result(timeout=5)
+    assert order == list(range(5))
+
+def test_run_returns_the_result_and_reraises_exceptions(scheduler):
+    assert scheduler.run(InferenceScheduler.INTERACTIVE, sum, [1, 2, 3]) == 6
+
+    def fail():
+        raise ValueError('model failed')
+
+    with pytest.raises(ValueError, match='model failed'):
+        scheduler.run(InferenceScheduler.BULK, fail)
+
+def test_stats_count_completed_jobs_per_priority(scheduler):
+    scheduler.run(InferenceScheduler.INTERACTIVE, len, [])
+    scheduler.run(InferenceScheduler.BULK, len, [])
+    scheduler.run(InferenceScheduler.BULK, len, [])
+
+    stats = scheduler.get_stats()
+    assert stats['interactive']['completed'] == 1
+    assert stats['bulk']['completed'] == 2
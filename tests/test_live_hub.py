@@ -0,0 +1,187 @@
+import threading
+import time
+
+import pytest
+
+from src.server.camera_connections.live_hub import LiveHub, Viewer
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+class Feeds:
+    """
+    Records the start and stop calls of a hub, and the events it emits.
+    """
+
+    def __init__(self, started=True):
+        self.started = started
+        self.calls = []
+        self.emitted = []
+
+    def start_live(self, camera_id):
+        self.calls.append(('start', camera_id))
+        return self.started
+
+    def stop_live(self, camera_id):
+        self.calls.append(('stop', camera_id))
+
+    def emit(self, event, data, sid):
+        self.emitted.append((event, data, sid))
+
+@pytest.fixture
+def feeds():
+    return Feeds()
+
+@pytest.fixture
+def hub(feeds, monkeypatch):
+    monkeypatch.setattr(LiveHub, 'STOP_DELAY', 0.05)
+    return LiveHub(feeds.emit, feeds.start_live, feeds.stop_live)
+
+def test_only_the_first_viewer_starts_the_feed(hub, feeds):
+    assert hub.subscribe('a', 'cam')
+    assert hub.subscribe('b', 'cam')
+
+    assert feeds.calls == [('start', 'cam')]
+    assert hub.get_stats()['cameras'] == {'cam': 2}
+
+def test_the_feed_stops_after_its_last_viewer_left(hub, feeds):
+    hub.subscribe('a', 'cam')
+    hub.subscribe('b', 'cam')
+
+    hub.unsubscribe('a', 'cam')
+    time.sleep(LiveHub.STOP_DELAY * 3)
+    assert feeds.calls == [('start', 'cam')]
+
+    hub.unsubscribe('b', 'cam')
+    assert wait_until(lambda: ('stop', 'cam') in feeds.calls)
+    assert not hub.is_watched('cam')
+
+def test_a_viewer_joining_within_the_stop_delay_keeps_the_feed(hub, feeds):
+    hub.subscribe('a', 'cam')
+    hub.unsubscribe('a', 'cam')
+    assert hub.subscribe('b', 'cam')
+
+    time.sleep(LiveHub.STOP_DELAY * 3)
+    assert feeds.calls == [('start', 'cam')]
+
+def test_a_viewer_after_the_stop_restarts_the_feed(hub, feeds):
+    hub.subscribe('a', 'cam')
+    hub.unsubscribe('a', 'cam', delay=0)
+    assert wait_until(lambda: ('stop', 'cam') in feeds.calls)
+
+    assert hub.subscribe('a', 'cam')
+    assert feeds.calls == [('start', 'cam'), ('stop', 'cam'), ('start', 'cam')]
+
+def test_a_failed_start_unsubscribes_the_viewer(hub, feeds):
+    feeds.started = False
+
+    assert not hub.subscribe('a', 'cam')
+    assert not hub.is_watched('cam')
+
+    feeds.started = True
+    assert hub.subscribe('a', 'cam')
+    assert feeds.calls == [('start', 'cam'), ('start', 'cam')]
+
+def test_viewers_joining_a_starting_feed_get_its_outcome(feeds):
+    release = threading.Event()
+
+    def start_live(camera_id):
+        feeds.calls.append(('start', camera_id))
+        release.wait(5)
+        return False
+
+    hub = LiveHub(feeds.emit, start_live, feeds.stop_live)
+    results = {}
+    threads = [threading.Thread(target=lambda sid=sid: results.__setitem__(sid, hub.subscribe(sid, 'cam'))) for sid in 'ab']
+
+    threads[0].start()
+    assert wait_until(lambda: feeds.calls)
+    threads[1].start()
+    assert wait_until(lambda: len(hub.subscriptions.get('cam', {})) == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == {'a': False, 'b': False}
+    assert feeds.calls == [('start', 'cam')]
+    assert not hub.is_watched('cam')
+
+def test_frames_are_sent_to_the_camera_viewers_only(hub, feeds):
+    hub.subscribe('a', 'cam')
+    hub.subscribe('b', 'other')
+
+    assert hub.publish('cam', {'frame': b'jpeg'}) == 1
+    assert wait_until(lambda: feeds.emitted)
+    assert feeds.emitted == [('live-cam', {'frame': b'jpeg'}, 'a')]
+
+def test_a_joining_viewer_gets_the_last_frame(hub, feeds):
+    hub.publish('cam', {'frame': b'last'})
+    hub.subscribe('a', 'cam')
+
+    assert wait_until(lambda: feeds.emitted)
+    assert feeds.emitted == [('live-cam', {'frame': b'last'}, 'a')]
+
+def test_a_stale_last_frame_is_not_shown(hub, feeds, monkeypatch):
+    hub.publish('cam', {'frame': b'old'})
+    monkeypatch.setattr(LiveHub, 'LAST_FRAME_MAX_AGE', 0)
+    hub.subscribe('a', 'cam')
+
+    time.sleep(0.05)
+    assert feeds.emitted == []
+    assert 'cam' not in hub.last_frames
+
+def test_frames_are_rendered_in_the_watched_renditions_only(feeds):
+    renders = []
+
+    def render(data, renditions):
+        renders.append(set(renditions))
+        return {rendition: {**data, 'rendition': rendition} for rendition in renditions}
+
+    hub = LiveHub(feeds.emit, feeds.start_live, feeds.stop_live, render=render)
+    assert hub.publish('cam', {'frame': b'jpeg'}) == 0
+    assert renders == []
+
+    hub.subscribe('a', 'cam', 'thumb')
+    hub.subscribe('b', 'cam', 'thumb')
+    hub.publish('cam', {'frame': b'jpeg'})
+    assert renders[-1] == {'thumb'}
+
+    hub.subscribe('b', 'cam', 'full')
+    hub.publish('cam', {'frame': b'jpeg'})
+    assert renders[-1] == {'thumb', 'full'}
+    assert hub.get_stats()['renditions'] == {'cam': {'thumb': 1, 'full': 1}}
+
+def test_a_disconnected_client_leaves_all_its_feeds(hub, feeds):
+    hub.subscribe('a', 'cam')
+    hub.subscribe('a', 'other')
+    hub.disconnect('a')
+
+    assert wait_until(lambda: {('stop', 'cam'), ('stop', 'other')} <= set(feeds.calls))
+    assert 'a' not in hub.viewers
+
+def test_a_slow_viewer_only_gets_the_latest_frame():
+    sending, release = threading.Event(), threading.Event()
+    sent = []
+
+    def emit(event, data, sid):
+        sent.append(data)
+        sending.set()
+        release.wait(5)
+
+    viewer = Viewer('a', emit)
+    viewer.offer('cam', 1)
+    assert sending.wait(5)
+
+    # the sender is busy with frame 1, frame 2 is replaced by frame 3 before it is sent
+    viewer.offer('cam', 2)
+    viewer.offer('cam', 3)
+    release.set()
+
+    assert wait_until(lambda: sent == [1, 3])
+    assert viewer.dropped == 1
+    viewer.stop()